@@ -0,0 +1,145 @@
+"""Circuit breaker for the upstream chat completion path (rolling error-rate and latency windows)."""
+
+from __future__ import annotations
+
+import time
+from collections import deque
+from typing import Any, Deque, Dict, Tuple
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitOpenError(Exception):
+    """الدائرة مفتوحة: نرجع الـ fallback مباشرة بدون ما نلمس upstream."""
+
+
+class CircuitBreaker:
+    """
+    قاطع دائرة حول استدعاءات OpenAI:
+    - closed: كل الطلبات تمر؛ نسجّل (الوقت، فشل؟، بطيء؟) في نافذة آخر window_s ثانية.
+    - لو نسبة الفشل أو نسبة الطلبات الأبطأ من latency_slo_s تعدّت الحد (مع min_calls على الأقل)
+      تنفتح الدائرة open_s ثانية وكل الطلبات ترجع CircuitOpenError فوراً.
+    - بعدها half_open: نسمح بـ half_open_probes طلبات تجريبية؛ نجاحها كلها يقفل الدائرة،
+      وأي فشل يفتحها من جديد.
+    - deadline(): لو النافذة بدأت تبطئ (نصف حد البطء) أو احنا في half_open، المهلة تنقص إلى
+      latency_slo_s حتى يوصل المستخدم للـ fallback بسرعة بدل ما ينتظر المهلة كاملة.
+    """
+
+    def __init__(
+        self,
+        *,
+        window_s: float = 30.0,
+        min_calls: int = 10,
+        error_rate: float = 0.5,
+        slow_rate: float = 0.5,
+        latency_slo_s: float = 6.0,
+        open_s: float = 15.0,
+        half_open_probes: int = 1,
+    ) -> None:
+        self.window_s = window_s
+        self.min_calls = max(min_calls, 1)
+        self.error_rate = error_rate
+        self.slow_rate = slow_rate
+        self.latency_slo_s = latency_slo_s
+        self.open_s = open_s
+        self.half_open_probes = max(half_open_probes, 1)
+        self.state = CLOSED
+        self._window: Deque[Tuple[float, bool, bool]] = deque()
+        self._opened_at = 0.0
+        self._probes_started = 0
+        self._probes_passed = 0
+        self.rejected = 0
+        self.transitions: Deque[Dict[str, Any]] = deque(maxlen=20)
+
+    def _trim(self, now: float) -> None:
+        while self._window and now - self._window[0][0] > self.window_s:
+            self._window.popleft()
+
+    def _rates(self) -> Tuple[int, float, float]:
+        calls = len(self._window)
+        if not calls:
+            return 0, 0.0, 0.0
+        failures = sum(1 for _, failed, _ in self._window if failed)
+        slow = sum(1 for _, _, was_slow in self._window if was_slow)
+        return calls, failures / calls, slow / calls
+
+    def _move(self, state: str, reason: str) -> None:
+        self.transitions.append(
+            {"from": self.state, "to": state, "reason": reason, "at": round(time.time(), 3)}
+        )
+        self.state = state
+        if state == OPEN:
+            self._opened_at = time.monotonic()
+        elif state == HALF_OPEN:
+            self._probes_started = self._probes_passed = 0
+        else:
+            self._window.clear()
+
+    def allow(self) -> bool:
+        """هل نرسل هذا الطلب لـ upstream؟ (يحجز probe في half_open)."""
+        if self.state == OPEN:
+            if time.monotonic() - self._opened_at < self.open_s:
+                self.rejected += 1
+                return False
+            self._move(HALF_OPEN, "open timeout elapsed")
+        if self.state == HALF_OPEN:
+            if self._probes_started >= self.half_open_probes:
+                self.rejected += 1
+                return False
+            self._probes_started += 1
+        return True
+
+    def abandon(self) -> None:
+        """طلب سمح له allow() لكنه انلغى قبل ما نعرف نتيجته؛ نرجّع الـ probe المحجوز."""
+        if self.state == HALF_OPEN and self._probes_started > self._probes_passed:
+            self._probes_started -= 1
+
+    def deadline(self, default_s: float) -> float:
+        if self.latency_slo_s <= 0:
+            return default_s
+        if self.state == HALF_OPEN:
+            return min(default_s, self.latency_slo_s)
+        self._trim(time.monotonic())
+        calls, _, slow_rate = self._rates()
+        # نفس حد min_calls اللي يفتح الدائرة: طلب بطيء واحد ما يقصّر المهلة على الكل
+        if calls and calls >= self.min_calls and slow_rate >= self.slow_rate / 2:
+            return min(default_s, self.latency_slo_s)
+        return default_s
+
+    def record(self, ok: bool, latency_s: float) -> None:
+        slow = self.latency_slo_s > 0 and latency_s > self.latency_slo_s
+        if self.state == HALF_OPEN:
+            if not ok or slow:
+                self._move(OPEN, "probe failed" if not ok else "probe slow")
+                return
+            self._probes_passed += 1
+            if self._probes_passed >= self.half_open_probes:
+                self._move(CLOSED, "probes succeeded")
+            return
+        if self.state == OPEN:
+            return  # نتيجة طلب بدأ قبل ما تنفتح الدائرة
+        now = time.monotonic()
+        self._window.append((now, not ok, slow))
+        self._trim(now)
+        calls, error_rate, slow_rate = self._rates()
+        if calls < self.min_calls:
+            return
+        if error_rate >= self.error_rate:
+            self._move(OPEN, f"error rate {error_rate:.0%} over {calls} calls")
+        elif slow_rate >= self.slow_rate:
+            self._move(OPEN, f"slow rate {slow_rate:.0%} over {calls} calls")
+
+    def stats(self) -> Dict[str, Any]:
+        self._trim(time.monotonic())
+        calls, error_rate, slow_rate = self._rates()
+        return {
+            "state": self.state,
+            "window_calls": calls,
+            "error_rate": round(error_rate, 4),
+            "slow_rate": round(slow_rate, 4),
+            "latency_slo_s": self.latency_slo_s,
+            "rejected": self.rejected,
+            "transitions": list(self.transitions),
+        }
@@ -15,6 +15,27 @@ def _candidate_paths() -> Iterable[Path]:
     yield root / ".env"
 
 
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.getenv(name, default))
+    except ValueError:
+        return default
+
+
+def _env_bool(name: str, default: bool) -> bool:
+    value = os.getenv(name)
+    if value is None:
+        return default
+    return value.strip().lower() in {"1", "true", "yes", "on"}
+
+
 def load_environment() -> None:
     """Load environment variables from known .env locations without overriding."""
     seen: set[Path] = set()
@@ -29,5 +50,117 @@ load_environment()
 
 OPENAI_API_KEY: str | None = os.getenv("OPENAI_API_KEY")
 OPENAI_MODEL: str = os.getenv("OPENAI_MODEL", "gpt-4o-mini")
+OPENAI_BASE_URL: str | None = os.getenv("OPENAI_BASE_URL") or None
+# Upstream chat completions: per-call deadline, shared HTTP pool size and in-flight cap.
+OPENAI_TIMEOUT_S: float = _env_float("OPENAI_TIMEOUT_S", 20.0)
+OPENAI_CONNECT_TIMEOUT_S: float = _env_float("OPENAI_CONNECT_TIMEOUT_S", 5.0)
+OPENAI_MAX_CONNECTIONS: int = _env_int("OPENAI_MAX_CONNECTIONS", 100)
+OPENAI_MAX_KEEPALIVE: int = _env_int("OPENAI_MAX_KEEPALIVE", 20)
+OPENAI_MAX_CONCURRENCY: int = _env_int("OPENAI_MAX_CONCURRENCY", 32)
+OPENAI_MAX_RETRIES: int = _env_int("OPENAI_MAX_RETRIES", 1)
+# Share one upstream call between concurrent requests with identical messages.
+OPENAI_SINGLE_FLIGHT: bool = _env_bool("OPENAI_SINGLE_FLIGHT", True)
+# Circuit breaker on upstream completions: opens on a high error or slow-call rate within the
+# rolling window, fails fast for OPEN_S, then lets HALF_OPEN_PROBES calls test recovery.
+# Calls slower than OPENAI_LATENCY_SLO_S count as slow; once the window degrades the
+# per-call deadline drops to the SLO so users reach the fallback early.
+OPENAI_BREAKER: bool = _env_bool("OPENAI_BREAKER", True)
+OPENAI_BREAKER_WINDOW_S: float = _env_float("OPENAI_BREAKER_WINDOW_S", 30.0)
+OPENAI_BREAKER_MIN_CALLS: int = _env_int("OPENAI_BREAKER_MIN_CALLS", 10)
+OPENAI_BREAKER_ERROR_RATE: float = _env_float("OPENAI_BREAKER_ERROR_RATE", 0.5)
+OPENAI_BREAKER_SLOW_RATE: float = _env_float("OPENAI_BREAKER_SLOW_RATE", 0.5)
+OPENAI_BREAKER_OPEN_S: float = _env_float("OPENAI_BREAKER_OPEN_S", 15.0)
+OPENAI_BREAKER_HALF_OPEN_PROBES: int = _env_int("OPENAI_BREAKER_HALF_OPEN_PROBES", 1)
+OPENAI_LATENCY_SLO_S: float = _env_float("OPENAI_LATENCY_SLO_S", 6.0)
+# Offline upstream for load tests: "simulate" answers from a local latency/error model,
+# "record" passes calls to OpenAI and appends each reply to OPENAI_SIM_RECORDINGS (JSONL),
+# "replay" answers from that file with the recorded timings. Empty = real OpenAI only.
+# Simulated first-token latency is log-normal (median / p95), then OPENAI_SIM_TOKENS_PER_S.
+OPENAI_SIMULATOR: str = os.getenv("OPENAI_SIMULATOR", "").strip().lower()
+OPENAI_SIM_LATENCY_MEDIAN_S: float = _env_float("OPENAI_SIM_LATENCY_MEDIAN_S", 0.8)
+OPENAI_SIM_LATENCY_P95_S: float = _env_float("OPENAI_SIM_LATENCY_P95_S", 2.0)
+OPENAI_SIM_TOKENS_PER_S: float = _env_float("OPENAI_SIM_TOKENS_PER_S", 60.0)
+OPENAI_SIM_TIMEOUT_RATE: float = _env_float("OPENAI_SIM_TIMEOUT_RATE", 0.0)
+OPENAI_SIM_429_RATE: float = _env_float("OPENAI_SIM_429_RATE", 0.0)
+OPENAI_SIM_5XX_RATE: float = _env_float("OPENAI_SIM_5XX_RATE", 0.0)
+OPENAI_SIM_SEED: int = _env_int("OPENAI_SIM_SEED", 0)  # 0 = unseeded
+OPENAI_SIM_RECORDINGS: str = os.getenv("OPENAI_SIM_RECORDINGS", "llm_recordings.jsonl")
 FRONTEND_ORIGIN: str = os.getenv("FRONTEND_ORIGIN", "*")
 
+# Startup warm-up of label maps, analysis workers, the token counter and the OpenAI client:
+# "blocking" (default) finishes it before serving, "background" serves immediately while it
+# runs, "off" leaves everything to the first request.
+STARTUP_WARMUP: str = os.getenv("STARTUP_WARMUP", "blocking").strip().lower()
+
+# Circle analysis backend: "raster" (pixel label map) or "geometric" (analytic box overlap).
+ANALYZE_ENGINE: str = os.getenv("ANALYZE_ENGINE", "raster")
+
+# How pixels covered by several overlapping muscle boxes are credited (raster engine):
+# "last" (default) gives the pixel to the box drawn last, "equal" splits its weight between
+# every muscle under it, "full" credits each of them with the whole pixel.
+ANALYZE_OVERLAP: str = os.getenv("ANALYZE_OVERLAP", "last").strip().lower()
+
+# Label maps are read from memory-mapped .npy artifacts in LABEL_MAP_DIR (built on first use,
+# or ahead of time with `python -m backend.label_maps`) so worker processes share one copy.
+LABEL_MAP_ARTIFACTS: bool = _env_bool("LABEL_MAP_ARTIFACTS", True)
+LABEL_MAP_DIR: Path = Path(os.getenv("LABEL_MAP_DIR") or Path(__file__).resolve().parent / "artifacts")
+
+# Per-stage timers: Server-Timing response headers and Prometheus histograms at /metrics.
+METRICS_ENABLED: bool = _env_bool("METRICS_ENABLED", True)
+
+# Opt-in sampling profiler: profiles PROFILE_SAMPLE_RATE of requests under PROFILE_PATHS, or
+# any request sending the PROFILE_HEADER with a value equal to PROFILE_HEADER_TOKEN. Without a
+# token the header is ignored and /admin/profiles is refused.
+# Collapsed stacks are written to PROFILE_DIR, keeping the newest PROFILE_MAX_FILES files.
+PROFILE_ENABLED: bool = _env_bool("PROFILE_ENABLED", False)
+PROFILE_SAMPLE_RATE: float = _env_float("PROFILE_SAMPLE_RATE", 0.01)
+PROFILE_HEADER: str = os.getenv("PROFILE_HEADER", "X-Armonia-Profile")
+PROFILE_HEADER_TOKEN: str | None = os.getenv("PROFILE_HEADER_TOKEN") or None
+PROFILE_PATHS: tuple[str, ...] = tuple(
+    path.strip() for path in os.getenv("PROFILE_PATHS", "/api/analyze,/api/chat").split(",") if path.strip()
+)
+PROFILE_DIR: str = os.getenv("PROFILE_DIR", "profiles")
+PROFILE_INTERVAL_S: float = _env_float("PROFILE_INTERVAL_S", 0.005)
+PROFILE_MAX_FILES: int = _env_int("PROFILE_MAX_FILES", 200)
+PROFILE_KEEP_SLOWEST: int = _env_int("PROFILE_KEEP_SLOWEST", 20)
+PROFILE_MAX_CONCURRENT: int = _env_int("PROFILE_MAX_CONCURRENT", 4)
+
+# Result cache in front of analyze_selection (0 entries disables it). Inputs are
+# snapped to a grid of ANALYZE_CACHE_QUANTUM (normalised units) before lookup.
+ANALYZE_CACHE_SIZE: int = _env_int("ANALYZE_CACHE_SIZE", 2048)
+ANALYZE_CACHE_MAX_BYTES: int = _env_int("ANALYZE_CACHE_MAX_BYTES", 8 * 1024 * 1024)
+ANALYZE_CACHE_QUANTUM: float = _env_float("ANALYZE_CACHE_QUANTUM", 0.002)
+
+# Batch analyze: max circles per request and the pixel budget of one vectorised chunk.
+ANALYZE_BATCH_MAX_ITEMS: int = _env_int("ANALYZE_BATCH_MAX_ITEMS", 1000)
+ANALYZE_BATCH_CHUNK_PIXELS: int = _env_int("ANALYZE_BATCH_CHUNK_PIXELS", 1_000_000)
+
+# Worker pool for CPU-bound analysis: "thread", "process" or "inline" (run on the event loop).
+ANALYZE_EXECUTOR: str = os.getenv("ANALYZE_EXECUTOR", "thread")
+ANALYZE_WORKERS: int = _env_int("ANALYZE_WORKERS", min(4, os.cpu_count() or 1))
+ANALYZE_QUEUE_SIZE: int = _env_int("ANALYZE_QUEUE_SIZE", 64)
+ANALYZE_TIMEOUT_S: float = _env_float("ANALYZE_TIMEOUT_S", 10.0)
+
+# Opt-in prompt budget for chat history (0 keeps the plain message window). The system
+# prompt, muscle context and the new user message are always sent; older turns are
+# dropped (or summarised) to fit.
+CHAT_HISTORY_TOKEN_BUDGET: int = _env_int("CHAT_HISTORY_TOKEN_BUDGET", 0)
+CHAT_HISTORY_SUMMARY: bool = _env_bool("CHAT_HISTORY_SUMMARY", False)
+CHAT_HISTORY_SUMMARY_TOKENS: int = _env_int("CHAT_HISTORY_SUMMARY_TOKENS", 120)
+
+# Opt-in cache of first-turn replies keyed on the normalised question, top muscles and
+# language (0 entries disables it). Only turns before REPLY_CACHE_MAX_TURNS are cached.
+REPLY_CACHE_SIZE: int = _env_int("REPLY_CACHE_SIZE", 0)
+REPLY_CACHE_MAX_BYTES: int = _env_int("REPLY_CACHE_MAX_BYTES", 4 * 1024 * 1024)
+REPLY_CACHE_TTL_S: float = _env_float("REPLY_CACHE_TTL_S", 3600.0)
+REPLY_CACHE_MAX_TURNS: int = _env_int("REPLY_CACHE_MAX_TURNS", 1)
+
+# Chat session backend: "memory" (per process) or "sqlite" (shared file, safe across workers).
+SESSION_BACKEND: str = os.getenv("SESSION_BACKEND", "memory")
+SESSION_SQLITE_PATH: str = os.getenv("SESSION_SQLITE_PATH", "sessions.db")
+# In-memory chat sessions: shard count, LRU cap, idle expiry and memory budget.
+SESSION_SHARDS: int = _env_int("SESSION_SHARDS", 16)
+SESSION_MAX_SESSIONS: int = _env_int("SESSION_MAX_SESSIONS", 10_000)
+SESSION_IDLE_TTL_S: float = _env_float("SESSION_IDLE_TTL_S", 6 * 3600)
+SESSION_MAX_BYTES: int = _env_int("SESSION_MAX_BYTES", 64 * 1024 * 1024)
+SESSION_SWEEP_INTERVAL_S: float = _env_float("SESSION_SWEEP_INTERVAL_S", 60.0)
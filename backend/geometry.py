@@ -0,0 +1,153 @@
+"""Analytic box/circle overlap engine for muscle selection.
+
+Every item in ``BODY_MAP`` is an axis-aligned box, so the pixel counts and
+Gaussian-weighted mass that the raster path reads from the label map can be
+computed per box, column by column, without building the 1200x800 map.
+"""
+
+from __future__ import annotations
+
+import math
+from functools import lru_cache
+from typing import List, Sequence, Tuple
+
+import numpy as np
+
+from .muscle_data import BODY_MAP, BodySideKey
+
+Rect = Tuple[int, int, int, int]
+
+
+def box_pixels(box_norm: Sequence[float], width: int, height: int) -> Rect | None:
+    """يحوّل box_norm إلى مستطيل بكسلات (x1, y1, x2, y2) بحدود مقصوصة، أو None لو فاضي."""
+    x1, y1, x2, y2 = box_norm
+    x1_i = max(int(x1 * width), 0)
+    x2_i = min(int(x2 * width), width)
+    y1_i = max(int(y1 * height), 0)
+    y2_i = min(int(y2 * height), height)
+    if x2_i <= x1_i or y2_i <= y1_i:
+        return None
+    return x1_i, y1_i, x2_i, y2_i
+
+
+def _subtract(rect: Rect, cut: Rect) -> List[Rect]:
+    """يطرح مستطيل cut من rect ويرجع القطع الباقية (أقصاها 4)."""
+    ax1, ay1, ax2, ay2 = rect
+    ix1, iy1 = max(ax1, cut[0]), max(ay1, cut[1])
+    ix2, iy2 = min(ax2, cut[2]), min(ay2, cut[3])
+    if ix1 >= ix2 or iy1 >= iy2:
+        return [rect]
+    pieces: List[Rect] = []
+    if ay1 < iy1:
+        pieces.append((ax1, ay1, ax2, iy1))
+    if iy2 < ay2:
+        pieces.append((ax1, iy2, ax2, ay2))
+    if ax1 < ix1:
+        pieces.append((ax1, iy1, ix1, iy2))
+    if ix2 < ax2:
+        pieces.append((ix2, iy1, ax2, iy2))
+    return pieces
+
+
+@lru_cache(maxsize=None)
+def visible_fragments(side: BodySideKey, width: int, height: int) -> np.ndarray:
+    """
+    الأجزاء الظاهرة من كل مربع بعد تطبيق ترتيب الرسم (العنصر الأخير يغطي اللي قبله)،
+    تماماً مثل _build_label_map. يرجع مصفوفة (n, 5): x1, y1, x2, y2, muscle_id.
+    """
+    fragments: List[Tuple[int, int, int, int, int]] = []
+    for item in BODY_MAP[side]["items"]:
+        if item["shape"] != "box":
+            raise ValueError(
+                f"The geometric engine only supports box shapes; muscle {item['id']} is a {item['shape']}"
+            )
+        rect = box_pixels(item["box_norm"], width, height)
+        if rect is None:
+            continue
+        fragments = [
+            (*piece, muscle_id)
+            for *frag, muscle_id in fragments
+            for piece in _subtract(tuple(frag), rect)
+        ]
+        fragments.append((*rect, item["id"]))
+    return np.array(fragments, dtype=np.int64).reshape(-1, 5)
+
+
+def circle_spans(
+    positions: np.ndarray, centre: float, other_centre: float, radius: float, lo_bound: int, hi_stop: int
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    لكل موضع على محور (عمود أو صف) يرجع (d², inside, lo, hi): مربع البعد عن المركز على
+    هذا المحور، وهل المحور يقطع الدائرة، ومدى المحور الآخر [lo, hi] داخلها مقصوصاً على
+    [lo_bound, hi_stop). المدى مطابق بالضبط لقناع البكسل dx² + dy² <= r².
+    """
+    r_sq = radius ** 2
+    d_sq = (positions - centre) ** 2
+    inside = d_sq <= r_sq
+    half = np.sqrt(np.maximum(r_sq - d_sq, 0.0))
+    lo = np.ceil(other_centre - half)
+    hi = np.floor(other_centre + half)
+    # تصحيح خطأ التقريب في sqrt حتى يطابق شرط القناع dx² + dy² <= r² بالضبط
+    hi -= d_sq + (hi - other_centre) ** 2 > r_sq
+    hi += d_sq + (hi + 1 - other_centre) ** 2 <= r_sq
+    lo += d_sq + (lo - other_centre) ** 2 > r_sq
+    lo -= d_sq + (lo - 1 - other_centre) ** 2 <= r_sq
+    lo = np.maximum(lo, lo_bound).astype(np.int64)
+    hi = np.minimum(hi, hi_stop - 1).astype(np.int64)
+    return d_sq, inside, lo, hi
+
+
+def circle_box_overlaps(
+    side: BodySideKey,
+    width: int,
+    height: int,
+    cx: float,
+    cy: float,
+    radius: float,
+    sigma: float,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    يحسب لكل عضلة عدد البكسلات داخل الدائرة ومجموع الوزن الغوسي، بدون خريطة تسميات.
+
+    لكل عمود x داخل الدائرة نحسب مدى الصفوف [lo, hi] داخلها، ونقاطعه مع كل جزء
+    ظاهر. العدّ مطابق لقناع الدائرة بالبكسل، والوزن منفصل (separable):
+    exp(-dx²) × مجموع exp(-dy²) من جدول تراكمي للصفوف. يرجع (ids, pixels, weights).
+    """
+    empty = (np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0))
+    x_start = max(int(math.ceil(cx - radius)), 0)
+    x_stop = min(int(math.floor(cx + radius)), width - 1) + 1
+    y_start = max(int(math.floor(cy - radius)), 0)
+    y_stop = min(int(math.ceil(cy + radius)), height - 1) + 1
+    if x_stop <= x_start or y_stop <= y_start:
+        return empty
+
+    frags = visible_fragments(side, width, height)
+    frags = frags[
+        (frags[:, 2] > x_start) & (frags[:, 0] < x_stop)
+        & (frags[:, 3] > y_start) & (frags[:, 1] < y_stop)
+    ]
+    if frags.size == 0:
+        return empty
+
+    xs = np.arange(x_start, x_stop)
+    dx_sq, inside, lo, hi = circle_spans(xs, cx, cy, radius, y_start, y_stop)
+
+    two_sigma_sq = 2 * sigma ** 2
+    col_weight = np.exp(-dx_sq / two_sigma_sq)
+    row_weight = np.exp(-((np.arange(y_start, y_stop) - cy) ** 2) / two_sigma_sq)
+    row_cumsum = np.concatenate(([0.0], np.cumsum(row_weight)))
+
+    # شبكة (أجزاء × أعمدة): مدى الصفوف المشترك بين الدائرة وكل جزء
+    seg_lo = np.maximum(lo[None, :], frags[:, 1:2])
+    seg_hi = np.minimum(hi[None, :], frags[:, 3:4] - 1)
+    in_frag = (xs[None, :] >= frags[:, 0:1]) & (xs[None, :] < frags[:, 2:3]) & inside[None, :]
+    hit = in_frag & (seg_hi >= seg_lo)
+    counts = np.where(hit, seg_hi - seg_lo + 1, 0)
+    top = np.clip(seg_hi - y_start + 1, 0, row_cumsum.size - 1)
+    bottom = np.clip(seg_lo - y_start, 0, row_cumsum.size - 1)
+    mass = np.where(hit, (row_cumsum[top] - row_cumsum[bottom]) * col_weight[None, :], 0.0)
+
+    ids, inverse = np.unique(frags[:, 4], return_inverse=True)
+    pixels = np.bincount(inverse, weights=counts.sum(axis=1), minlength=ids.size)
+    weights = np.bincount(inverse, weights=mass.sum(axis=1), minlength=ids.size)
+    return ids, pixels.astype(np.int64), weights
@@ -0,0 +1,268 @@
+"""Prebuilt, memory-mapped label-map artifacts shared by every worker process.
+
+    python -m backend.label_maps            # build artifacts for every side
+    python -m backend.label_maps --check    # exit 1 if any artifact is missing or stale
+
+Each side is rasterised once (boxes, polygons and masks, see ``shapes``) into
+the smallest unsigned dtype that holds its muscle ids and saved as ``.npy``
+under ``LABEL_MAP_DIR``. The file name holds the map size and a content hash
+of ``muscle_data.py`` and every mask file it references. Editing the body map
+therefore points at a new file, and the old one counts as stale. Workers open
+the file with ``np.load(mmap_mode="r")``, so all processes share the same
+read-only pages from the OS page cache instead of building private copies.
+
+``label_runs`` derives a sparse row-run (CSR) index from a map, so circle
+queries visit only the labelled runs in the rows they cover. ``label_sets``
+builds the same index over every muscle under each pixel (overlapping boxes
+included) for multi-label scoring.
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import logging
+import os
+import sys
+import tempfile
+from dataclasses import dataclass, replace
+from functools import lru_cache
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from .config import LABEL_MAP_DIR
+from .muscle_data import BODY_MAP, BodySideKey
+from .shapes import MASK_ROOT, item_pixels, mask_files
+
+logger = logging.getLogger(__name__)
+
+FORMAT_VERSION = 1
+_SOURCE = Path(__file__).with_name("muscle_data.py")
+
+
+def smallest_dtype(max_id: int) -> np.dtype:
+    """أصغر نوع بدون إشارة يحمل كل أرقام العضلات (كلها تحت 256 حالياً → uint8)."""
+    for dtype in (np.uint8, np.uint16, np.uint32):
+        if max_id <= np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    raise ValueError(f"Muscle id {max_id} does not fit in uint32")
+
+
+def rasterise(side: BodySideKey, width: int, height: int) -> np.ndarray:
+    """نحوّل أشكال العضلات (normalized) إلى خريطة تسميات بالبكسل (العنصر الأخير يغطي اللي قبله)."""
+    items = BODY_MAP[side]["items"]
+    label_map = np.zeros((height, width), dtype=smallest_dtype(max((item["id"] for item in items), default=0)))
+    for item in items:
+        placed = item_pixels(item, width, height)
+        if placed is None:
+            continue
+        (x1_i, y1_i, x2_i, y2_i), mask = placed
+        if mask is None:
+            label_map[y1_i:y2_i, x1_i:x2_i] = item["id"]
+        else:
+            label_map[y1_i:y2_i, x1_i:x2_i][mask] = item["id"]
+    return label_map
+
+
+@dataclass(frozen=True)
+class LabelRuns:
+    """
+    فهرس CSR للخريطة: كل صف مقسوم إلى مقاطع أفقية متصلة بنفس التسمية (بدون الخلفية).
+    مقاطع الصف y هي [row_ptr[y], row_ptr[y + 1]) وكل مقطع يغطي الأعمدة [x0, x1).
+    """
+
+    shape: Tuple[int, int]
+    row_ptr: np.ndarray
+    x0: np.ndarray
+    x1: np.ndarray
+    labels: np.ndarray
+
+    @property
+    def nbytes(self) -> int:
+        return self.row_ptr.nbytes + self.x0.nbytes + self.x1.nbytes + self.labels.nbytes
+
+
+def label_runs(label_map: np.ndarray) -> LabelRuns:
+    """يبني فهرس المقاطع من خريطة تسميات بمرور واحد (بدون حلقة على البكسلات)."""
+    height, width = label_map.shape
+    flat = np.asarray(label_map).reshape(-1)
+    change = np.ones((height, width), dtype=bool)
+    change[:, 1:] = np.asarray(label_map)[:, 1:] != np.asarray(label_map)[:, :-1]
+    starts = np.flatnonzero(change)
+    # كل صف يبدأ بمقطع، فنهاية المقطع = بداية اللي بعده (أو بداية الصف التالي = width)
+    rows = starts // width
+    x0 = starts - rows * width
+    x1 = np.append(starts[1:], flat.size) - rows * width
+    labels = flat[starts]
+    keep = labels > 0
+    rows = rows[keep]
+    return LabelRuns(
+        shape=(height, width),
+        row_ptr=np.searchsorted(rows, np.arange(height + 1)).astype(np.int64),
+        x0=x0[keep].astype(np.int32),
+        x1=x1[keep].astype(np.int32),
+        labels=labels[keep],
+    )
+
+
+MAX_SET_MUSCLES = 64
+
+
+def rasterise_bits(side: BodySideKey, width: int, height: int) -> np.ndarray:
+    """خريطة bitset (uint64): البت i مرفوع لو العنصر رقم i (بترتيب الرسم) يغطي البكسل."""
+    items = BODY_MAP[side]["items"]
+    if len(items) > MAX_SET_MUSCLES:
+        raise ValueError(f"Multi-label maps hold at most {MAX_SET_MUSCLES} muscles per side, {side} has {len(items)}")
+    bits = np.zeros((height, width), dtype=np.uint64)
+    for index, item in enumerate(items):
+        placed = item_pixels(item, width, height)
+        if placed is None:
+            continue
+        (x1_i, y1_i, x2_i, y2_i), mask = placed
+        window = bits[y1_i:y2_i, x1_i:x2_i]
+        if mask is None:
+            window |= np.uint64(1) << np.uint64(index)
+        else:
+            window[mask] |= np.uint64(1) << np.uint64(index)
+    return bits
+
+
+@dataclass(frozen=True)
+class LabelSets:
+    """
+    فهرس مقاطع متعدد التسميات: تسمية كل مقطع رقم مجموعة، والمجموعة = كل العضلات تحت
+    البكسل. members[s, j] = 1 لو العضلة muscle_ids[j] ضمن المجموعة s، و top هي العضلة
+    المرسومة أخيراً (نفس خريطة التسمية الواحدة).
+    """
+
+    runs: LabelRuns
+    muscle_ids: np.ndarray
+    members: np.ndarray
+    top: np.ndarray
+
+    @property
+    def nbytes(self) -> int:
+        return self.runs.nbytes + self.muscle_ids.nbytes + self.members.nbytes + self.top.nbytes
+
+
+def label_sets(side: BodySideKey, width: int, height: int) -> LabelSets:
+    """يبني LabelSets من خريطة الـ bitset (المجموعات تُستخرج من المقاطع، لا من كل البكسلات)."""
+    muscle_ids = np.array([item["id"] for item in BODY_MAP[side]["items"]], dtype=np.int64)
+    runs = label_runs(rasterise_bits(side, width, height))
+    sets, inverse = np.unique(runs.labels, return_inverse=True)
+    shifts = np.arange(muscle_ids.size, dtype=np.uint64)
+    members = ((sets[:, None] >> shifts) & np.uint64(1)).astype(np.float64)
+    top = np.zeros_like(members)
+    top[np.arange(sets.size), members.shape[1] - 1 - np.argmax(members[:, ::-1], axis=1)] = 1.0
+    return LabelSets(
+        runs=replace(runs, labels=inverse.reshape(-1).astype(smallest_dtype(max(sets.size - 1, 0)))),
+        muscle_ids=muscle_ids,
+        members=members,
+        top=top,
+    )
+
+
+@lru_cache(maxsize=1)
+def source_digest() -> str:
+    """
+    hash لمحتوى muscle_data.py وملفات الأقنعة اللي يشير لها (ونسخة الصيغة)؛ أي تعديل
+    على أي منها يغيّر اسم الـ artifact.
+    """
+    digest = hashlib.sha256(f"v{FORMAT_VERSION}".encode())
+    digest.update(_SOURCE.read_bytes())
+    for path in mask_files(item for side in BODY_MAP.values() for item in side["items"]):
+        digest.update(path.encode())
+        digest.update((MASK_ROOT / path).read_bytes())
+    return digest.hexdigest()[:16]
+
+
+def artifact_path(side: BodySideKey, width: int, height: int, directory: Optional[Path] = None) -> Path:
+    return (directory or LABEL_MAP_DIR) / f"label_map-{side}-{width}x{height}-{source_digest()}.npy"
+
+
+def _stale_artifacts(side: BodySideKey, width: int, height: int, directory: Path) -> List[Path]:
+    current = artifact_path(side, width, height, directory)
+    return [path for path in directory.glob(f"label_map-{side}-{width}x{height}-*.npy") if path != current]
+
+
+def save(side: BodySideKey, width: int, height: int, directory: Optional[Path] = None) -> Path:
+    """يبني الخريطة ويكتبها بشكل ذري (ملف مؤقت ثم rename)، ويحذف نسخ الـ hash القديمة."""
+    directory = directory or LABEL_MAP_DIR
+    directory.mkdir(parents=True, exist_ok=True)
+    path = artifact_path(side, width, height, directory)
+    fd, tmp = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as handle:
+            np.save(handle, rasterise(side, width, height))
+        os.chmod(tmp, 0o644)  # mkstemp ينشئه 0600؛ workers بمستخدم آخر لازم يقرونه
+        os.replace(tmp, path)
+    except BaseException:
+        Path(tmp).unlink(missing_ok=True)
+        raise
+    for stale in _stale_artifacts(side, width, height, directory):
+        stale.unlink(missing_ok=True)
+    return path
+
+
+def load(side: BodySideKey, width: int, height: int, directory: Optional[Path] = None) -> Optional[np.ndarray]:
+    """يفتح الـ artifact الحالي كـ memmap للقراءة فقط، أو None لو ناقص/قديم/تالف."""
+    path = artifact_path(side, width, height, directory)
+    try:
+        label_map = np.load(path, mmap_mode="r")
+    except FileNotFoundError:
+        return None
+    except (OSError, ValueError) as exc:
+        logger.warning("Ignoring unreadable label map artifact %s: %s", path, exc)
+        return None
+    if label_map.shape != (height, width) or label_map.dtype.kind != "u":
+        logger.warning("Ignoring label map artifact %s with shape %s", path, label_map.shape)
+        return None
+    return label_map
+
+
+def load_or_build(side: BodySideKey, width: int, height: int, directory: Optional[Path] = None) -> np.ndarray:
+    """
+    الـ artifact لو موجود وحديث؛ وإلا نكتبه (أول worker يكتب والباقي يفتحونه) ونفتحه.
+    لو القرص للقراءة فقط نرجع لبناء الخريطة في الذاكرة.
+    """
+    directory = directory or LABEL_MAP_DIR
+    label_map = load(side, width, height, directory)
+    if label_map is not None:
+        return label_map
+    if directory.exists() and _stale_artifacts(side, width, height, directory):
+        logger.info("Label map artifact for %s is stale (muscle_data.py changed); rebuilding", side)
+    try:
+        save(side, width, height, directory)
+    except OSError as exc:
+        logger.warning("Cannot write label map artifact to %s (%s); building in memory", directory, exc)
+        return rasterise(side, width, height)
+    label_map = load(side, width, height, directory)
+    return label_map if label_map is not None else rasterise(side, width, height)
+
+
+def main(argv: Sequence[str] | None = None) -> int:
+    from .logic import LABEL_HEIGHT, LABEL_WIDTH
+
+    parser = argparse.ArgumentParser(description="Build the memory-mapped label map artifacts.")
+    parser.add_argument("--check", action="store_true", help="only report missing or stale artifacts")
+    parser.add_argument("--dir", type=Path, default=LABEL_MAP_DIR)
+    args = parser.parse_args(argv)
+
+    missing = 0
+    for side in BODY_MAP:
+        path = artifact_path(side, LABEL_WIDTH, LABEL_HEIGHT, args.dir)
+        if args.check:
+            ok = load(side, LABEL_WIDTH, LABEL_HEIGHT, args.dir) is not None
+            missing += not ok
+            print(f"{side:6s} {'ok' if ok else 'MISSING/STALE'} {path}")
+            continue
+        save(side, LABEL_WIDTH, LABEL_HEIGHT, args.dir)
+        label_map = np.load(path, mmap_mode="r")
+        print(f"{side:6s} {label_map.dtype} {label_map.shape} {path.stat().st_size / 1024:.0f} KB -> {path}")
+    return 1 if missing else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,396 @@
+"""Async OpenAI chat completions with a pooled HTTP client, deadlines and a concurrency cap."""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import logging
+import time
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+
+from .breaker import CircuitBreaker, CircuitOpenError
+from .config import (
+    OPENAI_API_KEY,
+    OPENAI_BASE_URL,
+    OPENAI_BREAKER,
+    OPENAI_BREAKER_ERROR_RATE,
+    OPENAI_BREAKER_HALF_OPEN_PROBES,
+    OPENAI_BREAKER_MIN_CALLS,
+    OPENAI_BREAKER_OPEN_S,
+    OPENAI_BREAKER_SLOW_RATE,
+    OPENAI_BREAKER_WINDOW_S,
+    OPENAI_CONNECT_TIMEOUT_S,
+    OPENAI_LATENCY_SLO_S,
+    OPENAI_MAX_CONCURRENCY,
+    OPENAI_MAX_CONNECTIONS,
+    OPENAI_MAX_KEEPALIVE,
+    OPENAI_MAX_RETRIES,
+    OPENAI_MODEL,
+    OPENAI_SIM_429_RATE,
+    OPENAI_SIM_5XX_RATE,
+    OPENAI_SIM_LATENCY_MEDIAN_S,
+    OPENAI_SIM_LATENCY_P95_S,
+    OPENAI_SIM_RECORDINGS,
+    OPENAI_SIM_SEED,
+    OPENAI_SIM_TIMEOUT_RATE,
+    OPENAI_SIM_TOKENS_PER_S,
+    OPENAI_SIMULATOR,
+    OPENAI_SINGLE_FLIGHT,
+    OPENAI_TIMEOUT_S,
+)
+from .llm_sim import RecordingOpenAI, ReplayOpenAI, SimulatedOpenAI, _SimulatedClient
+
+logger = logging.getLogger(__name__)
+
+
+class ChatCompleter:
+    """
+    غلاف حول AsyncOpenAI:
+    - deadline_s: مهلة كاملة للاستدعاء (انتظار الدور + الطلب نفسه).
+    - max_concurrency: أقصى عدد طلبات upstream في نفس اللحظة (Semaphore)؛ الباقي ينتظر دوره.
+      انتظار الدور ازدحام محلي: ما يُحسب من زمن upstream في الـ breaker، وانتهاء المهلة
+      فيه يُعد في queue_timeouts بدل ما يُسجّل فشل upstream.
+    - single_flight: الطلبات المتزامنة بنفس الرسائل والإعدادات تشترك في استدعاء upstream واحد.
+    - breaker: قاطع دائرة اختياري؛ لما يكون مفتوح نرفع CircuitOpenError فوراً، ويقصّر المهلة
+      إلى latency SLO لما upstream يبطئ.
+    - client_factory: بديل عن client؛ يُنشأ الـ client (واستيراد openai الثقيل) أول ما نحتاجه
+      أو في warm_up، مو وقت استيراد التطبيق.
+    """
+
+    def __init__(
+        self,
+        client: Any = None,
+        *,
+        model: str,
+        deadline_s: float,
+        max_concurrency: int,
+        single_flight: bool = True,
+        breaker: Optional[CircuitBreaker] = None,
+        client_factory: Optional[Callable[[], Any]] = None,
+    ) -> None:
+        if client is None and client_factory is None:
+            raise ValueError("ChatCompleter needs a client or a client_factory")
+        self._client = client
+        self._client_factory = client_factory
+        self.model = model
+        self.deadline_s = deadline_s
+        self.max_concurrency = max(max_concurrency, 1)
+        self.single_flight = single_flight
+        self.breaker = breaker
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        self._pending: Dict[str, "asyncio.Future[str]"] = {}
+        self.coalesced = 0
+        self.in_flight = 0
+        self.waiting = 0
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+        self.queue_timeouts = 0
+
+    @property
+    def client(self) -> Any:
+        if self._client is None:
+            assert self._client_factory is not None
+            self._client = self._client_factory()
+        return self._client
+
+    @client.setter
+    def client(self, value: Any) -> None:
+        self._client = value
+
+    def warm_up(self) -> None:
+        """ينشئ الـ client مسبقاً (يستورد openai ويجهز الـ pool) حتى ما يدفعها أول طلب."""
+        self.client
+
+    async def _acquire(self, timeout_s: float) -> bool:
+        """
+        يحجز مكان في حد التوازي خلال timeout_s ويرجع True لو انتظر دوره. انتهاء المهلة
+        هنا يُعد queue_timeout ويرجّع الـ probe المحجوز (abandon) بدون ما يسجّل شي على upstream.
+        """
+        queued = self._semaphore.locked()
+        self.waiting += 1
+        acquired = False
+        try:
+            async with asyncio.timeout(timeout_s):
+                await self._semaphore.acquire()
+                acquired = True
+        except BaseException as exc:
+            # الإلغاء ممكن يوصل بعد ما تم الحجز؛ نرجّعه حتى ما يضيع مكان من الحد
+            if acquired:
+                self._semaphore.release()
+            if isinstance(exc, TimeoutError):
+                self.queue_timeouts += 1
+            self._abandon()
+            raise
+        finally:
+            self.waiting -= 1
+        self.in_flight += 1
+        return queued
+
+    def _release(self) -> None:
+        self.in_flight -= 1
+        self._semaphore.release()
+
+    async def complete(
+        self, messages: List[Dict[str, str]], *, temperature: float = 0.6, max_tokens: int = 350
+    ) -> str:
+        """يرجع نص الرد، أو يرفع asyncio.TimeoutError / أخطاء الـ SDK."""
+        if not self.single_flight:
+            return await self._complete(messages, temperature, max_tokens)
+
+        key = _request_key(messages, temperature, max_tokens)
+        pending = self._pending.get(key)
+        if pending is not None:
+            self.coalesced += 1
+        else:
+            pending = asyncio.ensure_future(self._complete(messages, temperature, max_tokens))
+            self._pending[key] = pending
+            pending.add_done_callback(lambda done: self._finish(key, done))
+        # shield: لو انقطع أحد المنتظرين ما نلغي الطلب على الباقين
+        return await asyncio.shield(pending)
+
+    def _finish(self, key: str, done: "asyncio.Future[str]") -> None:
+        self._pending.pop(key, None)
+        if not done.cancelled():
+            done.exception()  # يمنع تحذير "exception was never retrieved" لو ما بقى أحد ينتظر
+
+    def _admit(self) -> float:
+        """يرجع مهلة هذا الاستدعاء، أو يرفع CircuitOpenError لو الدائرة مفتوحة."""
+        if self.breaker is None:
+            return self.deadline_s
+        if not self.breaker.allow():
+            raise CircuitOpenError("upstream circuit is open")
+        return self.breaker.deadline(self.deadline_s)
+
+    def _record(self, ok: bool, start: float) -> None:
+        if self.breaker is not None:
+            self.breaker.record(ok, time.perf_counter() - start)
+
+    def _abandon(self) -> None:
+        if self.breaker is not None:
+            self.breaker.abandon()
+
+    def _record_timeout(self, start: float, queued: bool) -> None:
+        """
+        مهلة upstream. لو الطلب انتظر دوره، upstream أخذ جزء من المهلة بس؛ نحسبها عليه
+        فقط لو تعدّى latency SLO (بطء حقيقي)، وإلا ما نحكم عليه (abandon).
+        """
+        if self.breaker is None:
+            return
+        elapsed = time.perf_counter() - start
+        slo_s = self.breaker.latency_slo_s
+        if not queued or (slo_s > 0 and elapsed >= slo_s):
+            self.breaker.record(False, elapsed)
+        else:
+            self.breaker.abandon()
+
+    async def _complete(self, messages: List[Dict[str, str]], temperature: float, max_tokens: int) -> str:
+        deadline_s = self._admit()
+        self.calls += 1
+        deadline = time.monotonic() + deadline_s
+        queued = await self._acquire(deadline_s)
+        # مؤقت الـ breaker يبدأ بعد الحجز: انتظار الدور مو من زمن upstream
+        start = time.perf_counter()
+        try:
+            completion = await asyncio.wait_for(
+                self.client.chat.completions.create(
+                    model=self.model, messages=messages, temperature=temperature, max_tokens=max_tokens
+                ),
+                max(deadline - time.monotonic(), 0.0),
+            )
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            self._record_timeout(start, queued)
+            raise
+        except asyncio.CancelledError:
+            self._abandon()
+            raise
+        except Exception:
+            self.errors += 1
+            self._record(False, start)
+            raise
+        finally:
+            self._release()
+        self._record(True, start)
+        return (completion.choices[0].message.content or "").strip()
+
+    async def stream(
+        self, messages: List[Dict[str, str]], *, temperature: float = 0.6, max_tokens: int = 350
+    ) -> AsyncIterator[str]:
+        """
+        يبث أجزاء الرد أول بأول. نفس deadline_s تنطبق على البث كامل (انتظار الدور +
+        كل جزء)، ونفس حد التوازي يبقى محجوز لين يخلص البث. الـ breaker يقيس زمن أول جزء.
+        """
+        deadline_s = self._admit()
+        self.calls += 1
+        first_chunk: Optional[float] = None
+        deadline = time.monotonic() + deadline_s
+
+        def remaining() -> float:
+            left = deadline - time.monotonic()
+            if left <= 0:
+                raise asyncio.TimeoutError
+            return left
+
+        # انتظار الدور ازدحام محلي: لا يُحسب على upstream ولا يدخل زمن أول جزء
+        queued = await self._acquire(deadline_s)
+        start = time.perf_counter()
+        stream = None
+        try:
+            stream = await asyncio.wait_for(
+                self.client.chat.completions.create(
+                    model=self.model,
+                    messages=messages,
+                    temperature=temperature,
+                    max_tokens=max_tokens,
+                    stream=True,
+                ),
+                remaining(),
+            )
+            chunks = stream.__aiter__()
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), remaining())
+                except StopAsyncIteration:
+                    break
+                if not chunk.choices:
+                    continue
+                delta = chunk.choices[0].delta.content
+                if delta:
+                    if first_chunk is None:
+                        first_chunk = time.perf_counter()
+                        self._record(True, start)
+                    yield delta
+            if first_chunk is None:
+                self._record(True, start)
+        except asyncio.TimeoutError:
+            self.timeouts += 1
+            if first_chunk is None:
+                self._record_timeout(start, queued)
+            raise
+        except (asyncio.CancelledError, GeneratorExit):
+            if first_chunk is None:
+                self._abandon()
+            raise
+        except Exception:
+            self.errors += 1
+            if first_chunk is None:
+                self._record(False, start)
+            raise
+        finally:
+            self._release()
+            close = getattr(stream, "close", None)
+            if close is not None:
+                await close()
+
+    async def aclose(self) -> None:
+        close = getattr(self._client, "close", None)
+        if close is not None:
+            await close()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model": self.model,
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+            "queue_timeouts": self.queue_timeouts,
+            "coalesced": self.coalesced,
+            "single_flight_pending": len(self._pending),
+            "breaker": self.breaker.stats() if self.breaker else None,
+            "client_ready": self._client is not None,
+            "simulator": self._client.stats() if isinstance(self._client, _SimulatedClient) else None,
+        }
+
+
+def _request_key(messages: List[Dict[str, str]], temperature: float, max_tokens: int) -> str:
+    payload = json.dumps([messages, temperature, max_tokens], ensure_ascii=False, sort_keys=True)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def build_completer(
+    api_key: Optional[str] = OPENAI_API_KEY,
+    base_url: Optional[str] = OPENAI_BASE_URL,
+    simulator: str = OPENAI_SIMULATOR,
+) -> Optional[ChatCompleter]:
+    """
+    ينشئ ChatCompleter على AsyncOpenAI بـ connection pool مشترك، أو None بدون مفتاح.
+    simulator ("simulate" / "replay") يبدّل الـ client بمحاكي محلي بدون مفتاح، و"record"
+    يغلّف الـ client الحقيقي ويسجّل ردوده للـ replay.
+    """
+    if simulator not in ("", "simulate", "record", "replay"):
+        raise ValueError(f"Unknown OPENAI_SIMULATOR mode: {simulator!r}")
+    if simulator in ("simulate", "replay"):
+        return _wrap(lambda: _build_simulator(simulator))
+    if not api_key:
+        return None
+
+    def factory() -> Any:
+        client = _openai_client(api_key, base_url)
+        return RecordingOpenAI(client, OPENAI_SIM_RECORDINGS) if simulator == "record" else client
+
+    return _wrap(factory)
+
+
+def _openai_client(api_key: str, base_url: Optional[str]) -> Any:
+    """AsyncOpenAI بـ connection pool مشترك. الاستيراد هنا لأن openai وحده ~0.3 ثانية."""
+    import httpx
+    from openai import AsyncOpenAI, DefaultAsyncHttpxClient, Timeout
+
+    http_client = DefaultAsyncHttpxClient(
+        limits=httpx.Limits(
+            max_connections=OPENAI_MAX_CONNECTIONS,
+            max_keepalive_connections=OPENAI_MAX_KEEPALIVE,
+        ),
+        timeout=Timeout(OPENAI_TIMEOUT_S, connect=OPENAI_CONNECT_TIMEOUT_S),
+    )
+    return AsyncOpenAI(
+        api_key=api_key,
+        base_url=base_url or None,
+        http_client=http_client,
+        max_retries=OPENAI_MAX_RETRIES,
+    )
+
+
+def _build_simulator(mode: str) -> Any:
+    if mode == "replay":
+        return ReplayOpenAI(OPENAI_SIM_RECORDINGS)
+    return SimulatedOpenAI(
+        latency_median_s=OPENAI_SIM_LATENCY_MEDIAN_S,
+        latency_p95_s=OPENAI_SIM_LATENCY_P95_S,
+        tokens_per_s=OPENAI_SIM_TOKENS_PER_S,
+        timeout_rate=OPENAI_SIM_TIMEOUT_RATE,
+        rate_limit_rate=OPENAI_SIM_429_RATE,
+        server_error_rate=OPENAI_SIM_5XX_RATE,
+        max_retries=OPENAI_MAX_RETRIES,
+        seed=OPENAI_SIM_SEED or None,
+    )
+
+
+def _wrap(client_factory: Callable[[], Any]) -> ChatCompleter:
+    return ChatCompleter(
+        client_factory=client_factory,
+        model=OPENAI_MODEL or "gpt-4o-mini",
+        deadline_s=OPENAI_TIMEOUT_S,
+        max_concurrency=OPENAI_MAX_CONCURRENCY,
+        single_flight=OPENAI_SINGLE_FLIGHT,
+        breaker=_build_breaker(),
+    )
+
+
+def _build_breaker() -> Optional[CircuitBreaker]:
+    if not OPENAI_BREAKER:
+        return None
+    return CircuitBreaker(
+        window_s=OPENAI_BREAKER_WINDOW_S,
+        min_calls=OPENAI_BREAKER_MIN_CALLS,
+        error_rate=OPENAI_BREAKER_ERROR_RATE,
+        slow_rate=OPENAI_BREAKER_SLOW_RATE,
+        latency_slo_s=OPENAI_LATENCY_SLO_S,
+        open_s=OPENAI_BREAKER_OPEN_S,
+        half_open_probes=OPENAI_BREAKER_HALF_OPEN_PROBES,
+    )
@@ -0,0 +1,291 @@
+"""Offline stand-ins for the AsyncOpenAI client: latency/error simulator and record/replay.
+
+Both expose the part of the SDK that ``ChatCompleter`` uses
+(``client.chat.completions.create(..., stream=...)`` and ``close()``), so the
+deadline, concurrency cap, single-flight and circuit breaker all run exactly
+as they do against OpenAI.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import hashlib
+import json
+import math
+import random
+import re
+import threading
+import time
+from abc import ABC, abstractmethod
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, AsyncIterator, Dict, List, Optional
+
+# نفس backoff الـ SDK بين المحاولات: 0.5s مضاعفة لين 8s، مع jitter لحد 25%
+RETRY_INITIAL_S = 0.5
+RETRY_MAX_S = 8.0
+
+DEFAULT_SIM_REPLY = (
+    "تمام! ابدأ بإحماء خفيف دقيقتين، بعدها مدّ العضلة ببطء ٢٠ ثانية وكررها ٣ مرات. "
+    "خل التنفس هادي، ولو حسّيت بألم حاد وقف مباشرة."
+)
+
+
+class SimulatedAPIError(Exception):
+    """خطأ upstream مُحاكى (429 أو 5xx) بنفس شكل أخطاء الـ SDK: فيه status_code."""
+
+    def __init__(self, status_code: int) -> None:
+        super().__init__(f"simulated upstream error {status_code}")
+        self.status_code = status_code
+
+
+def _message_key(messages: List[Dict[str, str]]) -> str:
+    payload = json.dumps(messages, ensure_ascii=False, sort_keys=True)
+    return hashlib.blake2b(payload.encode("utf-8"), digest_size=16).hexdigest()
+
+
+def _pieces(text: str) -> List[str]:
+    return re.findall(r"\S+\s*", text) or [text]
+
+
+def _completion(text: str) -> Any:
+    return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=text))])
+
+
+def _chunk(text: str) -> Any:
+    return SimpleNamespace(choices=[SimpleNamespace(delta=SimpleNamespace(content=text))])
+
+
+class _Stream:
+    """بث أجزاء الرد بتوقيت محدد مسبقاً: (التأخير قبل الجزء، نص الجزء)."""
+
+    def __init__(self, schedule: List[tuple[float, str]]) -> None:
+        self._schedule = schedule
+
+    def __aiter__(self) -> AsyncIterator[Any]:
+        return self._chunks()
+
+    async def _chunks(self) -> AsyncIterator[Any]:
+        for delay, text in self._schedule:
+            if delay > 0:
+                await asyncio.sleep(delay)
+            yield _chunk(text)
+
+    async def close(self) -> None:
+        return None
+
+
+class _Completions:
+    def __init__(self, owner: Any) -> None:
+        self._owner = owner
+
+    async def create(self, *, model: str, messages: List[Dict[str, str]], stream: bool = False, **params: Any) -> Any:
+        return await self._owner.create(model=model, messages=messages, stream=stream, **params)
+
+
+class _SimulatedClient(ABC):
+    """الأساس المشترك: يوفّر client.chat.completions.create وعدادات للـ /health."""
+
+    mode = ""
+
+    def __init__(self) -> None:
+        self.chat = SimpleNamespace(completions=_Completions(self))
+        self.counts: Dict[str, int] = {}
+
+    def _count(self, outcome: str) -> None:
+        self.counts[outcome] = self.counts.get(outcome, 0) + 1
+
+    @abstractmethod
+    async def create(self, *, messages: List[Dict[str, str]], stream: bool = False, **params: Any) -> Any:
+        """نفس توقيع client.chat.completions.create."""
+
+    async def close(self) -> None:
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        return {"mode": self.mode, "outcomes": dict(self.counts)}
+
+
+class SimulatedOpenAI(_SimulatedClient):
+    """
+    محاكي upstream للـ load testing:
+    - زمن أول توكن من توزيع log-normal محدد بـ latency_median_s و latency_p95_s؛
+    - بعده التوكنات بمعدل tokens_per_s (البث يوصلها تدريجياً، والطلب العادي ينتظرها كلها)؛
+    - timeout_rate: الطلب يعلّق hang_s (أطول من المهلة) فيطلع timeout من ChatCompleter؛
+    - rate_limit_rate / server_error_rate: خطأ 429 / 5xx بعد تأخير قصير. الـ SDK يعيد هذي
+      الأخطاء بنفسه، فنعيدها هنا max_retries مرة (OPENAI_MAX_RETRIES) بنفس الـ backoff،
+      وبعدها فقط يطلع SimulatedAPIError لـ ChatCompleter.
+    """
+
+    mode = "simulate"
+
+    def __init__(
+        self,
+        *,
+        latency_median_s: float = 0.8,
+        latency_p95_s: float = 2.0,
+        tokens_per_s: float = 60.0,
+        timeout_rate: float = 0.0,
+        rate_limit_rate: float = 0.0,
+        server_error_rate: float = 0.0,
+        hang_s: float = 3600.0,
+        max_retries: int = 0,
+        reply: str = DEFAULT_SIM_REPLY,
+        seed: Optional[int] = None,
+    ) -> None:
+        super().__init__()
+        self.latency_median_s = latency_median_s
+        # p95 = median * exp(1.645 * sigma) في التوزيع log-normal
+        self._sigma = math.log(max(latency_p95_s, latency_median_s) / latency_median_s) / 1.645 if latency_median_s > 0 else 0.0
+        self.tokens_per_s = tokens_per_s
+        self.timeout_rate = timeout_rate
+        self.rate_limit_rate = rate_limit_rate
+        self.server_error_rate = server_error_rate
+        self.hang_s = hang_s
+        self.max_retries = max(max_retries, 0)
+        self.reply = reply
+        self._rng = random.Random(seed)
+
+    def _first_token_s(self) -> float:
+        if self.latency_median_s <= 0:
+            return 0.0
+        return self.latency_median_s * math.exp(self._sigma * self._rng.gauss(0.0, 1.0))
+
+    def _retry_delay_s(self, retry: int) -> float:
+        return min(RETRY_INITIAL_S * 2**retry, RETRY_MAX_S) * (1 - 0.25 * self._rng.random())
+
+    async def _attempt(self) -> Optional[int]:
+        """محاولة وحدة: ترجع status الخطأ المحقون، أو None لو المحاولة نجحت."""
+        roll = self._rng.random()
+        if roll < self.timeout_rate:
+            self._count("timeout")
+            await asyncio.sleep(self.hang_s)
+        roll -= self.timeout_rate
+        if roll < self.rate_limit_rate + self.server_error_rate:
+            status = 429 if roll < self.rate_limit_rate else self._rng.choice((500, 502, 503))
+            self._count(str(status))
+            await asyncio.sleep(min(self._first_token_s(), 0.05))
+            return status
+        return None
+
+    async def create(self, *, messages: List[Dict[str, str]], stream: bool = False, **_params: Any) -> Any:
+        for retry in range(self.max_retries + 1):
+            status = await self._attempt()
+            if status is None:
+                break
+            if retry == self.max_retries:
+                raise SimulatedAPIError(status)
+            self._count("retry")
+            await asyncio.sleep(self._retry_delay_s(retry))
+
+        self._count("ok")
+        first_s = self._first_token_s()
+        pieces = _pieces(self.reply)
+        per_token_s = 1.0 / self.tokens_per_s if self.tokens_per_s > 0 else 0.0
+        if stream:
+            await asyncio.sleep(first_s)
+            return _Stream([(0.0 if i == 0 else per_token_s, piece) for i, piece in enumerate(pieces)])
+        await asyncio.sleep(first_s + per_token_s * (len(pieces) - 1))
+        return _completion(self.reply)
+
+
+class ReplayOpenAI(_SimulatedClient):
+    """
+    يعيد ردود OpenAI حقيقية مسجلة سابقاً (JSONL من RecordingOpenAI) بنفس توقيتها.
+    نفس الرسائل ترجع ردها المسجل؛ الرسائل الجديدة تاخذ تسجيلاً ثابتاً حسب hash الرسائل.
+    """
+
+    mode = "replay"
+
+    def __init__(self, path: str) -> None:
+        super().__init__()
+        self.records: List[Dict[str, Any]] = []
+        for line in Path(path).read_text(encoding="utf-8").splitlines():
+            if line.strip():
+                self.records.append(json.loads(line))
+        if not self.records:
+            raise ValueError(f"No recorded completions in {path}")
+        self._by_key = {record["key"]: record for record in self.records}
+
+    def _record_for(self, messages: List[Dict[str, str]]) -> Dict[str, Any]:
+        key = _message_key(messages)
+        record = self._by_key.get(key)
+        if record is not None:
+            self._count("exact")
+            return record
+        self._count("substitute")
+        return self.records[int(key, 16) % len(self.records)]
+
+    async def create(self, *, messages: List[Dict[str, str]], stream: bool = False, **_params: Any) -> Any:
+        record = self._record_for(messages)
+        first_s = float(record.get("first_chunk_s") or record["latency_s"])
+        if not stream:
+            await asyncio.sleep(float(record["latency_s"]))
+            return _completion(record["reply"])
+        pieces = _pieces(record["reply"])
+        rest_s = max(float(record["latency_s"]) - first_s, 0.0) / max(len(pieces) - 1, 1)
+        await asyncio.sleep(first_s)
+        return _Stream([(0.0 if i == 0 else rest_s, piece) for i, piece in enumerate(pieces)])
+
+
+class _RecordingStream:
+    def __init__(self, owner: "RecordingOpenAI", stream: Any, key: str, start: float) -> None:
+        self._owner, self._stream, self._key, self._start = owner, stream, key, start
+
+    def __aiter__(self) -> AsyncIterator[Any]:
+        return self._chunks()
+
+    async def _chunks(self) -> AsyncIterator[Any]:
+        parts: List[str] = []
+        first_chunk_s: Optional[float] = None
+        async for chunk in self._stream:
+            if chunk.choices and chunk.choices[0].delta.content:
+                if first_chunk_s is None:
+                    first_chunk_s = time.perf_counter() - self._start
+                parts.append(chunk.choices[0].delta.content)
+            yield chunk
+        self._owner.write(self._key, "".join(parts), time.perf_counter() - self._start, first_chunk_s)
+
+    async def close(self) -> None:
+        close = getattr(self._stream, "close", None)
+        if close is not None:
+            await close()
+
+
+class RecordingOpenAI(_SimulatedClient):
+    """يمرر الطلبات لـ AsyncOpenAI الحقيقي ويسجّل كل رد ناجح (مع زمنه) في ملف JSONL للـ replay."""
+
+    mode = "record"
+
+    def __init__(self, client: Any, path: str) -> None:
+        super().__init__()
+        self.client = client
+        self.path = Path(path)
+        self._lock = threading.Lock()
+
+    def write(self, key: str, reply: str, latency_s: float, first_chunk_s: Optional[float]) -> None:
+        line = json.dumps(
+            {
+                "key": key,
+                "reply": reply,
+                "latency_s": round(latency_s, 4),
+                "first_chunk_s": round(first_chunk_s, 4) if first_chunk_s is not None else None,
+            },
+            ensure_ascii=False,
+        )
+        with self._lock, self.path.open("a", encoding="utf-8") as handle:
+            handle.write(line + "\n")
+        self._count("recorded")
+
+    async def create(self, *, messages: List[Dict[str, str]], stream: bool = False, **params: Any) -> Any:
+        start = time.perf_counter()
+        key = _message_key(messages)
+        if stream:
+            upstream = await self.client.chat.completions.create(messages=messages, stream=True, **params)
+            return _RecordingStream(self, upstream, key, start)
+        completion = await self.client.chat.completions.create(messages=messages, **params)
+        self.write(key, completion.choices[0].message.content or "", time.perf_counter() - start, None)
+        return completion
+
+    async def close(self) -> None:
+        await self.client.close()
@@ -3,13 +3,28 @@
 
 from __future__ import annotations
 
+import time
 from dataclasses import dataclass
 from functools import lru_cache
-from typing import Dict, Iterable, List, Tuple, TypedDict
+from typing import Callable, Dict, Iterable, List, Sequence, Tuple, TypedDict
 
 import math
 import numpy as np
-
+from numpy.lib.stride_tricks import sliding_window_view
+
+from .cache import LRUCache
+from .config import (
+    ANALYZE_CACHE_MAX_BYTES,
+    ANALYZE_CACHE_QUANTUM,
+    ANALYZE_CACHE_SIZE,
+    ANALYZE_BATCH_CHUNK_PIXELS,
+    ANALYZE_ENGINE,
+    ANALYZE_OVERLAP,
+    LABEL_MAP_ARTIFACTS,
+)
+from . import label_maps, muscle_data
+from .geometry import circle_box_overlaps, circle_spans, visible_fragments
+from .metrics import stage
 from .muscle_data import BODY_MAP, BodySideKey, build_id_lookup
 
 # أبعاد الخريطة التي نرسم عليها مربعات العضلات (ثابتة، عمودي)
@@ -25,6 +40,24 @@ def circle_mask(height: int, width: int, cx: float, cy: float, radius: float) ->
     return (xx - cx) ** 2 + (yy - cy) ** 2 <= radius ** 2
 
 
+def circle_window(
+    height: int, width: int, cx: float, cy: float, radius: float
+) -> Tuple[slice, slice]:
+    """
+    يرجع نافذة (bounding box) الدائرة مقصوصة على حدود الخريطة كـ (rows, cols).
+    النافذة قد تكون أوسع بقليل من الدائرة، لكن لا تفوّت أي بكسل داخلها.
+    """
+    y0 = min(max(int(math.floor(cy - radius)), 0), height)
+    y1 = min(max(int(math.ceil(cy + radius)) + 1, y0), height)
+    x0 = min(max(int(math.floor(cx - radius)), 0), width)
+    x1 = min(max(int(math.ceil(cx + radius)) + 1, x0), width)
+    return slice(y0, y1), slice(x0, x1)
+
+
+# تحت هذه المساحة (بكسلات نافذة الدائرة) المسح الكثيف أسرع من فهرس المقاطع
+SPARSE_MIN_WINDOW_PIXELS = 2048
+
+
 @dataclass(frozen=True)
 class TopResult:
     muscle_id: int
@@ -34,19 +67,45 @@ class TopResult:
 
 @lru_cache(maxsize=None)
 def _build_label_map(side: BodySideKey) -> np.ndarray:
-    """نحوّل مربعات العضلات (normalized) إلى خريطة تسميات بالبكسل."""
-    label_map = np.zeros((LABEL_HEIGHT, LABEL_WIDTH), dtype=np.int32)
-    side_data = BODY_MAP[side]
-    for item in side_data["items"]:
-        x1, y1, x2, y2 = item["box_norm"]
-        x1_i = max(int(x1 * LABEL_WIDTH), 0)
-        x2_i = min(int(x2 * LABEL_WIDTH), LABEL_WIDTH)
-        y1_i = max(int(y1 * LABEL_HEIGHT), 0)
-        y2_i = min(int(y2 * LABEL_HEIGHT), LABEL_HEIGHT)
-        if x2_i <= x1_i or y2_i <= y1_i:
-            continue
-        label_map[y1_i:y2_i, x1_i:x2_i] = item["id"]
-    return label_map
+    """
+    خريطة تسميات بالبكسل (أصغر dtype يكفي أرقام العضلات). من artifact مشترك عبر mmap لو
+    مفعّل و BODY_MAP ما تغيّر داخل الـ process عن محتوى الملف؛ وإلا تُبنى في الذاكرة.
+    """
+    if LABEL_MAP_ARTIFACTS and _map_fingerprint() == _SOURCE_FINGERPRINT:
+        return label_maps.load_or_build(side, LABEL_WIDTH, LABEL_HEIGHT)
+    return label_maps.rasterise(side, LABEL_WIDTH, LABEL_HEIGHT)
+
+
+def gaussian_sigma(radius: float, sigma_scale: float) -> float:
+    """انحراف الوزن الغوسي بالبكسل لنصف قطر معيّن."""
+    return max(sigma_scale * radius, 0.75)  # كان 1.0 → نخفضه قليلاً
+
+
+def gaussian_axes(
+    rows: slice, cols: slice, cx: float, cy: float, radius: float, sigma_scale: float
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    أوزان الصفوف والأعمدة (wy, wx) بحيث وزن البكسل = wy[y]·wx[x] = exp(-d²/2σ²).
+    الغوسي الدائري منفصل، فـ exp يُحسب لصفوف وأعمدة النافذة فقط (O(r) لا O(r²)).
+    """
+    two_sigma_sq = 2 * gaussian_sigma(radius, sigma_scale) ** 2
+    return (
+        np.exp(-((np.arange(rows.start, rows.stop) - cy) ** 2) / two_sigma_sq),
+        np.exp(-((np.arange(cols.start, cols.stop) - cx) ** 2) / two_sigma_sq),
+    )
+
+
+def _rank_results(
+    ids: np.ndarray, pixels: np.ndarray, weights: np.ndarray, *, k: int, min_pixels: int
+) -> List[TopResult]:
+    """يفلتر حسب min_pixels والوزن ويرتّب تنازلياً ويرجع أعلى k."""
+    results = [
+        TopResult(muscle_id=int(muscle_id), weight=float(weight), pixels=int(count))
+        for muscle_id, count, weight in zip(ids, pixels, weights)
+        if count >= min_pixels and weight > 0
+    ]
+    results.sort(key=lambda item: item.weight, reverse=True)
+    return results[:k]
 
 
 def top_muscles_circle(
@@ -58,39 +117,320 @@ def top_muscles_circle(
     sigma_scale: float = 0.25,  # أضيق من 0.35 حتى يعطي وزن أقوى للمركز
     k: int = 5,
     min_pixels: int = 3,        # تقليل الحد الأدنى لتقليل فشل الالتقاط
+    windowed: bool = True,
+    sparse: bool = True,
+    runs: label_maps.LabelRuns | None = None,
 ) -> List[TopResult]:
-    """أعلى k عضلات داخل دائرة، مرتبة بالوزن الغوسي نحو المركز."""
+    """
+    أعلى k عضلات داخل دائرة، مرتبة بالوزن الغوسي نحو المركز.
+
+    runs: فهرس المقاطع (LabelRuns) لنفس label_map، من _build_label_runs لخرائط هذا
+    الموديول. بدونه (خريطة من المستدعي) المسح الكثيف دائماً، فما يُبنى فهرس لخريطة عابرة.
+
+    sparse=True (الافتراضي) مع runs يمر على المقاطع في صفوف الدائرة فقط لو
+    نافذتها SPARSE_MIN_WINDOW_PIXELS أو أكبر، فالتكلفة حسب عدد المقاطع المتقاطعة لا عدد
+    البكسلات. العدّ مطابق تماماً، والوزن يُجمع بجدول تراكمي للأعمدة فيختلف عن المسار
+    الكثيف بخطأ تقريب فقط (~1e-11 نسبي).
+
+    الوزن في المسارين منفصل (وزن الصف × وزن العمود) من gaussian_axes.
+
+    المسح الكثيف (sparse=False أو نافذة صغيرة): windowed=True يقص الخريطة والقناع
+    والأوزان على نافذة الدائرة فقط، والنتيجة مطابقة تماماً للمسح الكامل (windowed=False)
+    لأن الإحداثيات تبقى مطلقة داخل النافذة.
+    """
     height, width = label_map.shape
-    mask = circle_mask(height, width, cx, cy, radius)
+    rows, cols = circle_window(height, width, cx, cy, radius)
+    if rows.stop <= rows.start or cols.stop <= cols.start:
+        return []
+    if (
+        sparse
+        and runs is not None
+        and (rows.stop - rows.start) * (cols.stop - cols.start) >= SPARSE_MIN_WINDOW_PIXELS
+    ):
+        return _top_muscles_runs(
+            runs, rows, cols, cx, cy, radius,
+            sigma_scale=sigma_scale, k=k, min_pixels=min_pixels,
+        )
+    if not windowed:
+        rows, cols = slice(0, height), slice(0, width)
+
+    with stage("mask"):
+        labels = label_map[rows, cols]
+        yy, xx = np.ogrid[rows, cols]
+        mask = (xx - cx) ** 2 + (yy - cy) ** 2 <= radius ** 2
     if not mask.any():
         return []
 
     # توزيع غوسي حول المركز (الأقرب للمركز وزنه أعلى)
-    center_x = np.arange(width)
-    center_y = np.arange(height)[:, None]
-    sigma = max(sigma_scale * radius, 0.75)  # كان 1.0 → نخفضه قليلاً
-    dist_sq = (center_x - cx) ** 2 + (center_y - cy) ** 2
-    weights = np.exp(-dist_sq / (2 * sigma**2))
-
-    pixels = label_map[mask]
-    valid_pixels = pixels > 0
-    if not np.any(valid_pixels):
+    with stage("weights"):
+        # منفصل: وزن الصف × وزن العمود (نفس exp(-d²/2σ²) بخطأ تقريب فقط)
+        row_weight, col_weight = gaussian_axes(rows, cols, cx, cy, radius, sigma_scale)
+        weights = row_weight[:, None] * col_weight
+
+    with stage("aggregate"):
+        pixels = labels[mask]
+        valid_pixels = pixels > 0
+        if not np.any(valid_pixels):
+            return []
+
+        # تجميع العدد والوزن لكل عضلة بمرور واحد (bincount) بدل قناع لكل عضلة
+        ids, counts, sums = aggregate_labels(pixels[valid_pixels], weights[mask][valid_pixels])
+        return _rank_results(ids, counts, sums, k=k, min_pixels=min_pixels)
+
+
+def _run_sums(
+    runs: label_maps.LabelRuns,
+    rows: slice,
+    cols: slice,
+    cx: float,
+    cy: float,
+    radius: float,
+    sigma_scale: float,
+    minlength: int = 0,
+) -> Tuple[np.ndarray, np.ndarray] | None:
+    """
+    يمر على فهرس المقاطع داخل الدائرة ويرجع (عدد البكسلات، مجموع الوزن) لكل تسمية، أو
+    None لو ما فيه تقاطع. لكل صف مدى الأعمدة [lo, hi] داخل الدائرة يتقاطع مع مقاطع ذلك
+    الصف (متجاورة في CSR)، والوزن من جدول تراكمي للأعمدة. rows/cols نافذة الدائرة من
+    circle_window (غير فاضية).
+    """
+    with stage("mask"):
+        ys = np.arange(rows.start, rows.stop)
+        _, inside, lo, hi = circle_spans(ys, cy, cx, radius, cols.start, cols.stop)
+        first, last = runs.row_ptr[rows.start], runs.row_ptr[rows.stop]
+        if first == last or not inside.any():
+            return None
+        run_row = np.repeat(np.arange(ys.size), np.diff(runs.row_ptr[rows.start:rows.stop + 1]))
+        seg_lo = np.maximum(runs.x0[first:last], lo[run_row])
+        seg_hi = np.minimum(runs.x1[first:last] - 1, hi[run_row])
+        hit = inside[run_row] & (seg_hi >= seg_lo)
+        if not hit.any():
+            return None
+        run_row, seg_lo, seg_hi = run_row[hit], seg_lo[hit], seg_hi[hit]
+        labels = runs.labels[first:last][hit]
+
+    with stage("weights"):
+        row_weight, col_weight = gaussian_axes(rows, cols, cx, cy, radius, sigma_scale)
+        col_cumsum = np.concatenate(([0.0], np.cumsum(col_weight)))
+        run_weights = row_weight[run_row] * (col_cumsum[seg_hi - cols.start + 1] - col_cumsum[seg_lo - cols.start])
+
+    with stage("aggregate"):
+        counts = np.bincount(labels, weights=seg_hi - seg_lo + 1, minlength=minlength)
+        sums = np.bincount(labels, weights=run_weights, minlength=minlength)
+    return counts, sums
+
+
+def _top_muscles_runs(
+    runs: label_maps.LabelRuns,
+    rows: slice,
+    cols: slice,
+    cx: float,
+    cy: float,
+    radius: float,
+    *,
+    sigma_scale: float,
+    k: int,
+    min_pixels: int,
+) -> List[TopResult]:
+    """مسار top_muscles_circle على فهرس المقاطع (تسمية واحدة لكل بكسل)."""
+    sums = _run_sums(runs, rows, cols, cx, cy, radius, sigma_scale)
+    if sums is None:
         return []
+    counts, weights = sums
+    present = np.flatnonzero(counts)
+    return _rank_results(present, counts[present].astype(np.int64), weights[present], k=k, min_pixels=min_pixels)
 
-    unique_ids = np.unique(pixels[valid_pixels])
-    results: List[TopResult] = []
-    for muscle_id in unique_ids:
-        region_mask = (label_map == muscle_id) & mask
-        pix_count = int(region_mask.sum())
-        if pix_count < min_pixels:
-            continue
-        weight = float(weights[region_mask].sum())
-        if weight <= 0:
-            continue
-        results.append(TopResult(muscle_id=muscle_id, weight=weight, pixels=pix_count))
 
-    results.sort(key=lambda item: item.weight, reverse=True)
-    return results[:k]
+# طرق تقسيم وزن البكسل بين العضلات المتداخلة (الافتراضي last = سلوك الخريطة الأصلي)
+OVERLAP_MODES = ("last", "equal", "full")
+
+
+def _overlap_matrices(sets: label_maps.LabelSets, overlap: str) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    مصفوفتا (العدّ، الوزن) من المجموعات إلى العضلات:
+    - last: البكسل كامل للعضلة المرسومة أخيراً (مطابق لـ top_muscles_circle)
+    - equal: الوزن يتقسّم بالتساوي على العضلات تحت البكسل، والعدّ كامل لكل واحدة
+    - full: كل عضلة تحت البكسل تأخذ وزنه وعدّه كاملاً
+    """
+    if overlap == "last":
+        return sets.top, sets.top
+    if overlap == "full":
+        return sets.members, sets.members
+    if overlap == "equal":
+        return sets.members, sets.members / sets.members.sum(axis=1, keepdims=True)
+    raise ValueError(f"Unknown overlap mode: {overlap!r}")
+
+
+def top_muscles_circle_multi(
+    sets: label_maps.LabelSets,
+    cx: float,
+    cy: float,
+    radius: float,
+    *,
+    overlap: str = "equal",
+    sigma_scale: float = 0.25,
+    k: int = 5,
+    min_pixels: int = 3,
+) -> List[TopResult]:
+    """
+    مثل top_muscles_circle لكن على خريطة متعددة التسميات: كل عضلة تحت البكسل تُحسب،
+    والوزن يتقسّم حسب overlap. التجميع يصير على المجموعات (عشرات) ثم ضرب مصفوفة
+    صغير للعضلات، فالتكلفة نفس مسار المقاطع تقريباً.
+    """
+    count_matrix, weight_matrix = _overlap_matrices(sets, overlap)
+    height, width = sets.runs.shape
+    rows, cols = circle_window(height, width, cx, cy, radius)
+    if rows.stop <= rows.start or cols.stop <= cols.start:
+        return []
+    sums = _run_sums(sets.runs, rows, cols, cx, cy, radius, sigma_scale, minlength=sets.members.shape[0])
+    if sums is None:
+        return []
+    set_counts, set_weights = sums
+    with stage("aggregate"):
+        counts = np.rint(set_counts @ count_matrix).astype(np.int64)
+        weights = set_weights @ weight_matrix
+        return _rank_results(sets.muscle_ids, counts, weights, k=k, min_pixels=min_pixels)
+
+
+@lru_cache(maxsize=None)
+def _build_label_sets(side: BodySideKey) -> label_maps.LabelSets:
+    """فهرس المقاطع متعدد التسميات لكل جهة (صغير، يُبنى في الذاكرة عند أول استخدام)."""
+    return label_maps.label_sets(side, LABEL_WIDTH, LABEL_HEIGHT)
+
+
+@lru_cache(maxsize=None)
+def _build_label_runs(side: BodySideKey) -> label_maps.LabelRuns:
+    """فهرس المقاطع لخريطة الجهة (يُبنى مرة، ويُمسح مع خرائط التسميات)."""
+    return label_maps.label_runs(_build_label_map(side))
+
+
+def aggregate_labels(
+    ids: np.ndarray, pixel_weights: np.ndarray
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    يرجع (ids, counts, weight_sums) لكل تسمية موجودة، مرتبة تصاعدياً حسب id.
+    التسميات أرقام صغيرة فنستخدمها مباشرة كخانات bincount؛ لو كانت متباعدة جداً
+    نضغطها أولاً إلى فضاء متصل عبر np.unique.
+    """
+    if ids.size == 0:
+        return ids, np.empty(0, dtype=np.int64), np.empty(0)
+    max_id = int(ids.max())
+    if max_id <= 4 * ids.size + 1024:
+        counts = np.bincount(ids, minlength=max_id + 1)
+        sums = np.bincount(ids, weights=pixel_weights, minlength=max_id + 1)
+        present = np.flatnonzero(counts)
+        return present, counts[present], sums[present]
+    present, inverse = np.unique(ids, return_inverse=True)
+    counts = np.bincount(inverse, minlength=present.size)
+    sums = np.bincount(inverse, weights=pixel_weights, minlength=present.size)
+    return present, counts, sums
+
+
+@lru_cache(maxsize=8)
+def _padded_map(side: BodySideKey, pad: int) -> np.ndarray:
+    """خريطة الجهة مع حافة أصفار بعرض pad (أسس 2 فقط، فالمفاتيح قليلة)."""
+    return np.pad(_build_label_map(side), pad)
+
+
+def _padded_label_map(
+    label_map: np.ndarray, pad: int, source: BodySideKey | None
+) -> np.ndarray:
+    """
+    خريطة التسميات مع حافة أصفار بعرض pad. لخرائط الموديول (source = side)
+    تُقص من نسخة مكاشة بحافة أقرب أس 2؛ خريطة المستدعي تُبطّن لكل استدعاء.
+    """
+    if source is None:
+        return np.pad(label_map, pad)
+    bucket = 1 << (pad - 1).bit_length()
+    padded = _padded_map(source, bucket)
+    extra = bucket - pad
+    return padded[extra:padded.shape[0] - extra, extra:padded.shape[1] - extra]
+
+
+def top_muscles_circles_batch(
+    label_map: np.ndarray,
+    cxs: Sequence[float],
+    cys: Sequence[float],
+    radii: Sequence[float],
+    *,
+    sigma_scale: float = 0.25,
+    k: int = 5,
+    min_pixels: int = 3,
+    chunk_pixels: int = ANALYZE_BATCH_CHUNK_PIXELS,
+    source: BodySideKey | None = None,
+) -> List[List[TopResult]]:
+    """
+    نفس top_muscles_circle لعدة دوائر على نفس الخريطة، محسوبة مع بعض بـ NumPy.
+    source = side لو label_map هي _build_label_map(side)، فتُكاش نسختها المبطّنة.
+
+    الدوائر تُرتّب حسب نصف القطر وتُجمع في دفعات بحدود chunk_pixels. كل دفعة تأخذ
+    نافذة بحجم أكبر دائرة فيها حول كل مركز (مصفوفة ثلاثية الأبعاد)، ثم bincount واحد
+    على مفتاح (رقم الدائرة، التسمية). ترتيب البكسلات داخل كل دائرة نفس ترتيب المسار
+    الفردي الكثيف (sparse=False)، فالنتائج مطابقة له تماماً.
+    """
+    cx_arr = np.asarray(cxs, dtype=np.float64)
+    cy_arr = np.asarray(cys, dtype=np.float64)
+    r_arr = np.asarray(radii, dtype=np.float64)
+    count = cx_arr.size
+    results: List[List[TopResult]] = [[] for _ in range(count)]
+    if count == 0:
+        return results
+
+    height, width = label_map.shape
+    bins = int(label_map.max()) + 1
+    order = np.argsort(r_arr, kind="stable")
+
+    start = 0
+    while start < count:
+        # أكبر دفعة تبقى ضمن chunk_pixels (النوافذ بحجم أكبر نصف قطر في الدفعة)
+        stop = start + 1
+        while stop < count:
+            half = int(math.ceil(r_arr[order[stop]])) + 1
+            if (stop + 1 - start) * (2 * half + 1) ** 2 > chunk_pixels:
+                break
+            stop += 1
+        idx = order[start:stop]
+        start = stop
+
+        half = int(math.ceil(r_arr[idx].max())) + 1
+        size = 2 * half + 1
+        ys = np.floor(cy_arr[idx]).astype(np.int64) - half
+        xs = np.floor(cx_arr[idx]).astype(np.int64) - half
+
+        # نوافذ التسميات من خريطة مبطّنة بأصفار (الخارج = خلفية) بدون فهرسة لكل بكسل
+        pad = half + 1  # المركز قد يقع على الحافة تماماً (cx = width)
+        padded = _padded_label_map(label_map, pad, source)
+        windows = sliding_window_view(padded, (size, size))[ys + pad, xs + pad]
+
+        grid = np.arange(size)
+        dx = xs[:, None] + grid - cx_arr[idx, None]
+        dy = ys[:, None] + grid - cy_arr[idx, None]
+        dist_sq = (dx**2)[:, None, :] + (dy**2)[:, :, None]
+        selected = (dist_sq <= (r_arr[idx] ** 2)[:, None, None]) & (windows > 0)
+
+        # أوزان المحورين لكل دائرة بنفس gaussian_axes في المسار الفردي، فالوزن نفسه بت ببت
+        wx = np.empty_like(dx)
+        wy = np.empty_like(dy)
+        for row, circle in enumerate(idx):
+            wy[row], wx[row] = gaussian_axes(
+                slice(int(ys[row]), int(ys[row]) + size), slice(int(xs[row]), int(xs[row]) + size),
+                float(cx_arr[circle]), float(cy_arr[circle]), float(r_arr[circle]), sigma_scale,
+            )
+
+        # الترتيب بعد القناع: دائرة دائرة، ثم صف صف (نفس ترتيب المسار الفردي)
+        per_circle = selected.reshape(idx.size, -1).sum(axis=1)
+        circle_of = np.repeat(np.arange(idx.size), per_circle)
+        keys = circle_of * bins + windows[selected]
+        pixel_weights = (wy[:, :, None] * wx[:, None, :])[selected]
+        counts = np.bincount(keys, minlength=idx.size * bins).reshape(idx.size, bins)
+        sums = np.bincount(keys, weights=pixel_weights, minlength=idx.size * bins).reshape(idx.size, bins)
+
+        for row, circle in enumerate(idx):
+            present = np.flatnonzero(counts[row])
+            results[circle] = _rank_results(
+                present, counts[row, present], sums[row, present], k=k, min_pixels=min_pixels
+            )
+    return results
 
 
 def top_region(results: Iterable[TopResult]) -> Tuple[str, float] | None:
@@ -111,6 +451,63 @@ def top_region(results: Iterable[TopResult]) -> Tuple[str, float] | None:
     return top_region_name[0], top_region_name[1] / total_weight
 
 
+EngineFn = Callable[..., List[TopResult]]
+
+
+def _raster_engine(
+    side: BodySideKey,
+    cx: float,
+    cy: float,
+    radius: float,
+    *,
+    sigma_scale: float,
+    k: int,
+    min_pixels: int,
+    overlap: str = "last",
+) -> List[TopResult]:
+    """المسار الأصلي: خريطة تسميات بالبكسل + قناع الدائرة (أو الخريطة متعددة التسميات)."""
+    if overlap != "last":
+        with stage("label_map"):
+            sets = _build_label_sets(side)
+        return top_muscles_circle_multi(
+            sets, cx, cy, radius, overlap=overlap, sigma_scale=sigma_scale, k=k, min_pixels=min_pixels
+        )
+    with stage("label_map"):
+        label_map = _build_label_map(side)
+        runs = _build_label_runs(side)
+    return top_muscles_circle(
+        label_map, cx, cy, radius, sigma_scale=sigma_scale, k=k, min_pixels=min_pixels, runs=runs
+    )
+
+
+def _geometric_engine(
+    side: BodySideKey,
+    cx: float,
+    cy: float,
+    radius: float,
+    *,
+    sigma_scale: float,
+    k: int,
+    min_pixels: int,
+    overlap: str = "last",
+) -> List[TopResult]:
+    """تقاطع تحليلي بين الدائرة والمربعات مباشرة، بدون خريطة تسميات (ترتيب الرسم فقط: last)."""
+    if overlap != "last":
+        raise ValueError(f"The geometric engine only supports overlap='last', got {overlap!r}")
+    with stage("overlap"):
+        ids, pixels, weights = circle_box_overlaps(
+            side, LABEL_WIDTH, LABEL_HEIGHT, cx, cy, radius, gaussian_sigma(radius, sigma_scale)
+        )
+    return _rank_results(ids, pixels, weights, k=k, min_pixels=min_pixels)
+
+
+# المحركات المتاحة لـ analyze_selection (تختار عبر engine= أو ANALYZE_ENGINE)
+ENGINES: Dict[str, EngineFn] = {
+    "raster": _raster_engine,
+    "geometric": _geometric_engine,
+}
+
+
 class SelectionResult(TypedDict):
     id: int
     prob: float
@@ -136,12 +533,49 @@ def analyze_selection(
     min_pixels: int = 3,
     sigma_scale: float = 0.25,
     debug: bool = True,
+    engine: str | None = None,
+    overlap: str | None = None,
 ) -> AnalyzeResponse:
     """
     واجهة عالية المستوى:
     - يستقبل إحداثيات مطبّعة 0..1 (متوافقة مع عرض/ارتفاع الصورة على الواجهة)
     - يرجع أفضل عضلات مع نسب (prob) + تلميح منطقة + معلومات ديبَغ.
+    - engine: "raster" (خريطة بكسلات) أو "geometric" (تقاطع تحليلي مع المربعات).
+    - overlap: تقسيم وزن البكسلات المتداخلة ("last" | "equal" | "full"، انظر OVERLAP_MODES).
     """
+    _ensure_fresh_maps()
+    engine, engine_fn = _resolve_engine(engine)
+    overlap = _resolve_overlap(overlap)
+    cx, cy, radius = _selection_pixels(cx_norm, cy_norm, radius_norm)
+
+    # النتائج الأساسية حسب المحرك المختار
+    raw_results = engine_fn(
+        side, cx, cy, radius, sigma_scale=sigma_scale, k=k, min_pixels=min_pixels, overlap=overlap
+    )
+    with stage("format"):
+        return _format_selection(
+            side, cx, cy, radius, raw_results,
+            k=k, min_pixels=min_pixels, sigma_scale=sigma_scale, engine=engine, overlap=overlap, debug=debug,
+        )
+
+
+def _resolve_engine(engine: str | None) -> Tuple[str, EngineFn]:
+    engine = engine or ANALYZE_ENGINE
+    engine_fn = ENGINES.get(engine)
+    if engine_fn is None:
+        raise ValueError(f"Unknown analyze engine: {engine!r}")
+    return engine, engine_fn
+
+
+def _resolve_overlap(overlap: str | None) -> str:
+    overlap = overlap or ANALYZE_OVERLAP
+    if overlap not in OVERLAP_MODES:
+        raise ValueError(f"Unknown overlap mode: {overlap!r}")
+    return overlap
+
+
+def _selection_pixels(cx_norm: float, cy_norm: float, radius_norm: float) -> Tuple[float, float, float]:
+    """يحوّل الإحداثيات المطبّعة إلى بكسلات على خريطة التسميات."""
     # قص القيم لتجنب أي تطبيع خاطئ قادم من الفرونت
     cx_norm = float(np.clip(cx_norm, 0.0, 1.0))
     cy_norm = float(np.clip(cy_norm, 0.0, 1.0))
@@ -150,15 +584,24 @@ def analyze_selection(
     cx = cx_norm * LABEL_WIDTH
     cy = cy_norm * LABEL_HEIGHT
     radius = radius_norm * min(LABEL_WIDTH, LABEL_HEIGHT)
+    return cx, cy, radius
 
-    # خريطة التسميات حسب جهة الجسم
-    label_map = _build_label_map(side)
-
-    # النتائج الأساسية
-    raw_results = top_muscles_circle(
-        label_map, cx, cy, radius, sigma_scale=sigma_scale, k=k, min_pixels=min_pixels
-    )
 
+def _format_selection(
+    side: BodySideKey,
+    cx: float,
+    cy: float,
+    radius: float,
+    raw_results: List[TopResult],
+    *,
+    k: int,
+    min_pixels: int,
+    sigma_scale: float,
+    engine: str,
+    overlap: str,
+    debug: bool,
+) -> AnalyzeResponse:
+    """يحوّل النتائج الخام إلى نسب + fallback + تلميح المنطقة + ديبَغ."""
     formatted: List[SelectionResult] = []
     total_weight = sum(item.weight for item in raw_results)
     if total_weight > 0:
@@ -229,6 +672,8 @@ def analyze_selection(
         "radius_px": round(radius, 2),
         "label_w": LABEL_WIDTH,
         "label_h": LABEL_HEIGHT,
+        "engine": engine,
+        "overlap": overlap,
         "raw_count": len(raw_results),
         "used_fallback": 0 if total_weight > 0 else 1,
         "sigma_scale": sigma_scale,
@@ -241,3 +686,171 @@ def analyze_selection(
         "region_conf": round(region_conf, 4) if region_conf is not None else None,
         "debug": dbg if debug else {},
     }
+
+
+def analyze_selection_batch(
+    selections: Sequence[Tuple[BodySideKey, float, float, float]],
+    *,
+    k: int = 5,
+    min_pixels: int = 3,
+    sigma_scale: float = 0.25,
+    debug: bool = True,
+    engine: str | None = None,
+    overlap: str | None = None,
+) -> List[AnalyzeResponse]:
+    """
+    نسخة دفعية من analyze_selection: تستقبل (side, cx, cy, radius) مطبّعة وترجع
+    نتيجة لكل عنصر بنفس الترتيب. مع محرك raster و overlap="last" تُحسب كل دوائر
+    الجهة الواحدة مع بعض على نفس خريطة التسميات؛ غير ذلك يُستدعى المحرك لكل دائرة.
+    """
+    _ensure_fresh_maps()
+    engine, engine_fn = _resolve_engine(engine)
+    overlap = _resolve_overlap(overlap)
+    pixels = [_selection_pixels(cx, cy, radius) for _, cx, cy, radius in selections]
+    raw: List[List[TopResult]] = [[] for _ in selections]
+
+    if engine == "raster" and overlap == "last":
+        by_side: Dict[BodySideKey, List[int]] = {}
+        for index, (side, *_rest) in enumerate(selections):
+            by_side.setdefault(side, []).append(index)
+        for side, indices in by_side.items():
+            batch = top_muscles_circles_batch(
+                _build_label_map(side),
+                [pixels[i][0] for i in indices],
+                [pixels[i][1] for i in indices],
+                [pixels[i][2] for i in indices],
+                sigma_scale=sigma_scale, k=k, min_pixels=min_pixels, source=side,
+            )
+            for i, item_results in zip(indices, batch):
+                raw[i] = item_results
+    else:
+        for i, (side, *_rest) in enumerate(selections):
+            raw[i] = engine_fn(
+                side, *pixels[i], sigma_scale=sigma_scale, k=k, min_pixels=min_pixels, overlap=overlap
+            )
+
+    return [
+        _format_selection(
+            side, *pixels[i], raw[i],
+            k=k, min_pixels=min_pixels, sigma_scale=sigma_scale, engine=engine, overlap=overlap, debug=debug,
+        )
+        for i, (side, *_rest) in enumerate(selections)
+    ]
+
+
+# ============================ كاش نتائج التحليل ============================
+
+ANALYZE_CACHE: LRUCache[AnalyzeResponse] = LRUCache(ANALYZE_CACHE_SIZE, ANALYZE_CACHE_MAX_BYTES)
+# نسخة BODY_MAP اللي انبنت عليها الكاشات الحالية (muscle_data.BODY_MAP_VERSION)
+_MAPS_VERSION = muscle_data.BODY_MAP_VERSION
+
+
+def _map_fingerprint() -> int:
+    """بصمة لمحتوى BODY_MAP ودقة خريطة التسميات؛ تتغير لو تغيّر أي منهما."""
+    items = tuple(
+        (side, item["id"], item["shape"], tuple(item["box_norm"]),
+         tuple(map(tuple, item.get("polygon_norm", ()))), item.get("mask"),
+         item["name_en"], item["name_ar"], item["region"])
+        for side, side_data in BODY_MAP.items()
+        for item in side_data["items"]
+    )
+    return hash((LABEL_WIDTH, LABEL_HEIGHT, items))
+
+
+# بصمة BODY_MAP كما في muscle_data.py وقت الاستيراد؛ الـ artifacts تطابقها فقط
+_SOURCE_FINGERPRINT = _map_fingerprint()
+
+
+def invalidate_map_caches() -> None:
+    """يمسح كل ما يُشتق من BODY_MAP: خرائط التسميات، الأجزاء، الفهرس، وكاش النتائج."""
+    _build_label_map.cache_clear()
+    _build_label_runs.cache_clear()
+    _padded_map.cache_clear()
+    _build_label_sets.cache_clear()
+    visible_fragments.cache_clear()
+    ID_LOOKUP.clear()
+    ID_LOOKUP.update(build_id_lookup())
+    ANALYZE_CACHE.clear()
+
+
+def _ensure_fresh_maps() -> None:
+    """
+    يعيد بناء الكاشات لو انعلّم BODY_MAP كمعدّل (body_map_changed). مقارنة عدد صحيح
+    فقط، فتنفع على مسار كل طلب بدل حساب بصمة كل العناصر.
+    """
+    global _MAPS_VERSION
+    version = muscle_data.BODY_MAP_VERSION
+    if version != _MAPS_VERSION:
+        _MAPS_VERSION = version
+        invalidate_map_caches()
+
+
+def warm_up() -> Dict[str, float]:
+    """
+    يبني مسبقاً كل ما يُبنى عند أول طلب (خرائط التسميات، أجزاء المحرك الهندسي لو هو المختار، وأول
+    تحليل لكل جهة) ويرجع زمن كل جهة بالثواني. يُستدعى من startup hook حتى ما يدفعها أول مستخدم.
+    """
+    _ensure_fresh_maps()
+    timings: Dict[str, float] = {}
+    for side in BODY_MAP:
+        start = time.perf_counter()
+        _build_label_map(side)
+        if ANALYZE_ENGINE == "geometric":
+            visible_fragments(side, LABEL_WIDTH, LABEL_HEIGHT)
+        analyze_selection(side, 0.5, 0.5, 0.1, debug=False)
+        timings[side] = time.perf_counter() - start
+    return timings
+
+
+def _quantise(value: float, step: float) -> float:
+    if step <= 0:
+        return value
+    return round(round(value / step) * step, 9)
+
+
+def analyze_selection_cached(
+    side: BodySideKey,
+    cx_norm: float,
+    cy_norm: float,
+    radius_norm: float,
+    *,
+    k: int = 5,
+    min_pixels: int = 3,
+    sigma_scale: float = 0.25,
+    engine: str | None = None,
+    overlap: str | None = None,
+) -> AnalyzeResponse:
+    """
+    نفس analyze_selection لكن عبر كاش LRU.
+    الإحداثيات تُقرّب لشبكة ANALYZE_CACHE_QUANTUM قبل الحساب، فالنتيجة من الكاش
+    مطابقة تماماً لحساب جديد بنفس القيم المقرّبة.
+    """
+    engine = engine or ANALYZE_ENGINE
+    overlap = overlap or ANALYZE_OVERLAP
+    _ensure_fresh_maps()
+    if not ANALYZE_CACHE.enabled:
+        return analyze_selection(
+            side, cx_norm, cy_norm, radius_norm,
+            k=k, min_pixels=min_pixels, sigma_scale=sigma_scale, engine=engine, overlap=overlap,
+        )
+
+    cx_q = _quantise(cx_norm, ANALYZE_CACHE_QUANTUM)
+    cy_q = _quantise(cy_norm, ANALYZE_CACHE_QUANTUM)
+    radius_q = _quantise(radius_norm, ANALYZE_CACHE_QUANTUM)
+    key = (side, cx_q, cy_q, radius_q, k, min_pixels, sigma_scale, engine, overlap)
+
+    with stage("cache_lookup"):
+        cached = ANALYZE_CACHE.get(key)
+    if cached is None:
+        cached = analyze_selection(
+            side, cx_q, cy_q, radius_q,
+            k=k, min_pixels=min_pixels, sigma_scale=sigma_scale, engine=engine, overlap=overlap,
+        )
+        ANALYZE_CACHE.put(key, cached)
+    # نسخة مستقلة حتى ما يعدّل المستدعي على القيمة المخزنة؛ القيم داخلها أرقام ونصوص
+    # فقط، فنسخ الحاويات يكفي بدل deepcopy
+    return {
+        **cached,
+        "results": [dict(item) for item in cached["results"]],
+        "debug": dict(cached["debug"]),
+    }
@@ -3,19 +3,57 @@
 from __future__ import annotations
 
 import asyncio
+import json
 import logging
-from typing import Dict, List, Optional, Any
+import re
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Any
 from urllib.parse import quote_plus
 from uuid import uuid4
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
-from openai import OpenAI
-from pydantic import BaseModel, Field
-
-from .config import FRONTEND_ORIGIN, OPENAI_API_KEY, OPENAI_MODEL
-from .logic import analyze_selection
+from fastapi.responses import PlainTextResponse, StreamingResponse
+from pydantic import BaseModel, Field, ValidationError
+
+from .breaker import CircuitOpenError
+from .config import (
+    ANALYZE_BATCH_MAX_ITEMS,
+    ANALYZE_EXECUTOR,
+    ANALYZE_QUEUE_SIZE,
+    ANALYZE_TIMEOUT_S,
+    ANALYZE_WORKERS,
+    CHAT_HISTORY_SUMMARY,
+    CHAT_HISTORY_SUMMARY_TOKENS,
+    CHAT_HISTORY_TOKEN_BUDGET,
+    FRONTEND_ORIGIN,
+    OPENAI_API_KEY,
+    OPENAI_SIMULATOR,
+    REPLY_CACHE_MAX_BYTES,
+    REPLY_CACHE_MAX_TURNS,
+    REPLY_CACHE_SIZE,
+    REPLY_CACHE_TTL_S,
+    SESSION_BACKEND,
+    SESSION_IDLE_TTL_S,
+    SESSION_MAX_BYTES,
+    SESSION_MAX_SESSIONS,
+    SESSION_SHARDS,
+    SESSION_SQLITE_PATH,
+    SESSION_SWEEP_INTERVAL_S,
+    STARTUP_WARMUP,
+)
+from . import metrics
+from .llm import ChatCompleter, build_completer
+from .logic import ANALYZE_CACHE, analyze_selection_batch, analyze_selection_cached
+from .logic import warm_up as warm_up_analysis
+from .metrics import CHAT_FALLBACKS, TimingMiddleware, stage
 from .muscle_data import BODY_MAP, BodySideKey
+from .profiling import PROFILER, ProfilingMiddleware
+from .reply_cache import CacheKey, ReplyCache, reply_cache_key
+from .sessions import InMemorySessionStore, SessionBackend, SQLiteSessionStore, Tokens, count_turns
+from .tokens import count_tokens, message_tokens
+from .workers import AnalysisPool, QueueFullError
 
 logger = logging.getLogger(__name__)
 
@@ -25,9 +63,79 @@ SYSTEM_PROMPT = (
     "ذكّر المستخدم دائماً بالسلامة، الإحماء، والتوقف إذا زاد الألم. لا تكرر نفس الجمل وقدّم خطوات مختصرة وواضحة."
 )
 
+# تحليل الدوائر (NumPy) يشتغل على pool منفصل حتى ما يوقف event loop وطلبات الشات
+ANALYSIS_POOL = AnalysisPool(ANALYZE_EXECUTOR, ANALYZE_WORKERS, ANALYZE_QUEUE_SIZE, ANALYZE_TIMEOUT_S)
+
+# كاش ردود الأسئلة المتكررة في أول الجلسة (معطّل افتراضياً: REPLY_CACHE_SIZE=0)
+REPLY_CACHE = ReplyCache(REPLY_CACHE_SIZE, REPLY_CACHE_MAX_BYTES, REPLY_CACHE_TTL_S)
+
+
+async def _sweep_sessions() -> None:
+    while True:
+        await asyncio.sleep(SESSION_SWEEP_INTERVAL_S)
+        try:
+            await SESSION_STORE.sweep()
+        except Exception as exc:  # pragma: no cover
+            logger.exception("Session sweep failed: %s", exc)
 
 
-app = FastAPI(title="Armonia Coaching API")
+if STARTUP_WARMUP not in {"blocking", "background", "off"}:
+    raise ValueError(f"Unknown STARTUP_WARMUP mode: {STARTUP_WARMUP!r}")
+
+# حالة التسخين تظهر في /health (ready=False يعني أول طلبات التحليل قد تبني الخرائط بنفسها)
+STARTUP: Dict[str, Any] = {
+    "warmup": STARTUP_WARMUP,
+    "status": "off" if STARTUP_WARMUP == "off" else "pending",
+    "ready": False,
+    "seconds": None,
+}
+
+
+def _warm_up() -> None:
+    """يبني خرائط التسميات (وفي كل process worker)، يحمّل عدّاد التوكنات، وينشئ client الـ OpenAI."""
+    start = time.perf_counter()
+    ANALYSIS_POOL.warm_up(warm_up_analysis)
+    count_tokens(SYSTEM_PROMPT)
+    if client:
+        try:
+            client.warm_up()
+        except Exception as exc:  # pragma: no cover
+            logger.exception("Failed to initialise the chat upstream client: %s", exc)
+    STARTUP.update(status="ready", ready=True, seconds=round(time.perf_counter() - start, 4))
+    logger.info("Warm-up finished in %.3fs", STARTUP["seconds"])
+
+
+def _warm_up_done(task: "asyncio.Task[None]") -> None:
+    """
+    يُستدعى لما تخلص مهمة التسخين: في وضع background ما أحد ينتظرها، فالخطأ يُسجّل
+    هنا ويظهر في /health كـ status="failed" بدل ما يضيع بصمت.
+    """
+    if task.cancelled():
+        STARTUP.update(status="failed", error="cancelled")
+        return
+    exc = task.exception()
+    if exc is not None:
+        STARTUP.update(status="failed", error=f"{type(exc).__name__}: {exc}")
+        logger.error("Warm-up failed: %s", exc, exc_info=exc)
+
+
+@asynccontextmanager
+async def _lifespan(_app: FastAPI) -> AsyncIterator[None]:
+    sweeper = asyncio.create_task(_sweep_sessions())
+    if STARTUP_WARMUP != "off":
+        warm = asyncio.create_task(asyncio.to_thread(_warm_up))
+        warm.add_done_callback(_warm_up_done)
+        if STARTUP_WARMUP == "blocking":
+            await warm
+    yield
+    sweeper.cancel()
+    ANALYSIS_POOL.shutdown()
+    await SESSION_STORE.aclose()
+    if client:
+        await client.aclose()
+
+
+app = FastAPI(title="Armonia Coaching API", lifespan=_lifespan)
 
 
 def _parse_origins(origin_setting: str) -> List[str]:
@@ -45,7 +153,11 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing"],
 )
+app.add_middleware(ProfilingMiddleware, profiler=PROFILER)
+# آخر middleware يُضاف هو الخارجي، فالتوقيت يشمل CORS والـ routing
+app.add_middleware(TimingMiddleware)
 
 
 # =============================== نماذج البيانات ===============================
@@ -74,6 +186,7 @@ class ChatResponse(BaseModel):
     turns: int
     usedOpenAI: bool
     youtube: str
+    cached: bool = False
 
 
 class CirclePayload(BaseModel):
@@ -91,32 +204,78 @@ class AnalyzeResponse(BaseModel):
     results: List[Muscle]
 
 
-# ============================== جلسات المحادثة ===============================
+class BatchAnalyzeItem(AnalyzeResponse):
+    error: Optional[str] = None
 
-SESSIONS: Dict[str, List[Dict[str, str]]] = {}
-SESSIONS_LOCK = asyncio.Lock()
 
-client: Optional[OpenAI] = None
-if OPENAI_API_KEY:
-    try:
-        client = OpenAI(api_key=OPENAI_API_KEY)
-    except Exception as exc:  # pragma: no cover
-        logger.exception("Failed to initialise OpenAI client: %s", exc)
-        client = None
+# ============================== جلسات المحادثة ===============================
+
+client: Optional[ChatCompleter] = build_completer()
+if OPENAI_SIMULATOR:
+    # وضع اختبار الحمل: لازم يبان في السجلات حتى ما يتشغل بالغلط في الإنتاج
+    logger.warning("Chat upstream is simulated: OPENAI_SIMULATOR=%s", OPENAI_SIMULATOR)
 
 
 def _initial_history() -> List[Dict[str, str]]:
     return [{"role": "system", "content": SYSTEM_PROMPT}]
 
 
-def _prune_history(history: List[Dict[str, str]]) -> List[Dict[str, str]]:
+def _prune_history(history: List[Dict[str, str]], tokens: Tokens) -> tuple[List[Dict[str, str]], Tokens]:
+    """يبقي أول system prompt وآخر MAX_HISTORY_MESSAGES رسالة، مع توكناتها المحسوبة مسبقاً."""
     if not history:
+        return history, tokens
+    system_index = [i for i, msg in enumerate(history) if msg["role"] == "system"][0:1]
+    conversational = [i for i, msg in enumerate(history) if msg["role"] != "system"]
+    keep = system_index + conversational[-MAX_HISTORY_MESSAGES:]
+    return [history[i] for i in keep], [tokens[i] for i in keep]
+
+
+def _history_summary(dropped: List[Dict[str, str]], max_tokens: int) -> Optional[Dict[str, str]]:
+    """ملخص مختصر (بدون نموذج) لأسئلة المستخدم اللي انشالت من التاريخ، الأحدث أولاً."""
+    header = "ملخص أسئلة سابقة في الجلسة:"
+    lines: List[str] = []
+    used = count_tokens(header)
+    for msg in reversed(dropped):
+        if msg["role"] != "user":
+            continue
+        text = " ".join(msg["content"].split())
+        line = f"- {text[:80]}{'…' if len(text) > 80 else ''}"
+        cost = count_tokens(line)
+        if used + cost > max_tokens:
+            break
+        lines.append(line)
+        used += cost
+    if not lines:
+        return None
+    return {"role": "system", "content": "\n".join([header, *lines])}
+
+
+def _fit_token_budget(history: List[Dict[str, str]], tokens: Tokens, reserved: int) -> List[Dict[str, str]]:
+    """
+    يقص أقدم الأدوار لين يصير التاريخ + reserved ضمن CHAT_HISTORY_TOKEN_BUDGET.
+    reserved = رسالة السياق العضلي + رسالة المستخدم الحالية؛ هذي و system prompt ما تنقص أبداً.
+    القص يكون بأدوار كاملة حتى ما يبدأ التاريخ برد مساعد يتيم.
+    """
+    budget = CHAT_HISTORY_TOKEN_BUDGET
+    total = sum(tokens) + reserved
+    if budget <= 0 or total <= budget:
         return history
-    system_messages = [msg for msg in history if msg["role"] == "system"]
-    base_system = system_messages[0:1]
-    conversational = [msg for msg in history if msg["role"] != "system"]
-    trimmed = conversational[-MAX_HISTORY_MESSAGES:]
-    return base_system + trimmed
+    if CHAT_HISTORY_SUMMARY:
+        budget -= CHAT_HISTORY_SUMMARY_TOKENS
+    head = 1 if history and history[0]["role"] == "system" else 0
+    start = head
+    while start < len(history) and total > budget:
+        total -= tokens[start]
+        start += 1
+        while start < len(history) and history[start]["role"] != "user":
+            total -= tokens[start]
+            start += 1
+    kept = history[:head]
+    if CHAT_HISTORY_SUMMARY:
+        summary = _history_summary(history[head:start], CHAT_HISTORY_SUMMARY_TOKENS)
+        if summary:
+            kept.append(summary)
+    return kept + history[start:]
 
 
 def _build_context_message(context: ChatContext) -> Optional[Dict[str, str]]:
@@ -152,21 +311,40 @@ def _fallback_message(user_message: str, youtube: str) -> str:
     return f"{prefix} تقدر تشوف التمرين المقترح هنا: {youtube}"
 
 
+def _build_session_store() -> SessionBackend:
+    if SESSION_BACKEND == "sqlite":
+        return SQLiteSessionStore(
+            SESSION_SQLITE_PATH,
+            initial=_initial_history,
+            prune=_prune_history,
+            count=message_tokens,
+            read_limit=MAX_HISTORY_MESSAGES,
+            idle_ttl_s=SESSION_IDLE_TTL_S,
+        )
+    if SESSION_BACKEND != "memory":
+        raise ValueError(f"Unknown session backend: {SESSION_BACKEND!r}")
+    return InMemorySessionStore(
+        initial=_initial_history,
+        prune=_prune_history,
+        count=message_tokens,
+        shards=SESSION_SHARDS,
+        max_sessions=SESSION_MAX_SESSIONS,
+        idle_ttl_s=SESSION_IDLE_TTL_S,
+        max_bytes=SESSION_MAX_BYTES,
+    )
+
+
+SESSION_STORE: SessionBackend = _build_session_store()
+
+
 async def _update_session(session_id: str, user_text: str, assistant_text: str) -> int:
-    async with SESSIONS_LOCK:
-        history = SESSIONS.setdefault(session_id, _initial_history())
-        history.append({"role": "user", "content": user_text})
-        history.append({"role": "assistant", "content": assistant_text})
-        pruned = _prune_history(history)
-        SESSIONS[session_id] = pruned
-        turns = sum(1 for message in pruned if message["role"] == "assistant")
-        return turns
+    with stage("session_write"):
+        return await SESSION_STORE.append_turn(session_id, user_text, assistant_text)
 
 
-async def _get_history(session_id: str) -> List[Dict[str, str]]:
-    async with SESSIONS_LOCK:
-        history = SESSIONS.setdefault(session_id, _initial_history())
-        return list(history)
+async def _get_history(session_id: str) -> tuple[List[Dict[str, str]], Tokens]:
+    with stage("session_read"):
+        return await SESSION_STORE.get_history_tokens(session_id)
 
 
 # ================================== Health ===================================
@@ -177,9 +355,67 @@ async def health() -> Dict[str, object]:
         "status": "ok",
         "coaching": bool(OPENAI_API_KEY),
         "maps": list(BODY_MAP.keys()),
+        "analyze_cache": ANALYZE_CACHE.stats(),
+        "analysis_pool": ANALYSIS_POOL.stats(),
+        "upstream": client.stats() if client else None,
+        "sessions": SESSION_STORE.stats(),
+        "reply_cache": REPLY_CACHE.stats(),
+        "startup": STARTUP,
     }
 
 
+def _collect_metrics() -> List[metrics.Sample]:
+    """عدادات المكونات (الكاش، الجلسات، upstream، الـ pool) بصيغة Prometheus وقت الطلب."""
+    samples: List[metrics.Sample] = []
+
+    def add(name: str, kind: str, help_text: str, value: Any, **labels: str) -> None:
+        samples.append((name, kind, help_text, labels, float(value)))
+
+    for cache_name, stats in (("analyze", ANALYZE_CACHE.stats()), ("reply", REPLY_CACHE.stats())):
+        for key in ("hits", "misses", "evictions"):
+            add(f"armonia_cache_{key}_total", "counter", f"Cache {key}", stats[key], cache=cache_name)
+        add("armonia_cache_entries", "gauge", "Entries currently cached", stats["entries"], cache=cache_name)
+    sessions = SESSION_STORE.stats()
+    add("armonia_sessions_live", "gauge", "Live chat sessions", sessions["live_sessions"], backend=str(sessions["backend"]))
+    pool = ANALYSIS_POOL.stats()
+    add("armonia_analysis_pending", "gauge", "Analysis jobs running or queued", pool["pending"])
+    add("armonia_analysis_rejected_total", "counter", "Analysis jobs rejected with 503", pool["rejected"])
+    add("armonia_analysis_timeouts_total", "counter", "Analysis jobs that hit the timeout", pool["timeouts"])
+    if client:
+        upstream = client.stats()
+        for key in ("calls", "errors", "timeouts", "queue_timeouts", "coalesced"):
+            add(f"armonia_upstream_{key}_total", "counter", f"Upstream completion {key}", upstream[key])
+        add("armonia_upstream_in_flight", "gauge", "Upstream completions in flight", upstream["in_flight"])
+        breaker = upstream["breaker"]
+        if breaker:
+            add("armonia_upstream_breaker_open", "gauge", "1 when the upstream breaker is not closed",
+                breaker["state"] != "closed")
+    return samples
+
+
+metrics.register_collector(_collect_metrics)
+
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def prometheus_metrics() -> PlainTextResponse:
+    return PlainTextResponse(metrics.render(), media_type="text/plain; version=0.0.4")
+
+
+@app.get("/admin/profiles")
+async def admin_profiles(request: Request) -> Dict[str, Any]:
+    """
+    أبطأ الطلبات المُراقبة مع أكثر الدوال ظهوراً في عيناتها. مغلق لو الـ profiler مطفي،
+    ولو PROFILE_HEADER_TOKEN مو مضبوط (المسارات وبيانات الـ stacks ما تنكشف بدون توكن).
+    """
+    if not PROFILER.enabled:
+        raise HTTPException(status_code=404, detail="Profiling is disabled")
+    if not PROFILER.header_token:
+        raise HTTPException(status_code=403, detail="Set PROFILE_HEADER_TOKEN to use this endpoint")
+    if request.headers.get(PROFILER.header.decode("latin-1")) != PROFILER.header_token:
+        raise HTTPException(status_code=403, detail="Profiling token required")
+    return {"profiler": PROFILER.stats(), "slowest": PROFILER.slowest()}
+
+
 # ============================== Helpers للتحليل ===============================
 
 def _bm_items_for_side(side_key: str) -> List[dict]:
@@ -294,10 +530,31 @@ async def analyze(payload: AnalyzeRequest) -> AnalyzeResponse:
     يُرجع نتائج موحّدة حتى لو تغيّر شكل مخرجات analyze_selection
     (list[dict]/list[str]/list[tuple]/dict يحتوي على 'results'/غير ذلك).
     """
-    raw = analyze_selection(
-        payload.side, payload.circle.cx, payload.circle.cy, payload.circle.radius
+    raw = await _run_analysis(
+        analyze_selection_cached,
+        payload.side, payload.circle.cx, payload.circle.cy, payload.circle.radius,
     )
+    with stage("coerce"):
+        return _to_analyze_response(payload.side, raw)
+
 
+async def _run_analysis(fn: Any, *args: Any) -> Any:
+    """يشغّل التحليل على ANALYSIS_POOL: 503 سريع لو الطابور ممتلئ و504 لو تعدّى المهلة."""
+    try:
+        with stage("analysis"):
+            return await ANALYSIS_POOL.run(fn, *args)
+    except QueueFullError:
+        raise HTTPException(
+            status_code=503,
+            detail="Analysis queue is full, retry shortly",
+            headers={"Retry-After": "1"},
+        )
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="Analysis timed out")
+
+
+def _to_analyze_response(side: str, raw: Any) -> AnalyzeResponse:
+    """يوحّد مخرجات analyze_selection إلى AnalyzeResponse."""
     # قد يرجع dict فيه 'results' أو مباشرة list
     if isinstance(raw, dict) and "results" in raw:
         raw_list = raw.get("results", [])
@@ -309,48 +566,132 @@ async def analyze(payload: AnalyzeRequest) -> AnalyzeResponse:
 
     muscles: List[Muscle] = []
     for item in raw_list:
-        m = _coerce_item_to_muscle(payload.side, item)
+        m = _coerce_item_to_muscle(side, item)
         if m:
             muscles.append(m)
 
     return AnalyzeResponse(results=muscles)
 
 
+async def _analyze_one(selection: tuple) -> Any:
+    """يحلل عنصر واحد من الدفعة لحاله؛ None لو فشل (الباقي ما يتأثر)."""
+    try:
+        return (await _run_analysis(analyze_selection_batch, [selection]))[0]
+    except HTTPException:
+        raise
+    except Exception as exc:
+        logger.warning("Batch item analysis failed for %s: %s", selection, exc)
+        return None
+
+
+@app.post("/api/analyze/batch", response_model=List[BatchAnalyzeItem])
+async def analyze_batch(payload: List[Any]) -> List[BatchAnalyzeItem]:
+    """
+    يحلل عدة دوائر (front/back مختلطة) في طلب واحد ويرجع نتيجة لكل عنصر بنفس الترتيب.
+    كل عنصر يُتحقق منه لحاله (حتى لو مو object)، فالعنصر الخاطئ يرجع error بدون ما
+    يفشّل الباقي. لو فشل التحليل الدفعي تُحلل العناصر واحد واحد حتى يظهر الخطأ على
+    العنصر المسبب فقط.
+    """
+    if len(payload) > ANALYZE_BATCH_MAX_ITEMS:
+        raise HTTPException(
+            status_code=413,
+            detail=f"Batch too large: {len(payload)} items (max {ANALYZE_BATCH_MAX_ITEMS})",
+        )
+
+    items: List[BatchAnalyzeItem] = [BatchAnalyzeItem(results=[]) for _ in payload]
+    valid: List[tuple[int, AnalyzeRequest]] = []
+    for index, raw_item in enumerate(payload):
+        try:
+            valid.append((index, AnalyzeRequest.model_validate(raw_item)))
+        except ValidationError as exc:
+            items[index].error = "; ".join(
+                f"{'.'.join(str(part) for part in err['loc'])}: {err['msg']}" if err["loc"] else err["msg"]
+                for err in exc.errors()
+            )
+
+    selections = [
+        (req.side, req.circle.cx, req.circle.cy, req.circle.radius) for _, req in valid
+    ]
+    try:
+        raw_results = await _run_analysis(analyze_selection_batch, selections)
+    except HTTPException:
+        raise
+    except Exception as exc:
+        logger.exception("Batch analysis failed, scoring items one by one: %s", exc)
+        raw_results = [await _analyze_one(selection) for selection in selections]
+
+    for (index, req), raw in zip(valid, raw_results):
+        if raw is None:
+            items[index].error = "analysis failed"
+            continue
+        response = _to_analyze_response(req.side, raw)
+        items[index].results = response.results
+
+    return items
+
+
 # ================================ Chat Helpers ===============================
 
-async def _handle_chat(payload: ChatRequest) -> ChatResponse:
+async def _prepare_chat(payload: ChatRequest) -> tuple[str, List[Dict[str, str]], str, Optional[CacheKey]]:
+    """
+    يجهّز (session_id, الرسائل المرسلة للنموذج, رابط يوتيوب, مفتاح كاش الرد) لطلب الشات.
+    مفتاح الكاش None إلا في أول REPLY_CACHE_MAX_TURNS أدوار، لأن بعدها التاريخ يغيّر الجواب.
+    """
     session_id = payload.session_id or uuid4().hex
-    history = await _get_history(session_id)
+    history, tokens = await _get_history(session_id)
 
     context_message = _build_context_message(payload.context)
-    request_messages = list(history)
+    user_message = {"role": "user", "content": payload.user_message}
+    with stage("prompt"):
+        reserved = message_tokens(user_message) + (message_tokens(context_message) if context_message else 0)
+        request_messages = _fit_token_budget(history, tokens, reserved)
     if context_message:
         request_messages.append(context_message)
-    request_messages.append({"role": "user", "content": payload.user_message})
+    request_messages.append(user_message)
 
     youtube = _youtube_link(payload.context)
+    cache_key = None
+    if REPLY_CACHE.enabled and count_turns(history) < REPLY_CACHE_MAX_TURNS:
+        muscles = [(muscle.muscle_en, muscle.prob) for muscle in payload.context.muscles]
+        cache_key = reply_cache_key(payload.user_message, muscles, payload.language)
+    return session_id, request_messages, youtube, cache_key
+
+
+async def _handle_chat(payload: ChatRequest) -> ChatResponse:
+    session_id, request_messages, youtube, cache_key = await _prepare_chat(payload)
 
     reply_text = ""
     used_openai = False
+    cached_reply = REPLY_CACHE.get(cache_key) if cache_key else None
 
-    if client:
+    if cached_reply is not None:
+        reply_text = cached_reply
+    elif client:
         try:
-            completion = await asyncio.to_thread(
-                client.chat.completions.create,
-                model=OPENAI_MODEL or "gpt-4o-mini",
-                messages=request_messages,
-                temperature=0.6,
-                max_tokens=350,
-            )
-            reply_text = (completion.choices[0].message.content or "").strip()
+            start = time.perf_counter()
+            with stage("upstream"):
+                reply_text = await client.complete(request_messages, temperature=0.6, max_tokens=350)
             used_openai = True
+            if cache_key:
+                REPLY_CACHE.put(cache_key, reply_text, time.perf_counter() - start)
+        except CircuitOpenError:
+            # upstream معطّل حالياً: fallback فوري بدون انتظار المهلة
+            CHAT_FALLBACKS.inc("circuit_open")
+            reply_text = _fallback_message(payload.user_message, youtube)
+        except asyncio.TimeoutError:
+            logger.warning("OpenAI chat completion exceeded its deadline")
+            CHAT_FALLBACKS.inc("timeout")
+            reply_text = _fallback_message(payload.user_message, youtube)
         except (ValueError, IndexError) as exc:
             logger.exception("OpenAI chat completion failed: %s", exc)
+            CHAT_FALLBACKS.inc("error")
             reply_text = _fallback_message(payload.user_message, youtube)
         except Exception as exc:  # pragma: no cover
             logger.exception("Unexpected error from OpenAI: %s", exc)
+            CHAT_FALLBACKS.inc("error")
             reply_text = _fallback_message(payload.user_message, youtube)
     else:
+        CHAT_FALLBACKS.inc("no_client")
         reply_text = _fallback_message(payload.user_message, youtube)
 
     turns = await _update_session(session_id, payload.user_message, reply_text)
@@ -361,6 +702,82 @@ async def _handle_chat(payload: ChatRequest) -> ChatResponse:
         turns=turns,
         usedOpenAI=used_openai,
         youtube=youtube,
+        cached=cached_reply is not None,
+    )
+
+
+def _sse(data: Dict[str, Any], event: Optional[str] = None) -> str:
+    prefix = f"event: {event}\n" if event else ""
+    return f"{prefix}data: {json.dumps(data, ensure_ascii=False)}\n\n"
+
+
+def _word_pieces(text: str) -> List[str]:
+    return re.findall(r"\S+\s*", text)
+
+
+async def _chat_events(
+    payload: ChatRequest,
+    session_id: str,
+    request_messages: List[Dict[str, str]],
+    youtube: str,
+    cache_key: Optional[CacheKey] = None,
+) -> AsyncIterator[str]:
+    """
+    يبث الرد كـ SSE: أحداث {"delta": ...} ثم حدث done فيه session_id/turns/usedOpenAI/cached/youtube.
+    الجلسة تتحدث فقط بعد ما يكتمل البث؛ لو انقطع العميل ما نسجّل الدور.
+    """
+    parts: List[str] = []
+    used_openai = False
+    cached_reply = REPLY_CACHE.get(cache_key) if cache_key else None
+
+    if cached_reply is not None:
+        for piece in _word_pieces(cached_reply):
+            parts.append(piece)
+            yield _sse({"delta": piece})
+    elif client:
+        reason = ""
+        try:
+            start = time.perf_counter()
+            async for delta in client.stream(request_messages, temperature=0.6, max_tokens=350):
+                parts.append(delta)
+                yield _sse({"delta": delta})
+            used_openai = True
+            metrics.observe_stage("upstream", time.perf_counter() - start)
+            if cache_key:
+                REPLY_CACHE.put(cache_key, "".join(parts).strip(), time.perf_counter() - start)
+        except CircuitOpenError:
+            reason = "circuit_open"
+        except asyncio.TimeoutError:
+            logger.warning("OpenAI chat stream exceeded its deadline")
+            reason = "timeout"
+        except Exception as exc:  # pragma: no cover
+            logger.exception("OpenAI chat stream failed: %s", exc)
+            reason = "error"
+        # لو وصل جزء من الرد قبل الخطأ نكمل به بدل ما نخلط معه رسالة الاعتذار
+        used_openai = used_openai or bool(parts)
+        if reason and not used_openai:
+            CHAT_FALLBACKS.inc(reason)
+    elif cached_reply is None:
+        CHAT_FALLBACKS.inc("no_client")
+
+    if not used_openai and cached_reply is None:
+        # الـ fallback يُبث بنفس الطريقة حتى يكون عند الواجهة مسار واحد
+        for piece in _word_pieces(_fallback_message(payload.user_message, youtube)):
+            parts.append(piece)
+            yield _sse({"delta": piece})
+
+    reply_text = "".join(parts).strip()
+    turns = await _update_session(session_id, payload.user_message, reply_text)
+    yield _sse(
+        {
+            "session_id": session_id,
+            "reply": reply_text,
+            "turns": turns,
+            "usedOpenAI": used_openai,
+            "cached": cached_reply is not None,
+            "youtube": youtube,
+        },
+        event="done",
     )
 
 
@@ -374,3 +791,14 @@ async def send_chat(payload: ChatRequest) -> ChatResponse:
 @app.post("/api/chat", response_model=ChatResponse)
 async def send_chat_alias(payload: ChatRequest) -> ChatResponse:
     return await _handle_chat(payload)
+
+
+@app.post("/api/chat/stream")
+async def stream_chat(payload: ChatRequest) -> StreamingResponse:
+    """نفس /api/chat لكن الرد يوصل كـ Server-Sent Events أول بأول."""
+    session_id, request_messages, youtube, cache_key = await _prepare_chat(payload)
+    return StreamingResponse(
+        _chat_events(payload, session_id, request_messages, youtube, cache_key),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,235 @@
+"""Hot-path stage timers, Server-Timing headers and a Prometheus text registry."""
+
+from __future__ import annotations
+
+import bisect
+import contextvars
+import threading
+import time
+from contextlib import nullcontext
+from typing import Any, Callable, ContextManager, Dict, List, Optional, Sequence, Tuple
+
+from .config import METRICS_ENABLED
+
+LabelValues = Tuple[str, ...]
+Sample = Tuple[str, str, str, Dict[str, str], float]  # (name, type, help, labels, value)
+
+_ENABLED = METRICS_ENABLED
+
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0,
+)
+
+
+def enabled() -> bool:
+    return _ENABLED
+
+
+def set_enabled(value: bool) -> None:
+    global _ENABLED
+    _ENABLED = value
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names: Sequence[str], values: LabelValues, extra: str = "") -> str:
+    parts = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, labels: Sequence[str] = ()) -> None:
+        self.name, self.help, self.label_names = name, help_text, tuple(labels)
+        self._values: Dict[LabelValues, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *labels: str, amount: float = 1.0) -> None:
+        with self._lock:
+            self._values[labels] = self._values.get(labels, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for labels, value in sorted(self._values.items()):
+                lines.append(f"{self.name}{_labels(self.label_names, labels)} {value:g}")
+        return lines
+
+
+class Histogram:
+    def __init__(
+        self, name: str, help_text: str, labels: Sequence[str] = (), buckets: Sequence[float] = DEFAULT_BUCKETS
+    ) -> None:
+        self.name, self.help, self.label_names = name, help_text, tuple(labels)
+        self.buckets = tuple(buckets)
+        # لكل مجموعة labels: [عدد كل bucket (غير تراكمي)..., +Inf] + المجموع
+        self._series: Dict[LabelValues, Tuple[List[int], List[float]]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str) -> None:
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(labels)
+            if series is None:
+                series = self._series[labels] = ([0] * (len(self.buckets) + 1), [0.0])
+            series[0][index] += 1
+            series[1][0] += value
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for labels, (counts, total) in sorted(self._series.items()):
+                running = 0
+                bounds = [f"{bound:g}" for bound in self.buckets] + ["+Inf"]
+                for bound, count in zip(bounds, counts):
+                    running += count
+                    le = 'le="' + bound + '"'
+                    lines.append(f"{self.name}_bucket{_labels(self.label_names, labels, le)} {running}")
+                lines.append(f"{self.name}_sum{_labels(self.label_names, labels)} {total[0]:.6f}")
+                lines.append(f"{self.name}_count{_labels(self.label_names, labels)} {running}")
+        return lines
+
+
+REQUEST_SECONDS = Histogram(
+    "armonia_request_seconds", "HTTP request latency by route", ("method", "route", "status")
+)
+STAGE_SECONDS = Histogram("armonia_stage_seconds", "Latency of instrumented hot-path stages", ("stage",))
+CHAT_FALLBACKS = Counter("armonia_chat_fallbacks_total", "Chat replies answered by the offline fallback", ("reason",))
+
+_METRICS: List[Any] = [REQUEST_SECONDS, STAGE_SECONDS, CHAT_FALLBACKS]
+# دوال ترجع قيم لحظية (عدادات الكاش، الجلسات، upstream) وقت طلب /metrics فقط
+_COLLECTORS: List[Callable[[], List[Sample]]] = []
+
+
+def register_collector(collector: Callable[[], List[Sample]]) -> None:
+    _COLLECTORS.append(collector)
+
+
+def render() -> str:
+    lines: List[str] = []
+    for metric in _METRICS:
+        lines.extend(metric.render())
+    # عينات نفس الاسم لازم تكون متتالية في صيغة Prometheus، فنجمعها حسب الاسم أولاً
+    families: Dict[str, Tuple[str, str, List[str]]] = {}
+    for collector in _COLLECTORS:
+        for name, kind, help_text, labels, value in collector():
+            family = families.setdefault(name, (kind, help_text, []))
+            family[2].append(f"{name}{_labels(tuple(labels), tuple(labels.values()))} {value:g}")
+    for name, (kind, help_text, samples) in families.items():
+        lines.append(f"# HELP {name} {help_text}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(samples)
+    return "\n".join(lines) + "\n"
+
+
+class RequestTimings:
+    """أزمنة مراحل طلب واحد (تُجمع في Server-Timing). depth يميّز المراحل العليا من المتداخلة."""
+
+    __slots__ = ("stages", "depth", "top_level")
+
+    def __init__(self) -> None:
+        self.stages: List[Tuple[str, float]] = []
+        self.depth = 0
+        self.top_level = 0.0
+
+    def header(self, total: float) -> str:
+        merged: Dict[str, float] = {}
+        for name, duration in self.stages:
+            merged[name] = merged.get(name, 0.0) + duration
+        parts = [f"{name};dur={duration * 1000:.3f}" for name, duration in merged.items()]
+        # other = وقت الإطار نفسه (validation/serialisation/routing) خارج المراحل العليا
+        parts.append(f"other;dur={max(total - self.top_level, 0.0) * 1000:.3f}")
+        parts.append(f"total;dur={total * 1000:.3f}")
+        return ", ".join(parts)
+
+
+_CURRENT: contextvars.ContextVar[Optional[RequestTimings]] = contextvars.ContextVar(
+    "armonia_request_timings", default=None
+)
+
+
+class _Stage:
+    __slots__ = ("name", "timings", "start")
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.timings = _CURRENT.get()
+
+    def __enter__(self) -> None:
+        if self.timings is not None:
+            self.timings.depth += 1
+        self.start = time.perf_counter()
+
+    def __exit__(self, *_exc: Any) -> None:
+        duration = time.perf_counter() - self.start
+        STAGE_SECONDS.observe(duration, self.name)
+        timings = self.timings
+        if timings is not None:
+            timings.depth -= 1
+            timings.stages.append((self.name, duration))
+            if timings.depth == 0:
+                timings.top_level += duration
+
+
+_DISABLED = nullcontext()
+
+
+def stage(name: str) -> ContextManager[None]:
+    """يقيس مرحلة ويضيفها للطلب الحالي (لو فيه) ولـ armonia_stage_seconds."""
+    if not _ENABLED:
+        return _DISABLED
+    return _Stage(name)
+
+
+def observe_stage(name: str, duration: float) -> None:
+    """لمراحل محسوبة مسبقاً (مثل انتظار القفل) بدون context manager."""
+    if not _ENABLED:
+        return
+    STAGE_SECONDS.observe(duration, name)
+    timings = _CURRENT.get()
+    if timings is not None:
+        timings.stages.append((name, duration))
+        if timings.depth == 0:
+            timings.top_level += duration
+
+
+class TimingMiddleware:
+    """
+    ASGI middleware: ينشئ RequestTimings لكل طلب HTTP، يضيف Server-Timing للرد،
+    ويسجّل armonia_request_seconds بحسب المسار المطابق (route.path) لتفادي labels كثيرة.
+    """
+
+    def __init__(self, app: Any) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or not _ENABLED:
+            await self.app(scope, receive, send)
+            return
+        timings = RequestTimings()
+        token = _CURRENT.set(timings)
+        start = time.perf_counter()
+        status = [500]
+
+        async def send_with_timing(message: Dict[str, Any]) -> None:
+            if message["type"] == "http.response.start":
+                status[0] = message["status"]
+                header = timings.header(time.perf_counter() - start).encode("latin-1")
+                message.setdefault("headers", [])
+                message["headers"] = list(message["headers"]) + [(b"server-timing", header)]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            _CURRENT.reset(token)
+            route = scope.get("route")
+            REQUEST_SECONDS.observe(
+                time.perf_counter() - start,
+                scope.get("method", ""),
+                getattr(route, "path", "unmatched"),
+                str(status[0]),
+            )
@@ -5,12 +5,20 @@ from __future__ import annotations
 from typing import Dict, List, Literal, TypedDict
 
 
-class MuscleMeta(TypedDict):
+class _MuscleShape(TypedDict, total=False):
+    # shape == "polygon": vertices [[x, y], ...] in normalised image coordinates
+    polygon_norm: List[List[float]]
+    # shape == "mask": 2-D .npy mask (relative to backend/) stretched over box_norm
+    mask: str
+
+
+class MuscleMeta(_MuscleShape):
     id: int
     name_en: str
     name_ar: str
     region: str
-    shape: Literal["box"]
+    shape: Literal["box", "polygon", "mask"]
+    # Bounding box for every shape (fallback, UI and geometric engine); polygons/masks fill it
     box_norm: List[float]
 
 
@@ -324,6 +332,17 @@ BODY_MAP: Dict[BodySideKey, BodySide] = {
 }
 
 
+# Bumped by body_map_changed(); derived caches (label maps, ID lookup, analyze results)
+# are rebuilt when it moves, so code that edits BODY_MAP at runtime must call it.
+BODY_MAP_VERSION = 0
+
+
+def body_map_changed() -> None:
+    """Mark BODY_MAP as edited so caches built from it are rebuilt on next use."""
+    global BODY_MAP_VERSION
+    BODY_MAP_VERSION += 1
+
+
 def build_id_lookup() -> Dict[int, MuscleMeta]:
     """Return a flat {id: meta} mapping for quick lookup."""
     lookup: Dict[int, MuscleMeta] = {}
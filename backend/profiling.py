@@ -0,0 +1,316 @@
+"""Opt-in sampling profiler for live ``/api/analyze`` and ``/api/chat`` requests."""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import random
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from pathlib import Path
+from types import FrameType
+from typing import Any, Callable, Dict, Iterator, List, Optional, Sequence, Set, Tuple
+
+from .config import (
+    PROFILE_DIR,
+    PROFILE_ENABLED,
+    PROFILE_HEADER,
+    PROFILE_HEADER_TOKEN,
+    PROFILE_INTERVAL_S,
+    PROFILE_KEEP_SLOWEST,
+    PROFILE_MAX_CONCURRENT,
+    PROFILE_MAX_FILES,
+    PROFILE_PATHS,
+    PROFILE_SAMPLE_RATE,
+)
+
+_IDS = itertools.count(1)
+
+
+def _frame_label(frame: FrameType) -> str:
+    code = frame.f_code
+    module = os.path.splitext(os.path.basename(code.co_filename))[0]
+    return f"{module}:{getattr(code, 'co_qualname', code.co_name)}"
+
+
+def _coroutine_frames(task: "asyncio.Task[Any]") -> List[FrameType]:
+    """سلسلة الـ await للطلب (من الخارج للداخل)، سواء كان شغال أو معلّق على await."""
+    frames: List[FrameType] = []
+    awaitable: Any = task.get_coro()
+    while awaitable is not None:
+        frame = (
+            getattr(awaitable, "cr_frame", None)
+            or getattr(awaitable, "gi_frame", None)
+            or getattr(awaitable, "ag_frame", None)
+        )
+        if frame is None:
+            break
+        frames.append(frame)
+        awaitable = (
+            getattr(awaitable, "cr_await", None)
+            or getattr(awaitable, "gi_yieldfrom", None)
+            or getattr(awaitable, "ag_await", None)
+        )
+    return frames
+
+
+class Profile:
+    """عينات طلب واحد: collapsed stacks -> عدد العينات."""
+
+    def __init__(self, method: str, path: str) -> None:
+        self.id = next(_IDS)
+        self.method = method
+        self.path = path
+        self.started_at = time.time()
+        self.duration_s = 0.0
+        self.samples = 0
+        self.stacks: Counter[str] = Counter()
+        self.threads: Set[int] = set()
+        self.file: Optional[str] = None
+
+    def top_frames(self, limit: int = 10) -> List[Dict[str, Any]]:
+        """أكثر الدوال ظهوراً في رأس الـ stack (self time تقريبي)."""
+        leaves: Counter[str] = Counter()
+        for stack, count in self.stacks.items():
+            leaves[stack.rsplit(";", 1)[-1]] += count
+        total = sum(leaves.values()) or 1
+        return [
+            {"frame": frame, "samples": count, "pct": round(100 * count / total, 1)}
+            for frame, count in leaves.most_common(limit)
+        ]
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "method": self.method,
+            "path": self.path,
+            "started_at": round(self.started_at, 3),
+            "duration_ms": round(self.duration_s * 1000, 3),
+            "samples": self.samples,
+            "file": self.file,
+            "top_frames": self.top_frames(),
+        }
+
+
+_CURRENT: contextvars.ContextVar[Optional[Profile]] = contextvars.ContextVar("armonia_profile", default=None)
+
+
+@contextmanager
+def bind_worker_thread() -> Iterator[None]:
+    """يربط الـ worker thread الحالي بالـ profile (لو الطلب مُراقب) طول مدة المهمة."""
+    profile = _CURRENT.get()
+    if profile is None:
+        yield
+        return
+    ident = threading.get_ident()
+    profile.threads.add(ident)
+    try:
+        yield
+    finally:
+        profile.threads.discard(ident)
+
+
+def _worker_stack(frame: Optional[FrameType]) -> List[str]:
+    # نقص إطارات ThreadPoolExecutor/threading ونبدأ من workers._timed_call
+    labels: List[str] = []
+    while frame is not None:
+        labels.append(_frame_label(frame))
+        if frame.f_code.co_name == "_timed_call":
+            return labels[::-1]
+        frame = frame.f_back
+    return []
+
+
+class _Sampler(threading.Thread):
+    def __init__(
+        self,
+        profile: Profile,
+        task: "asyncio.Task[Any]",
+        loop_thread: int,
+        interval_s: float,
+        on_done: Callable[[Profile], None],
+    ) -> None:
+        super().__init__(name=f"profiler-{profile.id}", daemon=True)
+        self.profile = profile
+        self.on_done = on_done
+        self.task = task
+        self.loop_thread = loop_thread
+        self.interval_s = interval_s
+        self.stopped = threading.Event()
+
+    def _sample(self) -> None:
+        current = sys._current_frames()
+        profile = self.profile
+        coroutine = _coroutine_frames(self.task)
+        if coroutine:
+            labels = [_frame_label(frame) for frame in coroutine]
+            # لو الطلب شغال الحين على الـ loop، نكمل بالدوال المتزامنة فوق آخر coroutine
+            innermost, extra = coroutine[-1], []
+            frame = current.get(self.loop_thread)
+            while frame is not None and frame is not innermost:
+                extra.append(_frame_label(frame))
+                frame = frame.f_back
+            if frame is innermost:
+                labels.extend(reversed(extra))
+            profile.stacks[";".join(["task", *labels])] += 1
+        for ident in list(profile.threads):
+            labels = _worker_stack(current.get(ident))
+            if labels:
+                profile.stacks[";".join(["worker", *labels])] += 1
+        profile.samples += 1
+
+    def run(self) -> None:
+        while not self.stopped.wait(self.interval_s):
+            self._sample()
+        # الكتابة على القرص هنا بعد ما يوقف الـ sampler، مو على الـ event loop
+        self.on_done(self.profile)
+
+
+class Profiler:
+    """
+    يختار الطلبات المراقبة (نسبة عشوائية أو header)، يجمع العينات بـ thread منفصل،
+    يكتب collapsed stacks لكل طلب في directory مع تدوير، ويحفظ أبطأ الطلبات للـ admin endpoint.
+    """
+
+    def __init__(
+        self,
+        *,
+        enabled: bool,
+        sample_rate: float,
+        header: str,
+        header_token: Optional[str],
+        paths: Sequence[str],
+        directory: str,
+        interval_s: float,
+        max_files: int,
+        keep_slowest: int,
+        max_concurrent: int,
+    ) -> None:
+        self.enabled = enabled
+        self.sample_rate = sample_rate
+        self.header = header.lower().encode("latin-1")
+        self.header_token = header_token
+        self.paths = tuple(paths)
+        self.directory = Path(directory)
+        self.interval_s = interval_s
+        self.max_files = max_files
+        self.keep_slowest = keep_slowest
+        self.max_concurrent = max(max_concurrent, 1)
+        self._active = 0
+        self._lock = threading.Lock()
+        self._slowest: List[Tuple[float, int, Profile]] = []  # min-heap حسب المدة
+        self.profiled = 0
+        self.skipped = 0
+
+    def wants(self, scope: Dict[str, Any]) -> bool:
+        if not self.enabled or not scope.get("path", "").startswith(self.paths):
+            return False
+        # بدون header_token ما نسمح لأي عميل يفرض profiling؛ يبقى السحب العشوائي فقط
+        if self.header_token:
+            for name, value in scope.get("headers", []):
+                if name == self.header:
+                    return value.decode("latin-1") == self.header_token
+        return random.random() < self.sample_rate
+
+    def _acquire(self) -> bool:
+        with self._lock:
+            if self._active >= self.max_concurrent:
+                self.skipped += 1
+                return False
+            self._active += 1
+            return True
+
+    def _finish(self, profile: Profile) -> None:
+        profile.file = self._write(profile)
+        with self._lock:
+            self._active -= 1
+            self.profiled += 1
+            entry = (profile.duration_s, profile.id, profile)
+            if len(self._slowest) < self.keep_slowest:
+                heapq.heappush(self._slowest, entry)
+            elif self.keep_slowest:
+                heapq.heappushpop(self._slowest, entry)
+
+    def _write(self, profile: Profile) -> Optional[str]:
+        if not profile.stacks:
+            return None
+        self.directory.mkdir(parents=True, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(profile.started_at))
+        route = profile.path.strip("/").replace("/", "_") or "root"
+        path = self.directory / f"{stamp}-{profile.id:06d}-{route}-{profile.duration_s * 1000:.0f}ms.folded"
+        path.write_text(
+            "".join(f"{stack} {count}\n" for stack, count in profile.stacks.most_common()), encoding="utf-8"
+        )
+        files = sorted(self.directory.glob("*.folded"), key=lambda item: item.stat().st_mtime)
+        for old in files[: max(len(files) - self.max_files, 0)]:
+            old.unlink(missing_ok=True)
+        return str(path)
+
+    @contextmanager
+    def profile(self, method: str, path: str) -> Iterator[Optional[Profile]]:
+        task = asyncio.current_task()
+        if task is None or not self._acquire():
+            yield None
+            return
+        profile = Profile(method, path)
+        token = _CURRENT.set(profile)
+        sampler = _Sampler(profile, task, threading.get_ident(), self.interval_s, self._finish)
+        start = time.perf_counter()
+        sampler.start()
+        try:
+            yield profile
+        finally:
+            profile.duration_s = time.perf_counter() - start
+            sampler.stopped.set()
+            _CURRENT.reset(token)
+
+    def slowest(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            entries = sorted(self._slowest, reverse=True)
+        return [profile.summary() for _, _, profile in entries]
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "enabled": self.enabled,
+                "sample_rate": self.sample_rate,
+                "active": self._active,
+                "profiled": self.profiled,
+                "skipped": self.skipped,
+                "directory": str(self.directory),
+            }
+
+
+class ProfilingMiddleware:
+    """ASGI middleware: يغلّف الطلبات المختارة بـ Profiler.profile."""
+
+    def __init__(self, app: Any, profiler: Profiler) -> None:
+        self.app = app
+        self.profiler = profiler
+
+    async def __call__(self, scope: Dict[str, Any], receive: Any, send: Any) -> None:
+        if scope["type"] != "http" or not self.profiler.wants(scope):
+            await self.app(scope, receive, send)
+            return
+        with self.profiler.profile(scope.get("method", ""), scope.get("path", "")):
+            await self.app(scope, receive, send)
+
+
+PROFILER = Profiler(
+    enabled=PROFILE_ENABLED,
+    sample_rate=PROFILE_SAMPLE_RATE,
+    header=PROFILE_HEADER,
+    header_token=PROFILE_HEADER_TOKEN,
+    paths=PROFILE_PATHS,
+    directory=PROFILE_DIR,
+    interval_s=PROFILE_INTERVAL_S,
+    max_files=PROFILE_MAX_FILES,
+    keep_slowest=PROFILE_KEEP_SLOWEST,
+    max_concurrent=PROFILE_MAX_CONCURRENT,
+)
@@ -0,0 +1,68 @@
+"""Reply cache for repeated first-turn coaching questions (opt-in, TTL + LRU)."""
+
+from __future__ import annotations
+
+import re
+import threading
+import unicodedata
+from typing import Dict, Iterable, Optional, Tuple
+
+from .cache import LRUCache
+
+_DIACRITICS = re.compile(r"[\u064B-\u065F\u0670\u0640]")  # التشكيل + التطويل
+_LETTERS = str.maketrans({"أ": "ا", "إ": "ا", "آ": "ا", "ى": "ي", "ة": "ه"})
+
+CacheKey = Tuple[str, Tuple[str, ...], str]
+
+
+def normalise_message(text: str) -> str:
+    """
+    يوحّد صياغة السؤال قبل المقارنة: NFKC، حروف صغيرة، بدون تشكيل أو ترقيم،
+    توحيد الألف/الياء/التاء المربوطة، ومسافات مفردة.
+    """
+    text = _DIACRITICS.sub("", unicodedata.normalize("NFKC", text).casefold()).translate(_LETTERS)
+    kept = (" " if unicodedata.category(ch)[0] in "PSZ" else ch for ch in text)
+    return " ".join("".join(kept).split())
+
+
+def reply_cache_key(user_message: str, muscles: Iterable[Tuple[str, float]], language: str) -> CacheKey:
+    """المفتاح = السؤال الموحّد + أعلى 3 عضلات (بالترتيب حسب الاحتمال) + اللغة."""
+    top = sorted(muscles, key=lambda item: item[1], reverse=True)[:3]
+    return normalise_message(user_message), tuple(name.casefold() for name, _ in top), language.casefold()
+
+
+class ReplyCache:
+    """
+    غلاف على LRUCache يخزّن (الرد, زمن الطلب الأصلي) حتى نعرف كم وفّرنا على OpenAI.
+    نخزّن فقط ردود OpenAI الناجحة، ما نخزّن ردود الـ fallback.
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_s: float) -> None:
+        self._cache: LRUCache[Tuple[str, float]] = LRUCache(max_entries, max_bytes, ttl_s)
+        self._lock = threading.Lock()
+        self.saved_s = 0.0
+
+    @property
+    def enabled(self) -> bool:
+        return self._cache.enabled
+
+    def get(self, key: CacheKey) -> Optional[str]:
+        entry = self._cache.get(key)
+        if entry is None:
+            return None
+        with self._lock:
+            self.saved_s += entry[1]
+        return entry[0]
+
+    def put(self, key: CacheKey, reply: str, latency_s: float) -> None:
+        if reply:
+            self._cache.put(key, (reply, latency_s))
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self) -> Dict[str, object]:
+        stats: Dict[str, object] = dict(self._cache.stats())
+        stats["ttl_s"] = self._cache.ttl_s
+        stats["saved_upstream_ms"] = round(self.saved_s * 1000, 1)
+        return stats
@@ -0,0 +1,408 @@
+"""Chat session storage backends.
+
+``InMemorySessionStore`` keeps sessions in process memory (sharded, idle-TTL, LRU
+and memory limits). ``SQLiteSessionStore`` keeps them in a shared SQLite/WAL
+file so several uvicorn workers see the same conversations.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import sqlite3
+import sys
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Tuple
+
+from .metrics import observe_stage
+
+Message = Dict[str, str]
+History = List[Message]
+# عدد توكنات كل رسالة بنفس ترتيب التاريخ (يُحسب مرة وحدة عند الإضافة)
+Tokens = List[int]
+Prune = Callable[[History, Tokens], Tuple[History, Tokens]]
+
+
+def message_bytes(message: Message) -> int:
+    """حجم تقريبي للرسالة في الذاكرة (النص + dict نفسه)."""
+    return sys.getsizeof(message) + sum(sys.getsizeof(value) for value in message.values())
+
+
+def count_turns(history: History) -> int:
+    return sum(1 for message in history if message["role"] == "assistant")
+
+
+class SessionBackend(ABC):
+    """الواجهة اللي يعتمد عليها _get_history / _update_session."""
+
+    @abstractmethod
+    async def get_history_tokens(self, session_id: str) -> Tuple[History, Tokens]:
+        """التاريخ الحالي (بعد القص) مع توكنات كل رسالة؛ جلسة جديدة ترجع التاريخ الابتدائي."""
+
+    async def get_history(self, session_id: str) -> History:
+        history, _ = await self.get_history_tokens(session_id)
+        return history
+
+    @abstractmethod
+    async def append_turn(self, session_id: str, user_text: str, assistant_text: str) -> int:
+        """يضيف دور (مستخدم + مساعد) ويرجع عدد الأدوار في التاريخ بعد القص."""
+
+    async def sweep(self) -> int:
+        """تنظيف دوري للجلسات المنتهية؛ يرجع عدد المطرود."""
+        return 0
+
+    async def aclose(self) -> None:
+        return None
+
+    @abstractmethod
+    def stats(self) -> Dict[str, object]:
+        ...
+
+
+@dataclass
+class _Session:
+    history: History
+    tokens: Tokens
+    size: int
+    last_used: float
+
+
+@dataclass
+class _Shard:
+    sessions: "OrderedDict[str, _Session]" = field(default_factory=OrderedDict)
+    lock: asyncio.Lock = field(default_factory=asyncio.Lock)
+    size: int = 0
+
+
+class InMemorySessionStore(SessionBackend):
+    """
+    بديل SESSIONS + SESSIONS_LOCK:
+    - الجلسات موزعة على shards لكل واحد قفل خاص، فالجلسات المختلفة ما تنتظر بعض.
+    - كل shard مرتب LRU؛ نطرد الجلسات الخاملة أكثر من idle_ttl_s، ثم الأقدم لو تعدينا
+      max_sessions أو max_bytes (الحدود مقسومة بالتساوي على الـ shards).
+    - get_history ينشئ الجلسة لو ما كانت موجودة (نفس سلوك setdefault القديم).
+    """
+
+    def __init__(
+        self,
+        *,
+        initial: Callable[[], History],
+        prune: Prune,
+        count: Callable[[Message], int],
+        shards: int = 16,
+        max_sessions: int = 10_000,
+        idle_ttl_s: float = 6 * 3600,
+        max_bytes: int = 64 * 1024 * 1024,
+    ) -> None:
+        self._initial = initial
+        self._prune = prune
+        self._count = count
+        self._shards = [_Shard() for _ in range(max(shards, 1))]
+        self._max_per_shard = max(-(-max_sessions // len(self._shards)), 1)
+        self._bytes_per_shard = max(max_bytes // len(self._shards), 1) if max_bytes > 0 else 0
+        self.idle_ttl_s = idle_ttl_s
+        self.evictions = {"idle": 0, "lru": 0, "memory": 0}
+        self.lock_wait_s = 0.0
+        self.lock_acquisitions = 0
+
+    def _shard(self, session_id: str) -> _Shard:
+        return self._shards[hash(session_id) % len(self._shards)]
+
+    async def _acquire(self, shard: _Shard) -> None:
+        start = time.perf_counter()
+        await shard.lock.acquire()
+        waited = time.perf_counter() - start
+        self.lock_wait_s += waited
+        self.lock_acquisitions += 1
+        observe_stage("session_lock", waited)
+
+    def _drop(self, shard: _Shard, session_id: str, reason: str) -> None:
+        session = shard.sessions.pop(session_id)
+        shard.size -= session.size
+        self.evictions[reason] += 1
+
+    def _evict(self, shard: _Shard, now: float, keep: str) -> None:
+        # الأقدم استخداماً في البداية، فنوقف عند أول جلسة غير منتهية
+        while shard.sessions:
+            oldest_id, oldest = next(iter(shard.sessions.items()))
+            if oldest_id == keep or now - oldest.last_used <= self.idle_ttl_s:
+                break
+            self._drop(shard, oldest_id, "idle")
+        while len(shard.sessions) > self._max_per_shard:
+            oldest_id = next(iter(shard.sessions))
+            if oldest_id == keep:
+                break
+            self._drop(shard, oldest_id, "lru")
+        while self._bytes_per_shard and shard.size > self._bytes_per_shard and len(shard.sessions) > 1:
+            oldest_id = next(iter(shard.sessions))
+            if oldest_id == keep:
+                break
+            self._drop(shard, oldest_id, "memory")
+
+    def _session(self, shard: _Shard, session_id: str, now: float) -> _Session:
+        session = shard.sessions.get(session_id)
+        if session is not None and now - session.last_used > self.idle_ttl_s:
+            self._drop(shard, session_id, "idle")
+            session = None
+        if session is None:
+            history = self._initial()
+            tokens = [self._count(message) for message in history]
+            session = _Session(history, tokens, sum(map(message_bytes, history)), now)
+            shard.sessions[session_id] = session
+            shard.size += session.size
+        else:
+            shard.sessions.move_to_end(session_id)
+        session.last_used = now
+        return session
+
+    async def get_history_tokens(self, session_id: str) -> Tuple[History, Tokens]:
+        shard = self._shard(session_id)
+        await self._acquire(shard)
+        try:
+            now = time.monotonic()
+            session = self._session(shard, session_id, now)
+            self._evict(shard, now, keep=session_id)
+            return list(session.history), list(session.tokens)
+        finally:
+            shard.lock.release()
+
+    async def append_turn(self, session_id: str, user_text: str, assistant_text: str) -> int:
+        """يضيف رسالة المستخدم ورد المساعد، يقص التاريخ، ويرجع عدد الأدوار (turns)."""
+        shard = self._shard(session_id)
+        await self._acquire(shard)
+        try:
+            now = time.monotonic()
+            session = self._session(shard, session_id, now)
+            added = [{"role": "user", "content": user_text}, {"role": "assistant", "content": assistant_text}]
+            pruned, tokens = self._prune(
+                session.history + added, session.tokens + [self._count(message) for message in added]
+            )
+            size = sum(map(message_bytes, pruned))
+            shard.size += size - session.size
+            session.history, session.tokens, session.size = pruned, tokens, size
+            self._evict(shard, now, keep=session_id)
+            return count_turns(pruned)
+        finally:
+            shard.lock.release()
+
+    async def sweep(self) -> int:
+        """يطرد الجلسات الخاملة من كل الـ shards (للتنظيف الدوري بالخلفية)."""
+        before = self.evictions["idle"]
+        for shard in self._shards:
+            await self._acquire(shard)
+            try:
+                self._evict(shard, time.monotonic(), keep="")
+            finally:
+                shard.lock.release()
+        return self.evictions["idle"] - before
+
+    def __len__(self) -> int:
+        return sum(len(shard.sessions) for shard in self._shards)
+
+    def stats(self) -> Dict[str, object]:
+        return {
+            "backend": "memory",
+            "live_sessions": len(self),
+            "bytes": sum(shard.size for shard in self._shards),
+            "shards": len(self._shards),
+            "evictions": dict(self.evictions),
+            "lock_acquisitions": self.lock_acquisitions,
+            "lock_wait_ms_total": round(self.lock_wait_s * 1000, 3),
+        }
+
+
+class SQLiteSessionStore(SessionBackend):
+    """
+    جلسات مشتركة بين عدة workers في ملف SQLite (وضع WAL).
+    - الكتابة تضيف صفّين (user/assistant) بدل إعادة كتابة التاريخ كامل.
+    - القراءة تجيب آخر read_limit رسالة فقط وتطبق prune عليها.
+    - كل thread له اتصال خاص؛ الاستدعاءات تشتغل عبر asyncio.to_thread.
+    - الجلسة الخاملة أكثر من idle_ttl_s تُعامل كجلسة جديدة حتى قبل ما يمسحها sweep.
+    - عدد الجلسات الحية يتحدث بعد كل كتابة/sweep، فـ stats ما تلمس الملف.
+    """
+
+    _SCHEMA = (
+        "CREATE TABLE IF NOT EXISTS messages ("
+        " seq INTEGER PRIMARY KEY AUTOINCREMENT,"
+        " session_id TEXT NOT NULL,"
+        " role TEXT NOT NULL,"
+        " content TEXT NOT NULL,"
+        " tokens INTEGER)",
+        "CREATE INDEX IF NOT EXISTS idx_messages_session ON messages (session_id, seq)",
+        "CREATE TABLE IF NOT EXISTS sessions ("
+        " session_id TEXT PRIMARY KEY,"
+        " last_used REAL NOT NULL)",
+    )
+
+    def __init__(
+        self,
+        path: str,
+        *,
+        initial: Callable[[], History],
+        prune: Prune,
+        count: Callable[[Message], int],
+        read_limit: int,
+        idle_ttl_s: float = 6 * 3600,
+        retain_messages: int | None = None,
+    ) -> None:
+        self.path = path
+        self._initial = initial
+        self._prune = prune
+        self._count = count
+        self.read_limit = read_limit
+        self.idle_ttl_s = idle_ttl_s
+        # نحتفظ بأكثر من نافذة القراءة قليلاً؛ الأقدم يُحذف في sweep
+        self.retain_messages = retain_messages or read_limit * 2
+        self._local = threading.local()
+        # كل الاتصالات المفتوحة (من كل الـ threads) حتى يسكرها aclose
+        self._connections: List[sqlite3.Connection] = []
+        self._stats_lock = threading.Lock()
+        self.reads = 0
+        self.writes = 0
+        self.read_s = 0.0
+        self.write_s = 0.0
+        self.evictions = 0
+        with self._connect() as conn:
+            for statement in self._SCHEMA:
+                conn.execute(statement)
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(messages)")}
+            if "tokens" not in columns:
+                # ملفات أقدم بدون عمود tokens: الصفوف القديمة تُعد عند القراءة
+                conn.execute("ALTER TABLE messages ADD COLUMN tokens INTEGER")
+            self.live_sessions = self._live(conn)
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # check_same_thread=False فقط حتى يقدر aclose يسكره؛ كل اتصال يستخدمه thread واحد
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            conn.execute("PRAGMA busy_timeout=30000")
+            self._local.conn = conn
+            with self._stats_lock:
+                self._connections.append(conn)
+        return conn
+
+    @staticmethod
+    def _live(conn: sqlite3.Connection) -> int:
+        return conn.execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+    def _recent(self, conn: sqlite3.Connection, session_id: str) -> Tuple[History, Tokens]:
+        # نفس سلوك InMemorySessionStore: الجلسة المنتهية ترجع التاريخ الابتدائي
+        rows = conn.execute(
+            "SELECT role, content, tokens FROM messages WHERE session_id = ? AND EXISTS ("
+            " SELECT 1 FROM sessions WHERE session_id = messages.session_id AND last_used >= ?)"
+            " ORDER BY seq DESC LIMIT ?",
+            (session_id, time.time() - self.idle_ttl_s, self.read_limit),
+        ).fetchall()
+        history = self._initial()
+        tokens = [self._count(message) for message in history]
+        for role, content, count in reversed(rows):
+            message = {"role": role, "content": content}
+            history.append(message)
+            tokens.append(count if count is not None else self._count(message))
+        return self._prune(history, tokens)
+
+    def _read(self, session_id: str) -> Tuple[History, Tokens]:
+        start = time.perf_counter()
+        history, tokens = self._recent(self._connect(), session_id)
+        with self._stats_lock:
+            self.reads += 1
+            self.read_s += time.perf_counter() - start
+        return history, tokens
+
+    def _append(self, session_id: str, user_text: str, assistant_text: str) -> int:
+        start = time.perf_counter()
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # جلسة منتهية ما مسحها sweep بعد: نبدأ من جديد بدل ما يرجع تاريخها القديم
+            conn.execute(
+                "DELETE FROM messages WHERE session_id IN"
+                " (SELECT session_id FROM sessions WHERE session_id = ? AND last_used < ?)",
+                (session_id, time.time() - self.idle_ttl_s),
+            )
+            conn.executemany(
+                "INSERT INTO messages (session_id, role, content, tokens) VALUES (?, ?, ?, ?)",
+                [
+                    (session_id, role, text, self._count({"role": role, "content": text}))
+                    for role, text in (("user", user_text), ("assistant", assistant_text))
+                ],
+            )
+            conn.execute(
+                "INSERT INTO sessions (session_id, last_used) VALUES (?, ?)"
+                " ON CONFLICT(session_id) DO UPDATE SET last_used = excluded.last_used",
+                (session_id, time.time()),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        turns = count_turns(self._recent(conn, session_id)[0])
+        live = self._live(conn)
+        with self._stats_lock:
+            self.live_sessions = live
+            self.writes += 1
+            self.write_s += time.perf_counter() - start
+        return turns
+
+    def _sweep(self) -> int:
+        conn = self._connect()
+        cutoff = time.time() - self.idle_ttl_s
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "DELETE FROM messages WHERE session_id IN"
+                " (SELECT session_id FROM sessions WHERE last_used < ?)",
+                (cutoff,),
+            )
+            expired = conn.execute("DELETE FROM sessions WHERE last_used < ?", (cutoff,)).rowcount
+            conn.execute(
+                "DELETE FROM messages WHERE seq IN (SELECT seq FROM ("
+                " SELECT seq, ROW_NUMBER() OVER (PARTITION BY session_id ORDER BY seq DESC) AS rn"
+                " FROM messages) WHERE rn > ?)",
+                (self.retain_messages,),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        live = self._live(conn)
+        with self._stats_lock:
+            self.live_sessions = live
+            self.evictions += expired
+        return expired
+
+    async def get_history_tokens(self, session_id: str) -> Tuple[History, Tokens]:
+        return await asyncio.to_thread(self._read, session_id)
+
+    async def append_turn(self, session_id: str, user_text: str, assistant_text: str) -> int:
+        return await asyncio.to_thread(self._append, session_id, user_text, assistant_text)
+
+    async def sweep(self) -> int:
+        return await asyncio.to_thread(self._sweep)
+
+    async def aclose(self) -> None:
+        """يسكر اتصالات كل الـ threads؛ أي استدعاء بعدها يفتح اتصال جديد."""
+        with self._stats_lock:
+            connections, self._connections = self._connections, []
+            self._local = threading.local()
+        for conn in connections:
+            conn.close()
+
+    def stats(self) -> Dict[str, object]:
+        with self._stats_lock:
+            return {
+                "backend": "sqlite",
+                "path": self.path,
+                "live_sessions": self.live_sessions,
+                "evictions": self.evictions,
+                "reads": self.reads,
+                "writes": self.writes,
+                "read_ms_avg": round(self.read_s * 1000 / self.reads, 3) if self.reads else 0.0,
+                "write_ms_avg": round(self.write_s * 1000 / self.writes, 3) if self.writes else 0.0,
+            }
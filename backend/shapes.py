@@ -0,0 +1,90 @@
+"""Rasterisation of ``BODY_MAP`` muscle shapes into pixel masks.
+
+Every item keeps a ``box_norm`` bounding box (used by the UI, the fallback and
+the geometric engine). ``shape`` selects what fills it:
+
+- ``"box"``: the whole box.
+- ``"polygon"``: the ``polygon_norm`` vertices ``[[x, y], ...]`` in normalised
+  image coordinates. Pixels whose centre is inside the polygon are filled
+  (even-odd rule), clipped to the box.
+- ``"mask"``: a pre-drawn 2-D ``.npy`` array at ``mask`` (relative to
+  ``backend/``), stretched over the box with nearest-neighbour sampling.
+  Non-zero cells are inside.
+
+Each shape is filled with NumPy over its box only, with no per-pixel Python
+loop. ``label_maps`` calls this once per side, and the resulting label map is
+cached as a hashed artifact.
+"""
+
+from __future__ import annotations
+
+from functools import lru_cache
+from pathlib import Path
+from typing import Iterable, List, Sequence, Tuple
+
+import numpy as np
+
+from .geometry import Rect, box_pixels
+from .muscle_data import MuscleMeta
+
+MASK_ROOT = Path(__file__).resolve().parent
+SHAPES = ("box", "polygon", "mask")
+
+
+def polygon_mask(points: Sequence[Sequence[float]], rect: Rect, width: int, height: int) -> np.ndarray:
+    """قناع المضلّع داخل rect: بكسل داخل لو مركزه داخل المضلّع (قاعدة even-odd)."""
+    if len(points) < 3:
+        raise ValueError(f"A polygon needs at least 3 vertices, got {len(points)}")
+    x1, y1, x2, y2 = rect
+    vertices = np.asarray(points, dtype=np.float64) * (width, height)
+    ys = np.arange(y1, y2)[:, None] + 0.5
+    xs = np.arange(x1, x2)[None, :] + 0.5
+    inside = np.zeros((y2 - y1, x2 - x1), dtype=bool)
+    # حلقة على الأضلاع فقط (عشرات)، وكل ضلع يُقارن مع كل بكسلات المستطيل مرة وحدة
+    for (xa, ya), (xb, yb) in zip(vertices, np.roll(vertices, -1, axis=0)):
+        if ya == yb:
+            continue
+        crosses = (ya > ys) != (yb > ys)
+        x_cross = xa + (ys - ya) * (xb - xa) / (yb - ya)
+        inside ^= crosses & (xs < x_cross)
+    return inside
+
+
+@lru_cache(maxsize=None)
+def load_mask(path: str) -> np.ndarray:
+    """يقرأ قناع مرسوم مسبقاً (.npy ثنائي الأبعاد) مرة وحدة لكل مسار."""
+    mask = np.load(MASK_ROOT / path)
+    if mask.ndim != 2 or mask.size == 0:
+        raise ValueError(f"Muscle mask {path} must be a non-empty 2-D array, got shape {mask.shape}")
+    return mask
+
+
+def resample_mask(mask: np.ndarray, rect: Rect) -> np.ndarray:
+    """يمدّ القناع على rect بأقرب جار (nearest neighbour)؛ الخلايا غير الصفرية داخل."""
+    x1, y1, x2, y2 = rect
+    rows = ((np.arange(y2 - y1) + 0.5) * mask.shape[0] / (y2 - y1)).astype(np.int64)
+    cols = ((np.arange(x2 - x1) + 0.5) * mask.shape[1] / (x2 - x1)).astype(np.int64)
+    return mask[rows[:, None], cols[None, :]] != 0
+
+
+def item_pixels(item: MuscleMeta, width: int, height: int) -> Tuple[Rect, np.ndarray | None] | None:
+    """
+    مستطيل العنصر بالبكسل + قناع الشكل داخله (None = المستطيل كامل، أسرع مسار)،
+    أو None لو المستطيل فاضي.
+    """
+    rect = box_pixels(item["box_norm"], width, height)
+    if rect is None:
+        return None
+    shape = item["shape"]
+    if shape == "box":
+        return rect, None
+    if shape == "polygon":
+        return rect, polygon_mask(item["polygon_norm"], rect, width, height)
+    if shape == "mask":
+        return rect, resample_mask(load_mask(item["mask"]), rect)
+    raise ValueError(f"Unknown shape {shape!r} for muscle {item['id']}")
+
+
+def mask_files(items: Iterable[MuscleMeta]) -> List[str]:
+    """مسارات أقنعة العناصر (مرتبة) حتى يدخل محتواها في hash الـ artifacts."""
+    return sorted({item["mask"] for item in items if item["shape"] == "mask"})
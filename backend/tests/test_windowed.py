@@ -0,0 +1,57 @@
+"""Windowed dense ``top_muscles_circle`` must match the full-frame scan exactly."""
+
+from __future__ import annotations
+
+import numpy as np
+import pytest
+
+from backend.logic import LABEL_HEIGHT, LABEL_WIDTH, _build_label_map, top_muscles_circle
+
+SIDES = ("front", "back")
+SHORT = min(LABEL_WIDTH, LABEL_HEIGHT)
+
+
+def _both(side: str, cx: float, cy: float, radius: float, min_pixels: int = 3):
+    label_map = _build_label_map(side)
+    kwargs = dict(k=50, min_pixels=min_pixels, sparse=False)
+    windowed = top_muscles_circle(label_map, cx, cy, radius, windowed=True, **kwargs)
+    full = top_muscles_circle(label_map, cx, cy, radius, windowed=False, **kwargs)
+    return windowed, full
+
+
+# دوائر تقصّها حواف الصورة: المركز على الحافة/الزاوية أو خارجها بقليل
+EDGE_CENTRES = [
+    (0.0, 0.0), (1.0, 0.0), (0.0, 1.0), (1.0, 1.0),
+    (0.5, 0.0), (0.5, 1.0), (0.0, 0.5), (1.0, 0.5),
+    (-0.02, 0.4), (1.02, 0.6), (0.3, -0.01), (0.7, 1.01),
+]
+
+
+@pytest.mark.parametrize("side", SIDES)
+@pytest.mark.parametrize("centre", EDGE_CENTRES)
+@pytest.mark.parametrize("radius", [0.01, 0.08, 0.25])
+def test_edge_clipped_circles(side: str, centre: tuple, radius: float) -> None:
+    cx, cy = centre
+    windowed, full = _both(side, cx * LABEL_WIDTH, cy * LABEL_HEIGHT, radius * SHORT)
+    assert windowed == full
+
+
+@pytest.mark.parametrize("side", SIDES)
+@pytest.mark.parametrize("radius", [0.0, 1e-6, 0.25, 0.5, 0.99, 1.0, 1.5, 2.0])
+@pytest.mark.parametrize("offset", [0.0, 0.5])
+def test_radius_near_zero(side: str, radius: float, offset: float) -> None:
+    # نصف القطر بالبكسل؛ المركز على بكسل كامل أو بين بكسلين
+    cx, cy = 0.5 * LABEL_WIDTH + offset, 0.45 * LABEL_HEIGHT + offset
+    windowed, full = _both(side, cx, cy, radius, min_pixels=1)
+    assert windowed == full
+
+
+@pytest.mark.parametrize("side", SIDES)
+@pytest.mark.parametrize("radius", [0.5, 0.75, 1.0, 2.0])
+def test_circle_covering_the_map(side: str, radius: float) -> None:
+    cx, cy = 0.5 * LABEL_WIDTH, 0.5 * LABEL_HEIGHT
+    windowed, full = _both(side, cx, cy, radius * max(LABEL_WIDTH, LABEL_HEIGHT))
+    assert windowed == full
+    if radius >= 1.0:
+        # الدائرة تغطي الخريطة كاملة: كل عضلة مرسومة تظهر
+        assert len(full) == np.count_nonzero(np.unique(_build_label_map(side)))
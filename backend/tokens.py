@@ -0,0 +1,63 @@
+"""Prompt token counting for history budgeting (tiktoken when installed, heuristic otherwise)."""
+
+from __future__ import annotations
+
+import math
+from functools import lru_cache
+from typing import Callable, Dict, Optional
+
+from .config import OPENAI_MODEL
+
+# تكلفة تنسيق رسالة chat (role + فواصل) فوق نص المحتوى
+MESSAGE_OVERHEAD_TOKENS = 4
+
+_encode: Optional[Callable[[str], list]] = None
+_backend: Optional[str] = None
+
+
+def _load_encoder() -> None:
+    """
+    يحمّل tiktoken أول مرة نحتاجه (أو في warm-up) بدل وقت الاستيراد: تحميل الـ BPE
+    يأخذ وقت وقد يحتاج تنزيل الملف أول مرة.
+    """
+    global _encode, _backend
+    _backend = "heuristic"
+    try:  # tiktoken اختياري؛ بدونه نستخدم تقدير حسب نوع الحروف
+        import tiktoken
+
+        try:
+            encoding = tiktoken.encoding_for_model(OPENAI_MODEL)
+        except KeyError:
+            encoding = tiktoken.get_encoding("o200k_base")
+        _encode = encoding.encode
+        _backend = f"tiktoken:{encoding.name}"
+    except Exception:  # pragma: no cover - غير مثبت، أو فشل تحميل/تنزيل ملف الـ BPE
+        _encode = None
+        _backend = "heuristic"
+
+
+def _heuristic_tokens(text: str) -> int:
+    # الإنجليزي تقريباً 4 حروف للتوكن، والعربي أثقل (حوالي 2.5 حرف للتوكن)
+    ascii_chars = len(text.encode("ascii", "ignore"))
+    other_chars = len(text) - ascii_chars
+    return math.ceil(ascii_chars / 4 + other_chars / 2.5)
+
+
+@lru_cache(maxsize=256)
+def count_tokens(text: str) -> int:
+    """عدد توكنات النص (مع كاش للنصوص المتكررة مثل system prompt)."""
+    if _backend is None:
+        _load_encoder()
+    if _encode is not None:
+        return len(_encode(text))
+    return _heuristic_tokens(text)
+
+
+def message_tokens(message: Dict[str, str]) -> int:
+    return count_tokens(message["content"]) + MESSAGE_OVERHEAD_TOKENS
+
+
+def backend() -> str:
+    if _backend is None:
+        _load_encoder()
+    return _backend or "heuristic"
@@ -0,0 +1,140 @@
+"""Bounded worker pool that keeps CPU-bound analysis off the asyncio event loop."""
+
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import threading
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, TypeVar
+
+from .metrics import observe_stage
+from .profiling import bind_worker_thread
+
+T = TypeVar("T")
+
+
+def _timed_call(fn: Callable[..., T], submitted: float) -> T:
+    # يشتغل داخل الـ worker thread بنسخة من context الطلب، فالمراحل توصل لـ Server-Timing
+    # والـ profiler (لو الطلب مُراقب) يعرف أي thread يأخذ منه العينات
+    observe_stage("queue_wait", time.perf_counter() - submitted)
+    with bind_worker_thread():
+        return fn()
+
+
+def _noop() -> None:
+    return None
+
+
+class QueueFullError(RuntimeError):
+    """All workers are busy and the waiting queue is full."""
+
+
+class AnalysisPool:
+    """
+    يشغّل الدوال الثقيلة (NumPy) على thread pool أو process pool بدل event loop.
+
+    - kind: "thread" أو "process"، أو "inline" للتشغيل مباشرة على الـ loop (السلوك القديم).
+    - السعة = workers + queue_size؛ لو امتلأت نرفع QueueFullError فوراً بدل الانتظار.
+    - timeout_s: مهلة الطلب الواحد؛ المهمة اللي ما بدأت تُلغى، واللي بدأت تكمل بالخلفية
+      وتبقى محسوبة من السعة لين تخلص فعلاً.
+    """
+
+    def __init__(self, kind: str, workers: int, queue_size: int, timeout_s: float) -> None:
+        if kind not in {"thread", "process", "inline"}:
+            raise ValueError(f"Unknown analysis executor: {kind!r}")
+        self.kind = kind
+        self.workers = max(workers, 1)
+        self.capacity = self.workers + max(queue_size, 0)
+        self.timeout_s = timeout_s
+        self._executor: Optional[Executor] = None
+        self._initializer: Optional[Callable[[], Any]] = None
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.completed = 0
+        self.rejected = 0
+        self.timeouts = 0
+
+    def _get_executor(self) -> Executor:
+        with self._lock:
+            if self._executor is None:
+                if self.kind == "process":
+                    self._executor = ProcessPoolExecutor(
+                        max_workers=self.workers, initializer=self._initializer
+                    )
+                else:
+                    self._executor = ThreadPoolExecutor(
+                        max_workers=self.workers, thread_name_prefix="analysis"
+                    )
+            return self._executor
+
+    def _release(self, _future: Any) -> None:
+        with self._lock:
+            self._pending -= 1
+            self.completed += 1
+
+    async def run(self, fn: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+        if self.kind == "inline":
+            return fn(*args, **kwargs)
+
+        executor = self._get_executor()
+        with self._lock:
+            if self._pending >= self.capacity:
+                self.rejected += 1
+                raise QueueFullError("analysis queue is full")
+            self._pending += 1
+        call = functools.partial(fn, *args, **kwargs)
+        try:
+            if self.kind == "thread":
+                context = contextvars.copy_context()
+                future = executor.submit(context.run, _timed_call, call, time.perf_counter())
+            else:
+                future = executor.submit(call)
+        except BaseException:
+            with self._lock:
+                self._pending -= 1
+            raise
+        future.add_done_callback(self._release)
+
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), self.timeout_s)
+        except asyncio.TimeoutError:
+            with self._lock:
+                self.timeouts += 1
+            raise
+
+    def warm_up(self, fn: Callable[[], Any]) -> None:
+        """
+        يشغّل fn في الـ process الحالي. لـ process pool تصير fn الـ initializer، فكل
+        worker يشغّلها قبل أول مهمة (حتى اللي يبدأ بعدين بدل worker مات)، ونشغّل
+        مهمة فاضية لكل worker وننتظرها حتى تكون جاهزة قبل أول طلب. thread pool يشارك
+        نفس الذاكرة، فيكفي تشغيلها هنا.
+        """
+        fn()
+        if self.kind == "process":
+            with self._lock:
+                if self._executor is None:
+                    self._initializer = fn
+            executor = self._get_executor()
+            for future in [executor.submit(_noop) for _ in range(self.workers)]:
+                future.result()
+
+    def shutdown(self) -> None:
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "kind": self.kind,
+                "workers": self.workers,
+                "capacity": self.capacity,
+                "pending": self._pending,
+                "completed": self.completed,
+                "rejected": self.rejected,
+                "timeouts": self.timeouts,
+            }
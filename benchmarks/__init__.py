@@ -0,0 +1,4 @@
+"""Benchmarks and equivalence harnesses for the Armonia backend.
+
+Run the scripts from the repository root, e.g. ``python -m benchmarks.check_windowed``.
+"""
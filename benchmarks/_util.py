@@ -0,0 +1,67 @@
+"""Shared helpers for the benchmark scripts."""
+
+from __future__ import annotations
+
+import contextlib
+import threading
+import time
+from typing import Any, Callable, Dict, Iterator, List, Tuple
+
+SIDES = ("front", "back")
+
+# شبكة مراكز وأنصاف أقطار مطبّعة (0..1) تغطي الجسم كاملاً والحواف
+CENTRES = [i / 10 for i in range(0, 11)]
+RADII = [0.01, 0.03, 0.08, 0.14, 0.25, 0.5]
+
+
+def grid() -> Iterator[Tuple[str, float, float, float]]:
+    """يمرّ على كل (side, cx, cy, radius) في الشبكة."""
+    for side in SIDES:
+        for cx in CENTRES:
+            for cy in CENTRES:
+                for radius in RADII:
+                    yield side, cx, cy, radius
+
+
+def percentile(samples: List[float], pct: float) -> float:
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(int(round(pct / 100 * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def time_call(fn: Callable[[], object], repeat: int = 20) -> Dict[str, float]:
+    """يقيس زمن الاستدعاء بالمللي ثانية ويرجع p50/p95/mean."""
+    samples: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return {
+        "p50_ms": percentile(samples, 50),
+        "p95_ms": percentile(samples, 95),
+        "mean_ms": sum(samples) / len(samples),
+    }
+
+
+@contextlib.contextmanager
+def serve_app(app: Any) -> Iterator[str]:
+    """
+    يشغّل التطبيق على uvicorn حقيقي في thread جانبي ويرجع base_url.
+    ASGITransport في httpx يجمع الرد كامل قبل ما يرجعه، فما يصلح لقياس البث.
+    """
+    import uvicorn
+
+    config = uvicorn.Config(app, host="127.0.0.1", port=0, log_level="warning", lifespan="on")
+    server = uvicorn.Server(config)
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    port = server.servers[0].sockets[0].getsockname()[1]
+    try:
+        yield f"http://127.0.0.1:{port}"
+    finally:
+        server.should_exit = True
+        thread.join(timeout=5)
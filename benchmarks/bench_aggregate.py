@@ -0,0 +1,104 @@
+"""Micro-benchmark: single-pass bincount aggregation vs the per-muscle mask loop.
+
+Both variants run on the same circle window; the loop is the previous
+implementation of ``top_muscles_circle`` kept here as the reference. Circles
+grow around the chest so more muscles fall inside as the radius increases.
+"""
+
+from __future__ import annotations
+
+import math
+import sys
+from typing import List
+
+import numpy as np
+
+from backend.logic import (
+    LABEL_HEIGHT,
+    LABEL_WIDTH,
+    TopResult,
+    _build_label_map,
+    _build_label_runs,
+    aggregate_labels,
+    circle_window,
+    gaussian_sigma,
+    top_muscles_circle,
+)
+
+from ._util import SIDES, time_call
+
+
+def loop_top_muscles(label_map, cx, cy, radius, *, sigma_scale=0.25, k=5, min_pixels=3) -> List[TopResult]:
+    rows, cols = circle_window(*label_map.shape, cx, cy, radius)
+    labels = label_map[rows, cols]
+    yy, xx = np.ogrid[rows, cols]
+    mask = (xx - cx) ** 2 + (yy - cy) ** 2 <= radius ** 2
+    sigma = gaussian_sigma(radius, sigma_scale)
+    weights = np.exp(-((xx - cx) ** 2 + (yy - cy) ** 2) / (2 * sigma**2))
+    pixels = labels[mask]
+    results: List[TopResult] = []
+    for muscle_id in np.unique(pixels[pixels > 0]):
+        region_mask = (labels == muscle_id) & mask
+        pix_count = int(region_mask.sum())
+        if pix_count < min_pixels:
+            continue
+        weight = float(weights[region_mask].sum())
+        if weight > 0:
+            results.append(TopResult(muscle_id=int(muscle_id), weight=weight, pixels=pix_count))
+    results.sort(key=lambda item: item.weight, reverse=True)
+    return results[:k]
+
+
+def _window_arrays(label_map, cx, cy, radius):
+    rows, cols = circle_window(*label_map.shape, cx, cy, radius)
+    yy, xx = np.ogrid[rows, cols]
+    mask = (xx - cx) ** 2 + (yy - cy) ** 2 <= radius ** 2
+    weights = np.exp(-((xx - cx) ** 2 + (yy - cy) ** 2) / (2 * gaussian_sigma(radius, 0.25) ** 2))
+    return label_map[rows, cols], mask, weights
+
+
+def _loop_aggregate(labels, mask, weights) -> None:
+    pixels = labels[mask]
+    for muscle_id in np.unique(pixels[pixels > 0]):
+        region_mask = (labels == muscle_id) & mask
+        int(region_mask.sum())
+        float(weights[region_mask].sum())
+
+
+def _bincount_aggregate(labels, mask, weights) -> None:
+    pixels = labels[mask]
+    valid = pixels > 0
+    aggregate_labels(pixels[valid], weights[mask][valid])
+
+
+def main() -> int:
+    failures = 0
+    for side in SIDES:
+        label_map, runs = _build_label_map(side), _build_label_runs(side)
+        for radius_norm in (0.02, 0.05, 0.1, 0.15, 0.2, 0.3, 0.4, 0.5):
+            cx, cy = 0.5 * LABEL_WIDTH, 0.4 * LABEL_HEIGHT
+            radius = radius_norm * min(LABEL_WIDTH, LABEL_HEIGHT)
+            fast = top_muscles_circle(label_map, cx, cy, radius, k=100)
+            slow = loop_top_muscles(label_map, cx, cy, radius, k=100)
+            same = [r.muscle_id for r in fast] == [r.muscle_id for r in slow] and all(
+                a.pixels == b.pixels and math.isclose(a.weight, b.weight, rel_tol=1e-9)
+                for a, b in zip(fast, slow)
+            )
+            failures += not same
+            arrays = _window_arrays(label_map, cx, cy, radius)
+            agg_loop = time_call(lambda: _loop_aggregate(*arrays))
+            agg_fast = time_call(lambda: _bincount_aggregate(*arrays))
+            t_loop = time_call(lambda: loop_top_muscles(label_map, cx, cy, radius))
+            t_fast = time_call(lambda: top_muscles_circle(label_map, cx, cy, radius, runs=runs))
+            print(
+                f"{side:5s} r={radius_norm:<4} muscles={len(fast):2d} | aggregation "
+                f"loop={agg_loop['p50_ms']:7.3f}ms bincount={agg_fast['p50_ms']:7.3f}ms "
+                f"x{agg_loop['p50_ms'] / max(agg_fast['p50_ms'], 1e-9):5.1f} | end-to-end "
+                f"loop={t_loop['p50_ms']:7.3f}ms bincount={t_fast['p50_ms']:7.3f}ms"
+                f"{'' if same else '  MISMATCH'}"
+            )
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if main() else 0)
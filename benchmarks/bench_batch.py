@@ -0,0 +1,60 @@
+"""Throughput of ``POST /api/analyze/batch`` vs repeated ``POST /api/analyze``.
+
+Random circles (mixed sides and radii) are scored once through the batch
+endpoint and once with one request per circle. The analyze cache is disabled
+so both sides do the full computation. Results must match item by item.
+"""
+
+from __future__ import annotations
+
+import random
+import sys
+import time
+
+from fastapi.testclient import TestClient
+
+from backend import logic
+from backend.main import app
+
+SIZES = (1, 10, 100, 1000)
+
+
+def _payload(rng: random.Random, n: int) -> list[dict]:
+    return [
+        {
+            "side": rng.choice(["front", "back"]),
+            "circle": {"cx": rng.random(), "cy": rng.random(), "radius": rng.uniform(0.02, 0.2)},
+        }
+        for _ in range(n)
+    ]
+
+
+def main() -> int:
+    logic.ANALYZE_CACHE.max_entries = 0
+    client = TestClient(app)
+    rng = random.Random(42)
+    mismatches = 0
+    for n in SIZES:
+        items = _payload(rng, n)
+
+        start = time.perf_counter()
+        singles = [client.post("/api/analyze", json=item).json() for item in items]
+        single_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        batch = client.post("/api/analyze/batch", json=items).json()
+        batch_s = time.perf_counter() - start
+
+        mismatches += sum(
+            1 for one, many in zip(singles, batch) if one["results"] != many["results"] or many["error"]
+        )
+        print(
+            f"n={n:5d} single={n / single_s:8.1f} circles/s ({single_s * 1000:8.1f}ms) "
+            f"batch={n / batch_s:8.1f} circles/s ({batch_s * 1000:8.1f}ms) x{single_s / batch_s:.1f}"
+        )
+    print(f"{mismatches} mismatches")
+    return mismatches
+
+
+if __name__ == "__main__":
+    sys.exit(1 if main() else 0)
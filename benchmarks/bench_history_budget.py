@@ -0,0 +1,99 @@
+"""Prompt tokens and pruning cost of the chat history budget on long sessions.
+
+Long Arabic sessions are stored through the real session store, then
+``_prepare_chat`` builds the upstream prompt with the token budget off, on,
+and on with summaries. Pruning cost compares the cached per-message counts
+against recounting every message on each request. Exits non-zero if a
+budgeted prompt exceeds the budget or loses the system/context messages.
+The budget is opt-in, so ``BUDGET`` is used when ``CHAT_HISTORY_TOKEN_BUDGET``
+is 0.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import sys
+import time
+
+from backend import main as chat
+from backend.main import ChatContext, ChatRequest, Muscle
+from backend.tokens import backend as token_backend
+from backend.tokens import count_tokens, message_tokens
+
+TURNS = (5, 20, 60)
+REPEAT = 200
+BUDGET = 1500
+
+_WORDS = "العضلة الكتف الرقبة تمرين إطالة ألم خفيف الظهر الإحماء تكرار ثواني ببطء تنفس المرونة".split()
+
+
+def _text(rng: random.Random, words: int) -> str:
+    return " ".join(rng.choice(_WORDS) for _ in range(words))
+
+
+def _request(session_id: str, rng: random.Random) -> ChatRequest:
+    muscle = Muscle(muscle_ar="شبه المنحرفة", muscle_en="Trapezius", region="Back", prob=0.6)
+    return ChatRequest(
+        session_id=session_id,
+        user_message=_text(rng, 30),
+        context=ChatContext(muscles=[muscle]),
+    )
+
+
+def _prompt_tokens(messages) -> int:
+    return sum(message_tokens(msg) for msg in messages)
+
+
+async def _run() -> int:
+    rng = random.Random(11)
+    failures = 0
+    budget_limit = chat.CHAT_HISTORY_TOKEN_BUDGET or BUDGET
+    print(f"token counter: {token_backend()}, budget={budget_limit}")
+    for turns in TURNS:
+        session_id = f"bench-{turns}"
+        for _ in range(turns):
+            user_text, reply = _text(rng, rng.randint(40, 160)), _text(rng, rng.randint(150, 400))
+            await chat._update_session(session_id, user_text, reply)
+        payload = _request(session_id, rng)
+
+        row = []
+        modes = (("window", 0, False), ("budget", budget_limit, False), ("summary", budget_limit, True))
+        for label, budget, summary in modes:
+            chat.CHAT_HISTORY_TOKEN_BUDGET, chat.CHAT_HISTORY_SUMMARY = budget, summary
+            _, messages, _, _ = await chat._prepare_chat(payload)
+            tokens = _prompt_tokens(messages)
+            row.append(f"{label}={tokens:6d} tok/{len(messages):2d} msgs")
+            if budget and tokens > budget and len(messages) > 3:
+                failures += 1
+            if messages[0]["content"] != chat.SYSTEM_PROMPT or messages[-1]["content"] != payload.user_message:
+                failures += 1
+            if messages[-2]["content"] != chat._build_context_message(payload.context)["content"]:
+                failures += 1
+
+        history, cached = await chat._get_history(session_id)
+        start = time.perf_counter()
+        for _ in range(REPEAT):
+            chat._fit_token_budget(history, cached, 100)
+        cached_us = (time.perf_counter() - start) / REPEAT * 1e6
+        start = time.perf_counter()
+        for _ in range(REPEAT):
+            count_tokens.cache_clear()
+            chat._fit_token_budget(history, [message_tokens(msg) for msg in history], 100)
+        recount_us = (time.perf_counter() - start) / REPEAT * 1e6
+        row.append(f"prune cached={cached_us:6.1f}us recount={recount_us:6.1f}us")
+        print(f"turns={turns:3d} " + "  ".join(row))
+    print(f"{failures} failures")
+    return failures
+
+
+def main() -> int:
+    budget = chat.CHAT_HISTORY_TOKEN_BUDGET
+    try:
+        return asyncio.run(_run())
+    finally:
+        chat.CHAT_HISTORY_TOKEN_BUDGET, chat.CHAT_HISTORY_SUMMARY = budget, False
+
+
+if __name__ == "__main__":
+    sys.exit(1 if main() else 0)
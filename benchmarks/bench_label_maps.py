@@ -0,0 +1,129 @@
+"""Memory-mapped label-map artifacts: size, load time, sharing and staleness.
+
+- Artifacts hold the same labels as the old ``int32`` build, in ``uint8``.
+- Opening the mmap is compared with rasterising in memory.
+- ``PROCESSES`` fresh interpreters each load both maps and read every pixel.
+  Their private memory growth (``Private_Dirty`` plus ``Private_Clean`` from
+  ``/proc/self/smaps_rollup``) is reported for three modes: the old ``int32``
+  build, the in-memory ``uint8`` build and the shared mmap.
+- Editing ``muscle_data.py`` (a temp copy with an extra comment) changes the
+  content hash. The old artifact then counts as stale, is rebuilt and removed.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+
+from backend import label_maps
+from backend.logic import LABEL_HEIGHT, LABEL_WIDTH
+
+from ._util import SIDES
+
+PROCESSES = 4
+
+CHILD = r"""
+import json, sys
+import numpy as np
+
+def private_kb():
+    fields = {}
+    with open("/proc/self/smaps_rollup") as handle:
+        for line in handle:
+            parts = line.split()
+            if len(parts) >= 2 and parts[1].isdigit():
+                fields[parts[0].rstrip(":")] = int(parts[1])
+    return fields.get("Private_Dirty", 0) + fields.get("Private_Clean", 0)
+
+mode = sys.argv[1]
+from backend import label_maps, logic
+before = private_kb()
+maps = []
+for side in ("front", "back"):
+    if mode == "int32":
+        maps.append(label_maps.rasterise(side, logic.LABEL_WIDTH, logic.LABEL_HEIGHT).astype(np.int32))
+    else:
+        maps.append(logic._build_label_map(side))
+checksum = int(sum(int(m.sum()) for m in maps))
+print(json.dumps({"private_kb": private_kb() - before, "checksum": checksum}))
+"""
+
+
+def _child(mode: str) -> Dict[str, int]:
+    env = dict(os.environ, LABEL_MAP_ARTIFACTS="0" if mode != "mmap" else "1")
+    proc = subprocess.run([sys.executable, "-c", CHILD, mode], env=env, capture_output=True, text=True, check=True)
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def _time_ms(fn, repeat: int = 20) -> float:
+    samples: List[float] = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return statistics.median(samples)
+
+
+def main() -> int:
+    failures = 0
+    label_maps.main([])  # يكتب الـ artifacts الحالية في LABEL_MAP_DIR
+    for side in SIDES:
+        legacy = label_maps.rasterise(side, LABEL_WIDTH, LABEL_HEIGHT).astype(np.int32)
+        mapped = label_maps.load(side, LABEL_WIDTH, LABEL_HEIGHT)
+        assert mapped is not None
+        equal = np.array_equal(legacy, mapped)
+        failures += not equal
+        build_ms = _time_ms(lambda: label_maps.rasterise(side, LABEL_WIDTH, LABEL_HEIGHT))
+        open_ms = _time_ms(lambda: label_maps.load(side, LABEL_WIDTH, LABEL_HEIGHT))
+        print(
+            f"{side:6s} int32={legacy.nbytes / 1024:6.0f} KB artifact={mapped.nbytes / 1024:5.0f} KB ({mapped.dtype}) "
+            f"equal={equal}  rasterise={build_ms:.3f}ms mmap open={open_ms:.3f}ms"
+        )
+
+    results: Dict[str, List[Dict[str, int]]] = {}
+    for mode in ("int32", "memory", "mmap"):
+        results[mode] = [_child(mode) for _ in range(PROCESSES)]
+        private = statistics.median(item["private_kb"] for item in results[mode])
+        print(f"{mode:6s} x{PROCESSES} processes: private memory per process for both maps ~{private:6.0f} KB")
+    checksums = {item["checksum"] for runs in results.values() for item in runs}
+    failures += len(checksums) != 1
+    mmap_private = statistics.median(item["private_kb"] for item in results["mmap"])
+    int32_private = statistics.median(item["private_kb"] for item in results["int32"])
+    if mmap_private > int32_private / 4:
+        print(f"FAIL mmap private memory {mmap_private} KB is not well below int32 {int32_private} KB")
+        failures += 1
+
+    with tempfile.TemporaryDirectory() as tmp:
+        directory = Path(tmp)
+        original = label_maps._SOURCE
+        try:
+            old = label_maps.save("front", LABEL_WIDTH, LABEL_HEIGHT, directory)
+            edited = directory / "muscle_data.py"
+            edited.write_text(original.read_text(encoding="utf-8") + "\n# edited\n", encoding="utf-8")
+            label_maps._SOURCE = edited
+            label_maps.source_digest.cache_clear()
+            stale = label_maps.load("front", LABEL_WIDTH, LABEL_HEIGHT, directory) is None
+            rebuilt = label_maps.load_or_build("front", LABEL_WIDTH, LABEL_HEIGHT, directory)
+            new = label_maps.artifact_path("front", LABEL_WIDTH, LABEL_HEIGHT, directory)
+            ok = stale and isinstance(rebuilt, np.memmap) and new.exists() and not old.exists() and new != old
+        finally:
+            label_maps._SOURCE = original
+            label_maps.source_digest.cache_clear()
+        failures += not ok
+        print(f"staleness: edited muscle_data.py -> old artifact ignored, rebuilt as {new.name}, old removed: {ok}")
+
+    print(f"{failures} failures")
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if main() else 0)
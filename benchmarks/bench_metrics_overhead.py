@@ -0,0 +1,101 @@
+"""Overhead of the stage timers, Server-Timing header and histograms.
+
+Measures the per-call cost of ``metrics.stage`` (disabled, enabled outside a
+request, enabled inside one), then ``/api/analyze`` (cache off, so every stage
+runs) and ``/api/chat`` (offline fallback) with metrics on and off in
+interleaved rounds. Also checks that responses carry ``Server-Timing`` only
+when enabled and that ``/metrics`` serves Prometheus text.
+"""
+
+from __future__ import annotations
+
+import random
+import sys
+import time
+
+from fastapi.testclient import TestClient
+
+from backend import logic, metrics
+from backend.main import app
+
+from ._util import percentile
+
+ROUNDS = 5
+REQUESTS = 100
+STAGE_CALLS = 200_000
+
+
+def _stage_cost_ns(active: bool) -> float:
+    token = metrics._CURRENT.set(metrics.RequestTimings() if active else None)
+    try:
+        start = time.perf_counter()
+        for _ in range(STAGE_CALLS):
+            with metrics.stage("bench"):
+                pass
+        return (time.perf_counter() - start) / STAGE_CALLS * 1e9
+    finally:
+        metrics._CURRENT.reset(token)
+
+
+def _latencies(client: TestClient, rng: random.Random) -> dict[str, list[float]]:
+    out: dict[str, list[float]] = {"analyze": [], "chat": []}
+    for _ in range(REQUESTS):
+        body = {
+            "side": rng.choice(["front", "back"]),
+            "circle": {"cx": rng.random(), "cy": rng.random(), "radius": rng.uniform(0.02, 0.2)},
+        }
+        start = time.perf_counter()
+        client.post("/api/analyze", json=body)
+        out["analyze"].append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        client.post("/api/chat", json={"user_message": "كيف أمدد كتفي؟"})
+        out["chat"].append((time.perf_counter() - start) * 1000)
+    return out
+
+
+def main() -> int:
+    failures = 0
+    metrics.set_enabled(False)
+    off_ns = _stage_cost_ns(False)
+    metrics.set_enabled(True)
+    print(
+        f"stage(): disabled={off_ns:.0f}ns enabled={_stage_cost_ns(False):.0f}ns "
+        f"in-request={_stage_cost_ns(True):.0f}ns"
+    )
+
+    logic.ANALYZE_CACHE.max_entries = 0
+    client = TestClient(app)
+    rng = random.Random(5)
+    samples: dict[bool, dict[str, list[float]]] = {True: {"analyze": [], "chat": []}, False: {"analyze": [], "chat": []}}
+    for _ in range(ROUNDS):
+        for enabled in (False, True):
+            metrics.set_enabled(enabled)
+            for route, values in _latencies(client, rng).items():
+                samples[enabled][route].extend(values)
+
+    for route in ("analyze", "chat"):
+        off, on = samples[False][route], samples[True][route]
+        p50_off, p50_on = percentile(off, 50), percentile(on, 50)
+        print(
+            f"{route:8s} p50 off={p50_off:6.3f}ms on={p50_on:6.3f}ms (+{p50_on - p50_off:6.3f}ms)  "
+            f"p95 off={percentile(off, 95):6.3f}ms on={percentile(on, 95):6.3f}ms"
+        )
+
+    metrics.set_enabled(False)
+    if "server-timing" in client.post("/api/chat", json={"user_message": "hi"}).headers:
+        failures += 1
+    metrics.set_enabled(True)
+    resp = client.post("/api/analyze", json={"side": "front", "circle": {"cx": 0.5, "cy": 0.4, "radius": 0.1}})
+    header = resp.headers.get("server-timing", "")
+    if "mask;dur=" not in header or "total;dur=" not in header:
+        failures += 1
+    text = client.get("/metrics").text
+    if 'armonia_stage_seconds_count{stage="mask"}' not in text:
+        failures += 1
+    print(f"Server-Timing: {header}")
+    print(f"{failures} failures")
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if main() else 0)
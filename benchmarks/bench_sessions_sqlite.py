@@ -0,0 +1,103 @@
+"""Shared SQLite session store under several worker processes.
+
+Each process opens its own ``SQLiteSessionStore`` on the same WAL file (as
+separate uvicorn workers would) and runs read-then-append chat turns for a
+fixed time. Reports aggregate writes/sec and read latency percentiles, then
+checks that a session written by one process is visible from another.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import multiprocessing as mp
+import os
+import sys
+import tempfile
+import time
+
+from backend.main import MAX_HISTORY_MESSAGES, _initial_history, _prune_history
+from backend.sessions import SQLiteSessionStore
+from backend.tokens import message_tokens
+
+from ._util import percentile
+
+PROCESSES = (1, 2, 4)
+DURATION_S = 3.0
+SESSIONS_PER_WORKER = 50
+
+
+def _store(path: str) -> SQLiteSessionStore:
+    return SQLiteSessionStore(
+        path,
+        initial=_initial_history,
+        prune=_prune_history,
+        count=message_tokens,
+        read_limit=MAX_HISTORY_MESSAGES,
+    )
+
+
+def _worker(path: str, worker: int, deadline: float, out: "mp.Queue") -> None:
+    store = _store(path)
+    reads: list[float] = []
+    writes = 0
+
+    async def run() -> None:
+        nonlocal writes
+        i = 0
+        while time.time() < deadline:
+            sid = f"w{worker}-s{i % SESSIONS_PER_WORKER}"
+            start = time.perf_counter()
+            await store.get_history(sid)
+            reads.append((time.perf_counter() - start) * 1000)
+            await store.append_turn(sid, f"سؤال {i}", f"جواب {i} " * 20)
+            writes += 1
+            i += 1
+
+    asyncio.run(run())
+    out.put((writes, reads))
+
+
+def _round(path: str, processes: int) -> None:
+    out: mp.Queue = mp.Queue()
+    deadline = time.time() + DURATION_S
+    procs = [mp.Process(target=_worker, args=(path, w, deadline, out)) for w in range(processes)]
+    for proc in procs:
+        proc.start()
+    results = [out.get() for _ in procs]
+    for proc in procs:
+        proc.join()
+    writes = sum(r[0] for r in results)
+    reads = [sample for r in results for sample in r[1]]
+    print(
+        f"processes={processes} writes/s={writes / DURATION_S:8.1f} "
+        f"read p50={percentile(reads, 50):.3f}ms p95={percentile(reads, 95):.3f}ms "
+        f"p99={percentile(reads, 99):.3f}ms"
+    )
+
+
+def _cross_process(path: str) -> bool:
+    ctx = mp.get_context()
+    proc = ctx.Process(target=_append_one, args=(path,))
+    proc.start()
+    proc.join()
+    history = asyncio.run(_store(path).get_history("shared"))
+    return history[-1] == {"role": "assistant", "content": "from another worker"}
+
+
+def _append_one(path: str) -> None:
+    asyncio.run(_store(path).append_turn("shared", "hi", "from another worker"))
+
+
+def main() -> int:
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "sessions.db")
+        _store(path)
+        for processes in PROCESSES:
+            _round(path, processes)
+        ok = _cross_process(path)
+        print("cross-process visibility:", "ok" if ok else "FAILED")
+        return 0 if ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
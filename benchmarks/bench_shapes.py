@@ -0,0 +1,203 @@
+"""Polygon and mask muscle shapes: equivalence, build cost and request latency.
+
+1. Every box rewritten as an all-ones mask must rasterise to the same label
+   and bitset maps as the box itself. As a 4-vertex polygon, a box may only
+   lose its first or last row or column. Polygons sample pixel centres, while
+   ``box_pixels`` truncates edges. A 256-vertex ellipse polygon must cover
+   its analytic area within 1%.
+2. A shaped body map is built from the real one. Odd items become 24-vertex
+   ellipses inscribed in their boxes, and every third item becomes a 64x64
+   pre-drawn ellipse mask. The script reports the cold rasterisation time
+   (no artifact yet), the time to open the memory-mapped artifact (startup),
+   and ``analyze_selection`` latency per radius for the box and shaped maps,
+   for the default and ``equal`` overlap modes. Latency is the best of
+   ``ROUNDS`` rounds, each the mean of ``CALLS`` calls.
+The script fails if the shaped map makes startup or requests slower beyond
+``COST_SLACK`` and ``COST_NOISE_MS``, or if a cold build exceeds
+``COLD_BUILD_BUDGET_MS``.
+"""
+
+from __future__ import annotations
+
+import copy
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable, Dict, List
+
+import numpy as np
+
+from backend import label_maps
+from backend.geometry import box_pixels
+from backend.logic import LABEL_HEIGHT, LABEL_WIDTH, analyze_selection
+from backend.muscle_data import BODY_MAP, body_map_changed
+from backend.shapes import polygon_mask
+
+from ._util import RADII, SIDES
+
+COST_SLACK = 1.15
+COST_NOISE_MS = 0.02
+COLD_BUILD_BUDGET_MS = 100.0
+ROUNDS, CALLS = 5, 40
+
+
+def _ellipse(box: List[float], vertices: int = 24) -> List[List[float]]:
+    x1, y1, x2, y2 = box
+    angles = np.linspace(0, 2 * np.pi, vertices, endpoint=False)
+    return [
+        [(x1 + x2) / 2 + (x2 - x1) / 2 * np.cos(a), (y1 + y2) / 2 + (y2 - y1) / 2 * np.sin(a)]
+        for a in angles
+    ]
+
+
+def _ellipse_mask(size: int = 64) -> np.ndarray:
+    yy, xx = np.mgrid[:size, :size] + 0.5
+    return (((xx - size / 2) / (size / 2)) ** 2 + ((yy - size / 2) / (size / 2)) ** 2 <= 1).astype(np.uint8)
+
+
+def _rewrite(make: Callable[[int, dict], dict]) -> Dict[str, list]:
+    return {side: [make(i, copy.deepcopy(item)) for i, item in enumerate(BODY_MAP[side]["items"])] for side in SIDES}
+
+
+def _install(items: Dict[str, list]) -> None:
+    for side, side_items in items.items():
+        BODY_MAP[side]["items"] = side_items
+    body_map_changed()
+
+
+def _maps() -> Dict[str, tuple]:
+    return {
+        side: (
+            label_maps.rasterise(side, LABEL_WIDTH, LABEL_HEIGHT),
+            label_maps.rasterise_bits(side, LABEL_WIDTH, LABEL_HEIGHT),
+        )
+        for side in SIDES
+    }
+
+
+def _box_polygon(box: List[float]) -> List[List[float]]:
+    x1, y1, x2, y2 = box
+    return [[x1, y1], [x2, y1], [x2, y2], [x1, y2]]
+
+
+def _check_polygons() -> int:
+    failures = 0
+    for side in SIDES:
+        for item in BODY_MAP[side]["items"]:
+            rect = box_pixels(item["box_norm"], LABEL_WIDTH, LABEL_HEIGHT)
+            if rect is None:
+                continue
+            mask = polygon_mask(_box_polygon(item["box_norm"]), rect, LABEL_WIDTH, LABEL_HEIGHT)
+            ellipse = polygon_mask(_ellipse(item["box_norm"], 256), rect, LABEL_WIDTH, LABEL_HEIGHT)
+            x1, y1, x2, y2 = item["box_norm"]
+            area = np.pi * (x2 - x1) * LABEL_WIDTH * (y2 - y1) * LABEL_HEIGHT / 4
+            if not mask[1:-1, 1:-1].all() or abs(ellipse.sum() - area) > 0.01 * area:
+                failures += 1
+                print(f"FAIL polygon fill for muscle {item['id']}")
+    print(f"box-shaped and elliptic polygons fill their boxes as expected: {failures == 0}")
+    return failures
+
+
+def _cold_build_ms() -> float:
+    samples = []
+    for _ in range(5):
+        start = time.perf_counter()
+        for side in SIDES:
+            label_maps.rasterise(side, LABEL_WIDTH, LABEL_HEIGHT)
+        samples.append((time.perf_counter() - start) * 1000)
+    return float(np.median(samples))
+
+
+def _open_ms(directory: Path) -> float:
+    for side in SIDES:
+        label_maps.save(side, LABEL_WIDTH, LABEL_HEIGHT, directory)
+    samples = []
+    for _ in range(20):
+        start = time.perf_counter()
+        for side in SIDES:
+            assert label_maps.load(side, LABEL_WIDTH, LABEL_HEIGHT, directory) is not None
+        samples.append((time.perf_counter() - start) * 1000)
+    return float(np.median(samples))
+
+
+def _latency() -> Dict[tuple, float]:
+    out: Dict[tuple, float] = {}
+    for overlap in ("last", "equal"):
+        for radius in RADII:
+            best = float("inf")
+            for _ in range(ROUNDS):
+                start = time.perf_counter()
+                for _ in range(CALLS):
+                    for side in SIDES:
+                        analyze_selection(side, 0.5, 0.3, radius, debug=False, overlap=overlap)
+                best = min(best, (time.perf_counter() - start) * 1000 / (CALLS * len(SIDES)))
+            out[(overlap, radius)] = best
+    return out
+
+
+def main() -> int:
+    failures = _check_polygons()
+    original = {side: BODY_MAP[side]["items"] for side in SIDES}
+    try:
+        boxes = _maps()
+        with tempfile.TemporaryDirectory() as tmp:
+            ones_path = Path(tmp) / "ones.npy"
+            np.save(ones_path, np.ones((3, 5), dtype=np.uint8))
+            _install(_rewrite(lambda _, item: {**item, "shape": "mask", "mask": str(ones_path)}))
+            shaped = _maps()
+        same = all(np.array_equal(boxes[s][0], shaped[s][0]) and np.array_equal(boxes[s][1], shaped[s][1]) for s in SIDES)
+        failures += not same
+        print(f"every box as an all-ones mask: identical label and bitset maps = {same}")
+        _install(original)
+
+        with tempfile.TemporaryDirectory() as tmp:
+            directory = Path(tmp)
+            mask_path = directory / "ellipse.npy"
+            np.save(mask_path, _ellipse_mask())
+
+            def shape(i: int, item: dict) -> dict:
+                if i % 3 == 0:
+                    return {**item, "shape": "mask", "mask": str(mask_path)}
+                if i % 2:
+                    return {**item, "shape": "polygon", "polygon_norm": _ellipse(item["box_norm"])}
+                return item
+
+            shaped_items = _rewrite(shape)
+            results: Dict[str, dict] = {}
+            for name, items in (("boxes", original), ("shaped", shaped_items)):
+                _install(items)
+                label_maps.source_digest.cache_clear()
+                covered = sum(int((label_maps.rasterise(s, LABEL_WIDTH, LABEL_HEIGHT) > 0).sum()) for s in SIDES)
+                results[name] = {
+                    "cold_ms": _cold_build_ms(),
+                    "open_ms": _open_ms(directory / name),
+                    "latency": _latency(),
+                    "covered": covered,
+                }
+                print(
+                    f"{name:6s} labelled px={covered:7d} cold build={results[name]['cold_ms']:7.2f}ms "
+                    f"artifact open={results[name]['open_ms']:.3f}ms"
+                )
+    finally:
+        _install(original)
+        label_maps.source_digest.cache_clear()
+
+    base, shaped = results["boxes"], results["shaped"]
+    if shaped["cold_ms"] > COLD_BUILD_BUDGET_MS:
+        print(f"FAIL cold build {shaped['cold_ms']:.1f}ms over {COLD_BUILD_BUDGET_MS}ms")
+        failures += 1
+    if shaped["open_ms"] > base["open_ms"] * COST_SLACK + COST_NOISE_MS:
+        print("FAIL artifact open (startup) got slower with shapes")
+        failures += 1
+    for key, before in base["latency"].items():
+        after = shaped["latency"][key]
+        flag = "" if after <= before * COST_SLACK + COST_NOISE_MS else "  SLOWER"
+        failures += bool(flag)
+        print(f"  overlap={key[0]:5s} r={key[1]:<5} boxes={before:6.3f}ms shaped={after:6.3f}ms{flag}")
+    print(f"{failures} failures")
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if main() else 0)
@@ -0,0 +1,106 @@
+"""Cold-start budget: import time, startup (warm-up) time and first-request latency.
+
+Every sample is a fresh interpreter with an OpenAI key that points at the
+local stub. Each one reports:
+- how long ``import backend.main`` takes;
+- whether ``openai`` was imported eagerly;
+- how long the lifespan startup takes;
+- the latency of the first ``/api/analyze`` per side and of the first
+  ``/api/chat``.
+
+Both ``STARTUP_WARMUP=blocking`` and ``off`` are measured. The script exits
+non-zero if the blocking mode goes over any budget, or if ``openai`` is
+imported at import time again.
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+from typing import Dict, List, Sequence
+
+from .stub_openai import StubOpenAI
+
+STUB_LATENCY_S = 0.05
+
+CHILD = r"""
+import json, sys, time
+start = time.perf_counter()
+import backend.main as main
+imported = time.perf_counter() - start
+eager_openai = "openai" in sys.modules
+from fastapi.testclient import TestClient
+start = time.perf_counter()
+with TestClient(main.app) as http:
+    startup = time.perf_counter() - start
+    out = {"import_s": imported, "startup_s": startup, "eager_openai": eager_openai}
+    for side in ("front", "back"):
+        start = time.perf_counter()
+        resp = http.post("/api/analyze", json={"side": side, "circle": {"cx": 0.4, "cy": 0.3, "radius": 0.12}})
+        out[f"first_analyze_{side}_ms"] = (time.perf_counter() - start) * 1000
+        assert resp.status_code == 200, resp.text
+    start = time.perf_counter()
+    resp = http.post("/api/chat", json={"user_message": "hi"})
+    out["first_chat_ms"] = (time.perf_counter() - start) * 1000
+    assert resp.json()["usedOpenAI"], resp.json()
+print(json.dumps(out))
+"""
+
+# ميزانيات وضع blocking (على جهاز التطوير؛ عدّلها بالخيارات لو الجهاز أبطأ)
+BUDGETS = {
+    "import_s": 1.0,
+    "startup_s": 0.8,
+    "first_analyze_front_ms": 30.0,
+    "first_analyze_back_ms": 30.0,
+    "first_chat_ms": STUB_LATENCY_S * 1000 + 450.0,
+}
+
+
+def _sample(base_url: str, warmup: str) -> Dict[str, float]:
+    env = dict(
+        os.environ,
+        OPENAI_API_KEY="stub",
+        OPENAI_BASE_URL=base_url,
+        STARTUP_WARMUP=warmup,
+        ANALYZE_CACHE_SIZE="0",
+        OPENAI_SIMULATOR="",
+    )
+    proc = subprocess.run(
+        [sys.executable, "-c", CHILD], env=env, capture_output=True, text=True, check=True, timeout=60
+    )
+    return json.loads(proc.stdout.strip().splitlines()[-1])
+
+
+def main_(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--scale", type=float, default=1.0, help="multiply every budget (slow machines)")
+    args = parser.parse_args(argv)
+
+    failures = 0
+    medians: Dict[str, Dict[str, float]] = {}
+    with StubOpenAI(latency_s=STUB_LATENCY_S) as stub:
+        for warmup in ("blocking", "off"):
+            samples: List[Dict[str, float]] = [_sample(stub.base_url, warmup) for _ in range(args.runs)]
+            if any(sample["eager_openai"] for sample in samples):
+                print(f"FAIL {warmup}: openai imported while importing backend.main")
+                failures += 1
+            medians[warmup] = {key: statistics.median(s[key] for s in samples) for key in BUDGETS}
+
+    print(f"{'metric':24s} {'blocking':>10s} {'off':>10s} {'budget':>10s}")
+    for key, budget in BUDGETS.items():
+        budget *= args.scale
+        blocking, off = medians["blocking"][key], medians["off"][key]
+        flag = "" if blocking <= budget else "  OVER BUDGET"
+        failures += bool(flag)
+        print(f"{key:24s} {blocking:10.3f} {off:10.3f} {budget:10.3f}{flag}")
+    print(f"{failures} failures")
+    return failures
+
+
+if __name__ == "__main__":
+    sys.exit(1 if main_() else 0)
@@ -0,0 +1,142 @@
+"""Checks the upstream circuit breaker against the local stub.
+
+- a failing upstream opens the breaker after ``min_calls``; while open,
+  ``/api/chat`` returns the fallback immediately without calling upstream;
+- after ``open_s`` one half-open probe reaches the recovered stub and closes it;
+- a slow upstream keeps the full deadline until the window holds ``min_calls``
+  calls (one long reply does not cut it for everyone), then pulls the per-call
+  deadline down to the latency SLO (fast fallback) and opens the breaker;
+- state and transitions are reported under ``upstream.breaker`` in ``/health``;
+- local congestion is not charged to upstream: with ``max_concurrency=1`` and a
+  burst of ``BURST`` calls, the calls that time out while queued count as
+  ``queue_timeouts`` and the breaker stays closed.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+import time
+from typing import Any, Dict, Tuple
+
+import httpx
+
+from backend import main
+from backend.breaker import CircuitBreaker
+from backend.llm import build_completer
+
+from .stub_openai import StubOpenAI
+
+MIN_CALLS = 5
+OPEN_S = 1.0
+SLO_S = 0.3
+DEADLINE_S = 2.0
+BURST = 8
+
+
+async def _chat(http: httpx.AsyncClient, i: int) -> Tuple[Dict[str, Any], float]:
+    start = time.perf_counter()
+    body = (await http.post("/api/chat", json={"user_message": f"سؤال رقم {i}"})).json()
+    return body, time.perf_counter() - start
+
+
+async def _check() -> None:
+    transport = httpx.ASGITransport(app=main.app)
+    with StubOpenAI(latency_s=0.01, status=500) as stub:
+        completer = build_completer(api_key="stub", base_url=stub.base_url)
+        assert completer is not None
+        completer.client = completer.client.with_options(max_retries=0)
+        completer.deadline_s = DEADLINE_S
+        completer.breaker = breaker = CircuitBreaker(
+            window_s=30, min_calls=MIN_CALLS, latency_slo_s=SLO_S, open_s=OPEN_S
+        )
+        main.client = completer
+        async with httpx.AsyncClient(transport=transport, base_url="http://check") as http:
+            for i in range(MIN_CALLS):
+                body, _ = await _chat(http, i)
+                assert not body["usedOpenAI"], body
+            assert breaker.state == "open" and stub.calls == MIN_CALLS, (breaker.state, stub.calls)
+
+            worst = 0.0
+            for i in range(10):
+                body, elapsed = await _chat(http, i)
+                worst = max(worst, elapsed)
+                assert not body["usedOpenAI"], body
+            assert stub.calls == MIN_CALLS and breaker.rejected == 10, (stub.calls, breaker.rejected)
+            print(f"ok: open after {MIN_CALLS} errors; 10 requests failed fast (worst {worst * 1000:.1f}ms, 0 upstream calls)")
+
+            stub.status = 200
+            await asyncio.sleep(OPEN_S)
+            body, _ = await _chat(http, 99)
+            assert body["usedOpenAI"] and breaker.state == "closed", (body, breaker.state)
+            print("ok: half-open probe succeeded and closed the breaker")
+
+            stub.latency_s = 0.01
+            for i in range(MIN_CALLS - 1):
+                assert (await _chat(http, 100 + i))[0]["usedOpenAI"]
+            stub.latency_s = 1.0
+            timings = []
+            for i in range(2 * MIN_CALLS):
+                body, elapsed = await _chat(http, 200 + i)
+                timings.append(elapsed)
+                if breaker.state == "open":
+                    break
+            assert breaker.state == "open", breaker.stats()
+            # أول بطيئين بالمهلة الكاملة (الأول قبل min_calls، والثاني نسبة البطء 1/5 بعده)
+            assert min(timings[:2]) >= 1.0 and max(timings[2:]) < SLO_S + 0.2 and len(timings) > 2, timings
+            print(
+                "ok: slow upstream -> 2 calls at the full deadline, then SLO fallback at <= %.2fs, then open"
+                % max(timings[2:])
+            )
+
+            stats = (await http.get("/health")).json()["upstream"]["breaker"]
+            moves = [(t["from"], t["to"]) for t in stats["transitions"]]
+            expected = [("closed", "open"), ("open", "half_open"), ("half_open", "closed"), ("closed", "open")]
+            assert stats["state"] == "open" and moves == expected, stats
+            print(f"ok: /health shows state={stats['state']} transitions={len(moves)}")
+        await completer.aclose()
+
+
+async def _check_congestion() -> None:
+    with StubOpenAI(latency_s=0.2) as stub:
+        completer = build_completer(api_key="stub", base_url=stub.base_url)
+        assert completer is not None
+        completer.client = completer.client.with_options(max_retries=0)
+        completer.deadline_s = 0.5
+        completer.max_concurrency = 1
+        completer._semaphore = asyncio.Semaphore(1)
+        completer.single_flight = False
+        completer.breaker = breaker = CircuitBreaker(
+            window_s=30, min_calls=2, latency_slo_s=SLO_S, open_s=OPEN_S
+        )
+
+        async def call(i: int) -> bool:
+            try:
+                await completer.complete([{"role": "user", "content": f"زحمة {i}"}])
+            except asyncio.TimeoutError:
+                return False
+            return True
+
+        results = await asyncio.gather(*(call(i) for i in range(BURST)))
+        stats = completer.stats()
+        assert stats["queue_timeouts"] > 0 and breaker.state == "closed", (results, stats)
+        assert stats["waiting"] == 0 and stats["in_flight"] == 0, stats
+        print(
+            f"ok: burst of {BURST} on 1 slot -> {results.count(True)} answered, "
+            f"{stats['queue_timeouts']} queue timeouts, breaker {breaker.state}"
+        )
+        await completer.aclose()
+
+
+def main_() -> int:
+    try:
+        asyncio.run(_check())
+        asyncio.run(_check_congestion())
+    except AssertionError as exc:
+        print(f"FAILED: {exc!r}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_())
@@ -0,0 +1,93 @@
+"""Checks ``POST /api/chat/stream`` against the local stub and measures time-to-first-token.
+
+- deltas arrive as SSE events and join up to the full reply;
+- the final ``done`` event carries session_id, turns, usedOpenAI and youtube;
+- the turn is committed only once the stream finishes (turns grows by one);
+- without a client the fallback reply is streamed the same way.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import sys
+import time
+from typing import Any, Dict, List, Tuple
+
+import httpx
+
+from backend import main
+from backend.llm import build_completer
+
+from ._util import serve_app
+from .stub_openai import DEFAULT_REPLY, StubOpenAI
+
+TOKEN_DELAY_S = 0.03
+
+
+async def _stream(http: httpx.AsyncClient, body: Dict[str, Any]) -> Tuple[float, List[str], Dict[str, Any]]:
+    start = time.perf_counter()
+    first_token = 0.0
+    deltas: List[str] = []
+    done: Dict[str, Any] = {}
+    async with http.stream("POST", "/api/chat/stream", json=body) as resp:
+        event = None
+        async for line in resp.aiter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                data = json.loads(line[len("data: "):])
+                if event == "done":
+                    done = data
+                else:
+                    if not deltas:
+                        first_token = time.perf_counter() - start
+                    deltas.append(data["delta"])
+                event = None
+    return first_token, deltas, done
+
+
+async def _run(base_url: str) -> None:
+    async with httpx.AsyncClient(base_url=base_url, timeout=10) as http:
+        start = time.perf_counter()
+        blocking = (await http.post("/api/chat", json={"user_message": "hi"})).json()
+        blocking_s = time.perf_counter() - start
+
+        ttft, deltas, done = await _stream(http, {"user_message": "كيف أمدد كتفي؟"})
+        assert "".join(deltas).strip() == DEFAULT_REPLY, deltas
+        assert done["usedOpenAI"] is True and done["turns"] == 1, done
+        assert done["reply"] == DEFAULT_REPLY and done["youtube"], done
+
+        _, _, again = await _stream(http, {"session_id": done["session_id"], "user_message": "وبعدين؟"})
+        assert again["turns"] == 2, again
+        print(
+            f"ok: streamed {len(deltas)} deltas, time-to-first-token {ttft * 1000:.0f}ms "
+            f"vs blocking reply {blocking_s * 1000:.0f}ms (usedOpenAI={blocking['usedOpenAI']})"
+        )
+
+
+async def _run_fallback() -> None:
+    transport = httpx.ASGITransport(app=main.app)
+    main.client = None
+    async with httpx.AsyncClient(transport=transport, base_url="http://check") as http:
+        _, deltas, done = await _stream(http, {"user_message": "السلام عليكم"})
+        assert len(deltas) > 1 and done["usedOpenAI"] is False and done["turns"] == 1, done
+        assert "".join(deltas).strip() == done["reply"], deltas
+    print("ok: fallback reply streamed through the same events")
+
+
+def main_() -> int:
+    try:
+        with StubOpenAI(latency_s=0.1, token_delay_s=TOKEN_DELAY_S) as stub:
+            main.client = build_completer(api_key="stub", base_url=stub.base_url)
+            with serve_app(main.app) as base_url:
+                asyncio.run(_run(base_url))
+        asyncio.run(_run_fallback())
+    except AssertionError as exc:
+        print(f"FAILED: {exc!r}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_())
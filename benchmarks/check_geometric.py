@@ -0,0 +1,83 @@
+"""Accuracy harness and latency benchmark for the geometric analyze engine.
+
+Compares ``engine="geometric"`` with the raster path over the centre/radius
+grid (same muscles, pixel counts and weights within a relative tolerance),
+then reports per-request latency of both engines on the full ``BODY_MAP``.
+"""
+
+from __future__ import annotations
+
+import math
+import sys
+
+from backend.logic import ENGINES, LABEL_HEIGHT, LABEL_WIDTH, analyze_selection
+from backend.muscle_data import BODY_MAP
+
+from ._util import RADII, SIDES, grid, time_call
+
+WEIGHT_RTOL = 1e-9
+PROB_ATOL = 1e-4  # prob مقرّبة لأربع منازل
+
+
+def check() -> int:
+    failures = 0
+    max_weight_err = 0.0
+    max_prob_err = 0.0
+    checked = 0
+    for side, cx, cy, radius in grid():
+        px = (cx * LABEL_WIDTH, cy * LABEL_HEIGHT, radius * min(LABEL_WIDTH, LABEL_HEIGHT))
+        opts = {"sigma_scale": 0.25, "k": 50, "min_pixels": 3}
+        raster = ENGINES["raster"](side, *px, **opts)
+        geometric = ENGINES["geometric"](side, *px, **opts)
+        checked += 1
+
+        raster_by_id = {item.muscle_id: item for item in raster}
+        geometric_by_id = {item.muscle_id: item for item in geometric}
+        same = raster_by_id.keys() == geometric_by_id.keys() and all(
+            raster_by_id[i].pixels == geometric_by_id[i].pixels
+            and math.isclose(raster_by_id[i].weight, geometric_by_id[i].weight, rel_tol=WEIGHT_RTOL)
+            for i in raster_by_id
+        )
+        for i in raster_by_id.keys() & geometric_by_id.keys():
+            err = abs(raster_by_id[i].weight - geometric_by_id[i].weight) / raster_by_id[i].weight
+            max_weight_err = max(max_weight_err, err)
+
+        a = analyze_selection(side, cx, cy, radius, engine="raster")["results"]
+        b = analyze_selection(side, cx, cy, radius, engine="geometric")["results"]
+        probs_a = {item["id"]: item["prob"] for item in a}
+        probs_b = {item["id"]: item["prob"] for item in b}
+        if probs_a.keys() != probs_b.keys():
+            same = False
+        else:
+            for i in probs_a:
+                max_prob_err = max(max_prob_err, abs(probs_a[i] - probs_b[i]))
+            if max_prob_err > PROB_ATOL:
+                same = False
+
+        if not same:
+            failures += 1
+            print(f"MISMATCH side={side} cx={cx} cy={cy} r={radius}")
+
+    print(
+        f"checked {checked} circles, {failures} mismatches, "
+        f"max weight rel err {max_weight_err:.2e}, max prob err {max_prob_err:.2e}"
+    )
+    return failures
+
+
+def bench() -> None:
+    items = sum(len(side["items"]) for side in BODY_MAP.values())
+    print(f"latency per analyze_selection call ({items} items in BODY_MAP)")
+    for side in SIDES:
+        for radius in RADII:
+            row = [f"{side:5s} r={radius:<5}"]
+            for engine in ENGINES:
+                stats = time_call(lambda: analyze_selection(side, 0.5, 0.45, radius, engine=engine), repeat=50)
+                row.append(f"{engine}={stats['p50_ms']:7.3f}ms")
+            print(" ".join(row))
+
+
+if __name__ == "__main__":
+    failed = check()
+    bench()
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,109 @@
+"""Accuracy harness and latency benchmark for the sparse label-run index.
+
+Compares scoring on the row-run index with the windowed dense scan over the
+centre/radius grid, including small circles that ``top_muscles_circle`` sends
+to the dense path (below ``SPARSE_MIN_WINDOW_PIXELS``). Muscles and pixel counts
+must be identical, weights must agree within a relative tolerance, and
+``analyze_selection`` probabilities must agree within rounding. It then
+reports latency per radius together with the work done: pixels in the circle
+window on the dense path, and runs visited on the sparse path.
+"""
+
+from __future__ import annotations
+
+import math
+import sys
+
+from backend import logic
+from backend.logic import (
+    LABEL_HEIGHT,
+    LABEL_WIDTH,
+    _build_label_map,
+    _build_label_runs,
+    _top_muscles_runs,
+    circle_window,
+    top_muscles_circle,
+)
+
+from ._util import RADII, SIDES, grid, time_call
+
+WEIGHT_RTOL = 1e-9
+PROB_ATOL = 1e-4  # prob مقرّبة لأربع منازل
+
+
+def _pixels(cx: float, cy: float, radius: float) -> tuple[float, float, float]:
+    return cx * LABEL_WIDTH, cy * LABEL_HEIGHT, radius * min(LABEL_WIDTH, LABEL_HEIGHT)
+
+
+def check() -> int:
+    failures = 0
+    max_weight_err = 0.0
+    max_prob_err = 0.0
+    checked = 0
+    for side, cx, cy, radius in grid():
+        label_map = _build_label_map(side)
+        px = _pixels(cx, cy, radius)
+        dense = {item.muscle_id: item for item in top_muscles_circle(label_map, *px, k=50, sparse=False)}
+        rows, cols = circle_window(LABEL_HEIGHT, LABEL_WIDTH, *px)
+        # مباشرة على الفهرس حتى للنوافذ الصغيرة اللي top_muscles_circle يمسحها كثيفاً
+        runs = _top_muscles_runs(_build_label_runs(side), rows, cols, *px, sigma_scale=0.25, k=50, min_pixels=3)
+        sparse = {item.muscle_id: item for item in runs}
+        checked += 1
+        same = dense.keys() == sparse.keys() and all(
+            dense[i].pixels == sparse[i].pixels
+            and math.isclose(dense[i].weight, sparse[i].weight, rel_tol=WEIGHT_RTOL)
+            for i in dense
+        )
+        for i in dense.keys() & sparse.keys():
+            max_weight_err = max(max_weight_err, abs(dense[i].weight - sparse[i].weight) / dense[i].weight)
+
+        probs = []
+        for flag in (False, True):
+            original = logic.top_muscles_circle.__kwdefaults__["sparse"]
+            logic.top_muscles_circle.__kwdefaults__["sparse"] = flag
+            try:
+                result = logic.analyze_selection(side, cx, cy, radius, debug=False)["results"]
+            finally:
+                logic.top_muscles_circle.__kwdefaults__["sparse"] = original
+            probs.append({item["id"]: item["prob"] for item in result})
+        if probs[0].keys() != probs[1].keys():
+            same = False
+        else:
+            err = max((abs(probs[0][i] - probs[1][i]) for i in probs[0]), default=0.0)
+            max_prob_err = max(max_prob_err, err)
+            same = same and err <= PROB_ATOL
+
+        if not same:
+            failures += 1
+            print(f"MISMATCH side={side} cx={cx} cy={cy} r={radius}")
+
+    print(
+        f"checked {checked} circles, {failures} mismatches, "
+        f"max weight rel err {max_weight_err:.2e}, max prob err {max_prob_err:.2e}"
+    )
+    return failures
+
+
+def bench() -> None:
+    for side in SIDES:
+        label_map = _build_label_map(side)
+        runs = _build_label_runs(side)
+        print(f"{side}: {runs.labels.size} runs, index {runs.nbytes / 1024:.0f} KB")
+        for radius in RADII:
+            px = _pixels(0.5, 0.45, radius)
+            rows, cols = circle_window(LABEL_HEIGHT, LABEL_WIDTH, *px)
+            window = (rows.stop - rows.start) * (cols.stop - cols.start)
+            visited = int(runs.row_ptr[rows.stop] - runs.row_ptr[rows.start])
+            dense = time_call(lambda: top_muscles_circle(label_map, *px, sparse=False), repeat=50)
+            sparse = time_call(lambda: top_muscles_circle(label_map, *px, sparse=True, runs=runs), repeat=50)
+            print(
+                f"  r={radius:<5} dense={dense['p50_ms']:7.3f}ms ({window:7d} px) "
+                f"sparse={sparse['p50_ms']:7.3f}ms ({visited:5d} runs) "
+                f"x{dense['p50_ms'] / max(sparse['p50_ms'], 1e-9):.1f}"
+            )
+
+
+if __name__ == "__main__":
+    failed = check()
+    bench()
+    sys.exit(1 if failed else 0)
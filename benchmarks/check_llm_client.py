@@ -0,0 +1,82 @@
+"""Checks the async OpenAI path against the local stub server.
+
+- a normal completion returns the stub reply;
+- concurrent calls never exceed ``max_concurrency`` upstream;
+- a stub slower than the deadline raises ``asyncio.TimeoutError`` on time;
+- ``/api/chat`` answers from the stub and falls back when it is too slow.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+import time
+
+import httpx
+
+from backend import main
+from backend.llm import ChatCompleter, build_completer
+
+from .stub_openai import DEFAULT_REPLY, StubOpenAI
+
+
+def _completer(stub: StubOpenAI, *, deadline_s: float, max_concurrency: int) -> ChatCompleter:
+    completer = build_completer(api_key="stub", base_url=stub.base_url)
+    assert completer is not None
+    completer.deadline_s = deadline_s
+    completer.max_concurrency = max_concurrency
+    completer._semaphore = asyncio.Semaphore(max_concurrency)
+    return completer
+
+
+async def _check_client() -> None:
+    messages = [{"role": "user", "content": "hi"}]
+    with StubOpenAI(latency_s=0.1) as stub:
+        completer = _completer(stub, deadline_s=5.0, max_concurrency=4)
+        assert await completer.complete(messages) == DEFAULT_REPLY
+        start = time.perf_counter()
+        await asyncio.gather(*(completer.complete([{"role": "user", "content": f"hi {i}"}]) for i in range(16)))
+        elapsed = time.perf_counter() - start
+        assert stub.peak_active <= 4, stub.peak_active
+        assert elapsed >= 0.4, elapsed  # 16 طلب / 4 بالتوازي × 0.1s
+        print(f"ok: 16 calls, peak upstream concurrency {stub.peak_active}, {elapsed:.2f}s")
+        await completer.aclose()
+
+    with StubOpenAI(latency_s=1.0) as stub:
+        completer = _completer(stub, deadline_s=0.2, max_concurrency=4)
+        start = time.perf_counter()
+        try:
+            await completer.complete(messages)
+        except asyncio.TimeoutError:
+            elapsed = time.perf_counter() - start
+            assert elapsed < 0.5, elapsed
+            print(f"ok: deadline hit after {elapsed:.2f}s")
+        else:
+            raise AssertionError("expected a timeout")
+        await completer.aclose()
+
+
+async def _check_endpoint() -> None:
+    transport = httpx.ASGITransport(app=main.app)
+    for latency, expect_openai in ((0.05, True), (1.0, False)):
+        with StubOpenAI(latency_s=latency) as stub:
+            main.client = _completer(stub, deadline_s=0.3, max_concurrency=4)
+            async with httpx.AsyncClient(transport=transport, base_url="http://check") as http:
+                body = (await http.post("/api/chat", json={"user_message": "السلام عليكم"})).json()
+            assert body["usedOpenAI"] is expect_openai, body
+            await main.client.aclose()
+    print("ok: /api/chat uses the stub and falls back past the deadline")
+
+
+def main_() -> int:
+    try:
+        asyncio.run(_check_client())
+        asyncio.run(_check_endpoint())
+    except AssertionError as exc:
+        print(f"FAILED: {exc!r}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_())
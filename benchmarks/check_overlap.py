@@ -0,0 +1,126 @@
+"""Accuracy harness and cost benchmark for multi-label overlap scoring.
+
+Over the centre/radius grid, scoring on the multi-label set index must match:
+- ``overlap="last"``: the single-label ``top_muscles_circle`` (same muscles and
+  pixel counts, weights within a relative tolerance);
+- ``overlap="full"`` and ``"equal"``: a brute-force dense scan of the per-pixel
+  bitset map, where each muscle under a pixel gets its whole weight, or an equal
+  share of it.
+
+It then reports ``analyze_selection`` latency per radius for each mode. It
+fails if ``equal`` or ``full`` costs more than the default single-label path
+(``last``), within ``COST_SLACK`` and ``COST_NOISE_MS``.
+"""
+
+from __future__ import annotations
+
+import math
+import sys
+from typing import Dict, List
+
+import numpy as np
+
+from backend import label_maps
+from backend.logic import (
+    LABEL_HEIGHT,
+    LABEL_WIDTH,
+    OVERLAP_MODES,
+    _build_label_map,
+    _build_label_runs,
+    _build_label_sets,
+    analyze_selection,
+    circle_window,
+    gaussian_sigma,
+    top_muscles_circle,
+    top_muscles_circle_multi,
+)
+
+from ._util import RADII, SIDES, grid, time_call
+
+WEIGHT_RTOL = 1e-9
+COST_SLACK = 1.15   # المسار متعدد التسميات لازم يبقى ضمن 15% من المسار الحالي
+COST_NOISE_MS = 0.02
+
+
+def _brute_force(bits: np.ndarray, muscle_ids: np.ndarray, cx: float, cy: float, radius: float, overlap: str):
+    """مسح كثيف مباشر: لكل عضلة، البكسلات اللي بتها مرفوع داخل الدائرة."""
+    rows, cols = circle_window(LABEL_HEIGHT, LABEL_WIDTH, cx, cy, radius)
+    window = bits[rows, cols]
+    yy, xx = np.ogrid[rows, cols]
+    dist_sq = (xx - cx) ** 2 + (yy - cy) ** 2
+    mask = dist_sq <= radius ** 2
+    weights = np.exp(-dist_sq / (2 * gaussian_sigma(radius, 0.25) ** 2))
+    coverage = np.zeros(window.shape)
+    for index in range(muscle_ids.size):
+        coverage += (window >> np.uint64(index)) & np.uint64(1)
+    share = weights / np.maximum(coverage, 1) if overlap == "equal" else weights
+    out: Dict[int, tuple[int, float]] = {}
+    for index, muscle_id in enumerate(muscle_ids):
+        hit = mask & (((window >> np.uint64(index)) & np.uint64(1)) == 1)
+        count = int(hit.sum())
+        if count >= 3:
+            out[int(muscle_id)] = (count, float(share[hit].sum()))
+    return out
+
+
+def _same(expected: Dict[int, tuple[int, float]], results) -> bool:
+    got = {item.muscle_id: (item.pixels, item.weight) for item in results}
+    return expected.keys() == got.keys() and all(
+        expected[i][0] == got[i][0] and math.isclose(expected[i][1], got[i][1], rel_tol=WEIGHT_RTOL)
+        for i in expected
+    )
+
+
+def check() -> int:
+    failures = 0
+    checked = 0
+    bits = {side: label_maps.rasterise_bits(side, LABEL_WIDTH, LABEL_HEIGHT) for side in SIDES}
+    for side, cx, cy, radius in grid():
+        sets = _build_label_sets(side)
+        px = (cx * LABEL_WIDTH, cy * LABEL_HEIGHT, radius * min(LABEL_WIDTH, LABEL_HEIGHT))
+        checked += 1
+
+        single = top_muscles_circle(_build_label_map(side), *px, k=50, runs=_build_label_runs(side))
+        expected = {item.muscle_id: (item.pixels, item.weight) for item in single}
+        ok = _same(expected, top_muscles_circle_multi(sets, *px, overlap="last", k=50))
+        for overlap in ("full", "equal"):
+            expected = _brute_force(bits[side], sets.muscle_ids, *px, overlap)
+            ok = ok and _same(expected, top_muscles_circle_multi(sets, *px, overlap=overlap, k=50))
+        if not ok:
+            failures += 1
+            print(f"MISMATCH side={side} cx={cx} cy={cy} r={radius}")
+    print(f"checked {checked} circles x {len(OVERLAP_MODES)} overlap modes, {failures} mismatches")
+    return failures
+
+
+def bench() -> int:
+    failures = 0
+    for side in SIDES:
+        sets = _build_label_sets(side)
+        print(
+            f"{side}: {sets.runs.labels.size} runs over {sets.members.shape[0]} muscle sets, "
+            f"index {sets.nbytes / 1024:.0f} KB"
+        )
+        for radius in RADII:
+            p50: Dict[str, float] = {}
+            row: List[str] = [f"  r={radius:<5}"]
+            for overlap in OVERLAP_MODES:
+                stats = time_call(
+                    lambda: analyze_selection(side, 0.5, 0.3, radius, debug=False, overlap=overlap), repeat=100
+                )
+                p50[overlap] = stats["p50_ms"]
+                row.append(f"{overlap}={stats['p50_ms']:6.3f}ms")
+            budget = p50["last"] * COST_SLACK + COST_NOISE_MS
+            over = [mode for mode in ("equal", "full") if p50[mode] > budget]
+            if over:
+                failures += 1
+                row.append(f"  OVER ({', '.join(over)} > {budget:.3f}ms)")
+            print(" ".join(row))
+    return failures
+
+
+if __name__ == "__main__":
+    failed = check()
+    failed += bench()
+    print(f"{failed} failures")
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,122 @@
+"""Checks the opt-in sampling profiler end to end.
+
+With the profiler enabled at a 0% sample rate:
+- without ``header_token`` the header is ignored and ``/admin/profiles`` is
+  refused;
+- requests without the profiling header are not profiled;
+- a large-radius ``/api/analyze`` forced through the header writes a
+  ``.folded`` file whose worker stacks reach the analysis code (on the dense
+  scan: the run index answers in well under one sampling interval);
+- a ``/api/chat`` against the slow stub is sampled on the event loop
+  (task stacks through the chat handler);
+- only the newest ``max_files`` files are kept;
+- ``/admin/profiles`` lists the slowest requests with their top frames and
+  rejects callers without the token.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import httpx
+
+from backend import logic, main
+from backend.llm import build_completer
+from backend.profiling import PROFILER
+
+from .stub_openai import StubOpenAI
+
+HEADER = "X-Armonia-Profile"
+TOKEN = "secret"
+MAX_FILES = 3
+ANALYZE = {"side": "front", "circle": {"cx": 0.5, "cy": 0.5, "radius": 0.5}}
+
+
+async def _settle(expected: int) -> None:
+    # الـ sampler يكتب الملف بعد ما يرجع الرد، فننتظر لين يخلص
+    deadline = time.perf_counter() + 5
+    while PROFILER.profiled < expected and time.perf_counter() < deadline:
+        await asyncio.sleep(0.01)
+    assert PROFILER.profiled == expected, (PROFILER.profiled, expected)
+
+
+async def _check(directory: Path) -> None:
+    PROFILER.enabled = True
+    PROFILER.sample_rate = 0.0
+    PROFILER.directory = directory
+    PROFILER.interval_s = 0.001
+    PROFILER.max_files = MAX_FILES
+    PROFILER.header_token = None
+    logic.ANALYZE_CACHE.max_entries = 0
+    profiled = {HEADER: TOKEN}
+
+    transport = httpx.ASGITransport(app=main.app)
+    with StubOpenAI(latency_s=0.1) as stub:
+        main.client = build_completer(api_key="stub", base_url=stub.base_url)
+        async with httpx.AsyncClient(transport=transport, base_url="http://check") as http:
+            await http.post("/api/analyze", json=ANALYZE, headers={HEADER: "1"})
+            await asyncio.sleep(0.05)
+            assert PROFILER.profiled == 0, PROFILER.stats()
+            assert (await http.get("/admin/profiles", headers={HEADER: "1"})).status_code == 403
+            print("ok: without a token the header is ignored and /admin/profiles is refused")
+
+            PROFILER.header_token = TOKEN
+            await http.post("/api/analyze", json=ANALYZE)
+            await http.post("/api/chat", json={"user_message": "hi"})
+            await asyncio.sleep(0.05)
+            assert PROFILER.profiled == 0 and not list(directory.glob("*.folded")), PROFILER.stats()
+            print("ok: requests without the header are not profiled")
+
+            for _ in range(4):
+                assert (await http.post("/api/analyze", json=ANALYZE, headers=profiled)).status_code == 200
+            await _settle(4)
+            files = sorted(directory.glob("*.folded"))
+            assert len(files) == MAX_FILES, files
+            stacks = "".join(path.read_text(encoding="utf-8") for path in files)
+            assert "worker;workers:_timed_call" in stacks and "logic:" in stacks, stacks[:2000]
+            print(f"ok: analyze profiles written and rotated to {len(files)} files")
+
+            resp = await http.post("/api/chat", json={"user_message": "how do I stretch?"}, headers=profiled)
+            assert resp.json()["usedOpenAI"], resp.json()
+            await _settle(5)
+            report = (await http.get("/admin/profiles", headers=profiled)).json()
+            chat = [item for item in report["slowest"] if item["path"] == "/api/chat"]
+            assert chat and chat[0]["samples"] > 0, report
+            chat_stacks = Path(chat[0]["file"]).read_text(encoding="utf-8")
+            assert "task;" in chat_stacks and "main:_handle_chat" in chat_stacks, chat_stacks[:2000]
+            durations = [item["duration_ms"] for item in report["slowest"]]
+            assert durations == sorted(durations, reverse=True), durations
+            top = report["slowest"][0]
+            print(f"ok: /admin/profiles slowest={top['path']} {top['duration_ms']:.1f}ms top={top['top_frames'][:2]}")
+
+            assert (await http.get("/admin/profiles")).status_code == 403
+            assert (await http.get("/admin/profiles", headers={HEADER: "wrong"})).status_code == 403
+            await http.post("/api/analyze", json=ANALYZE, headers={HEADER: "1"})
+            await asyncio.sleep(0.05)
+            assert PROFILER.profiled == 5, PROFILER.stats()
+            print("ok: token required for the admin endpoint and for forcing a profile")
+        await main.client.aclose()
+
+
+def main_() -> int:
+    # المسح الكثيف (~ms) حتى يلحق الـ sampler ياخذ عينات من طلب التحليل
+    sparse = logic.top_muscles_circle.__kwdefaults__["sparse"]
+    logic.top_muscles_circle.__kwdefaults__["sparse"] = False
+    with tempfile.TemporaryDirectory() as tmp:
+        try:
+            asyncio.run(_check(Path(tmp)))
+        except AssertionError as exc:
+            print(f"FAILED: {exc!r}")
+            return 1
+        finally:
+            PROFILER.enabled = False
+            logic.top_muscles_circle.__kwdefaults__["sparse"] = sparse
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_())
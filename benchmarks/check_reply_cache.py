@@ -0,0 +1,84 @@
+"""Checks the first-turn reply cache against the slow local stub.
+
+- rephrasings of the same question (spacing, punctuation, diacritics, alef
+  forms) about the same muscles are served from the cache after one upstream call;
+- hits report ``usedOpenAI: false`` and ``cached: true``;
+- different muscles or a later turn in the same session go upstream;
+- the streaming endpoint shares the same cache;
+- hit rate and saved upstream latency show up under ``reply_cache`` in ``/health``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+import time
+
+import httpx
+
+from backend import main
+from backend.llm import build_completer
+from backend.reply_cache import ReplyCache
+
+from .stub_openai import StubOpenAI
+
+LATENCY_S = 0.3
+
+TRAPEZIUS = {"muscles": [{"muscle_ar": "شبه المنحرفة", "muscle_en": "Trapezius", "region": "Back", "prob": 0.7}]}
+DELTOID = {"muscles": [{"muscle_ar": "الدالية", "muscle_en": "Deltoid", "region": "Shoulder", "prob": 0.6}]}
+QUESTIONS = [
+    "كيف أطوّل عضلة الترابيس؟",
+    "كيف اطول عضلة الترابيس",
+    "  كيف أطول   عضلة الترابيس ؟!",
+    "كيف أطوّل عضلة الترابيس",
+]
+
+
+async def _check() -> None:
+    main.REPLY_CACHE = ReplyCache(256, 1024 * 1024, 60.0)
+    transport = httpx.ASGITransport(app=main.app)
+    with StubOpenAI(latency_s=LATENCY_S) as stub:
+        main.client = build_completer(api_key="stub", base_url=stub.base_url)
+        async with httpx.AsyncClient(transport=transport, base_url="http://check") as http:
+            latencies = []
+            for question in QUESTIONS:
+                start = time.perf_counter()
+                body = (await http.post("/api/chat", json={"user_message": question, "context": TRAPEZIUS})).json()
+                latencies.append(time.perf_counter() - start)
+                assert body["cached"] is (question != QUESTIONS[0]), body
+                assert body["usedOpenAI"] is (question == QUESTIONS[0]), body
+            assert stub.calls == 1, stub.calls
+            miss_ms, hit_ms = latencies[0] * 1000, max(latencies[1:]) * 1000
+            print(f"ok: {len(QUESTIONS) - 1} rephrasings served from cache ({miss_ms:.0f}ms miss, <= {hit_ms:.1f}ms hit)")
+
+            body = (await http.post("/api/chat", json={"user_message": QUESTIONS[0], "context": DELTOID})).json()
+            assert not body["cached"] and stub.calls == 2, body
+
+            session_id = body["session_id"]
+            follow_up = {"session_id": session_id, "user_message": QUESTIONS[0], "context": DELTOID}
+            body = (await http.post("/api/chat", json=follow_up)).json()
+            assert not body["cached"] and body["usedOpenAI"] and stub.calls == 3, body
+            print("ok: other muscles and later turns go upstream")
+
+            resp = await http.post("/api/chat/stream", json={"user_message": QUESTIONS[1], "context": TRAPEZIUS})
+            assert '"cached": true' in resp.text and '"usedOpenAI": false' in resp.text, resp.text
+            assert stub.calls == 3, stub.calls
+            print("ok: streaming endpoint answers from the same cache")
+
+            stats = (await http.get("/health")).json()["reply_cache"]
+            assert stats["hits"] == 4 and stats["saved_upstream_ms"] >= 4 * LATENCY_S * 1000, stats
+            print(f"ok: hit_rate={stats['hit_rate']} saved_upstream_ms={stats['saved_upstream_ms']}")
+        await main.client.aclose()
+
+
+def main_() -> int:
+    try:
+        asyncio.run(_check())
+    except AssertionError as exc:
+        print(f"FAILED: {exc!r}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_())
@@ -0,0 +1,69 @@
+"""Checks single-flight coalescing of identical in-flight chat completions.
+
+N concurrent ``/api/chat`` requests with the same message and context (each
+starting its own session) must produce exactly one call to the slow stub,
+while every session still records its own turn. Different messages are not
+coalesced, and the coalesced count shows up under ``upstream`` in ``/health``.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import sys
+import time
+
+import httpx
+
+from backend import main
+from backend.llm import build_completer
+
+from .stub_openai import DEFAULT_REPLY, StubOpenAI
+
+N = 20
+LATENCY_S = 0.5
+BODY = {
+    "user_message": "وش أفضل إحماء قبل تمرين الكتف؟",
+    "context": {"muscles": [{"muscle_ar": "الدالية", "muscle_en": "Deltoid", "region": "Shoulder", "prob": 0.5}]},
+}
+
+
+async def _check() -> None:
+    transport = httpx.ASGITransport(app=main.app)
+    with StubOpenAI(latency_s=LATENCY_S) as stub:
+        main.client = build_completer(api_key="stub", base_url=stub.base_url)
+        async with httpx.AsyncClient(transport=transport, base_url="http://check") as http:
+            start = time.perf_counter()
+            responses = await asyncio.gather(*(http.post("/api/chat", json=BODY) for _ in range(N)))
+            elapsed = time.perf_counter() - start
+            bodies = [resp.json() for resp in responses]
+            assert stub.calls == 1, stub.calls
+            assert all(body["reply"] == DEFAULT_REPLY and body["usedOpenAI"] for body in bodies), bodies
+            session_ids = {body["session_id"] for body in bodies}
+            assert len(session_ids) == N, len(session_ids)
+            for session_id in session_ids:
+                history = await main.SESSION_STORE.get_history(session_id)
+                assert [msg["role"] for msg in history] == ["system", "user", "assistant"], history
+            print(f"ok: {N} identical concurrent requests -> {stub.calls} upstream call in {elapsed:.2f}s")
+
+            distinct = [{**BODY, "user_message": f"{BODY['user_message']} {i}"} for i in range(4)]
+            await asyncio.gather(*(http.post("/api/chat", json=body) for body in distinct))
+            assert stub.calls == 5, stub.calls
+            print("ok: different messages are not coalesced")
+
+            upstream = (await http.get("/health")).json()["upstream"]
+            assert upstream["coalesced"] == N - 1 and upstream["single_flight_pending"] == 0, upstream
+            print(f"ok: coalesced={upstream['coalesced']} upstream calls={upstream['calls']}")
+        await main.client.aclose()
+
+
+def main_() -> int:
+    try:
+        asyncio.run(_check())
+    except AssertionError as exc:
+        print(f"FAILED: {exc!r}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_())
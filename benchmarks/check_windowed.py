@@ -0,0 +1,54 @@
+"""Equivalence harness: windowed dense ``top_muscles_circle`` vs the full-frame scan.
+
+Exits non-zero if any (side, centre, radius) in the grid gives a different
+``TopResult`` list, then prints the per-radius speedup. The edge cases
+(clipped circles, near-zero radii, whole-map circles) are covered as tests
+in ``backend/tests/test_windowed.py``.
+"""
+
+from __future__ import annotations
+
+import sys
+
+from backend.logic import LABEL_HEIGHT, LABEL_WIDTH, _build_label_map, top_muscles_circle
+
+from ._util import RADII, SIDES, grid, time_call
+
+
+def _pixels(cx: float, cy: float, radius: float) -> tuple[float, float, float]:
+    return cx * LABEL_WIDTH, cy * LABEL_HEIGHT, radius * min(LABEL_WIDTH, LABEL_HEIGHT)
+
+
+def check() -> int:
+    mismatches = 0
+    checked = 0
+    for side, cx, cy, radius in grid():
+        label_map = _build_label_map(side)
+        px = _pixels(cx, cy, radius)
+        windowed = top_muscles_circle(label_map, *px, k=50, windowed=True, sparse=False)
+        full = top_muscles_circle(label_map, *px, k=50, windowed=False, sparse=False)
+        checked += 1
+        if windowed != full:
+            mismatches += 1
+            print(f"MISMATCH side={side} cx={cx} cy={cy} r={radius}")
+    print(f"checked {checked} circles, {mismatches} mismatches")
+    return mismatches
+
+
+def bench() -> None:
+    for side in SIDES:
+        label_map = _build_label_map(side)
+        for radius in RADII:
+            px = _pixels(0.5, 0.45, radius)
+            full = time_call(lambda: top_muscles_circle(label_map, *px, windowed=False, sparse=False))
+            win = time_call(lambda: top_muscles_circle(label_map, *px, windowed=True, sparse=False))
+            print(
+                f"{side:5s} r={radius:<5} full={full['p50_ms']:8.2f}ms "
+                f"windowed={win['p50_ms']:8.2f}ms x{full['p50_ms'] / max(win['p50_ms'], 1e-9):.1f}"
+            )
+
+
+if __name__ == "__main__":
+    failed = check()
+    bench()
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,103 @@
+"""Load test: chat latency while heavy ``/api/analyze`` traffic runs.
+
+OpenAI is replaced by the local stub server answering after a fixed delay.
+For each executor kind we measure ``/api/chat`` latency alone, then again
+while several clients flood ``/api/analyze`` with large, uncached circles.
+With ``inline`` (analysis on the event loop) chat latency climbs; with the
+worker pool it should stay flat.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import random
+import time
+from typing import List
+
+import httpx
+
+from backend import logic, main
+from backend.config import ANALYZE_QUEUE_SIZE, ANALYZE_TIMEOUT_S, ANALYZE_WORKERS
+from backend.llm import build_completer
+from backend.workers import AnalysisPool
+
+from ._util import percentile
+from .stub_openai import StubOpenAI
+
+UPSTREAM_DELAY_S = 0.05
+CHAT_REQUESTS = 30
+CHAT_CONCURRENCY = 6
+ANALYZE_CLIENTS = 4
+
+
+async def _chat_latencies(client: httpx.AsyncClient) -> List[float]:
+    latencies: List[float] = []
+    queue: asyncio.Queue[int] = asyncio.Queue()
+    for i in range(CHAT_REQUESTS):
+        queue.put_nowait(i)
+
+    async def worker() -> None:
+        while not queue.empty():
+            i = queue.get_nowait()
+            start = time.perf_counter()
+            # رسائل مختلفة حتى ما يدمجها single-flight في طلب upstream واحد
+            resp = await client.post("/api/chat", json={"user_message": f"كيف أمدد كتفي؟ ({i})"})
+            resp.raise_for_status()
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    await asyncio.gather(*(worker() for _ in range(CHAT_CONCURRENCY)))
+    return latencies
+
+
+async def _analyze_flood(client: httpx.AsyncClient, stop: asyncio.Event, counts: List[int]) -> None:
+    rng = random.Random()
+    while not stop.is_set():
+        body = {
+            "side": rng.choice(["front", "back"]),
+            "circle": {"cx": rng.random(), "cy": rng.random(), "radius": rng.uniform(0.3, 0.5)},
+        }
+        resp = await client.post("/api/analyze", json=body)
+        counts[0 if resp.status_code == 200 else 1] += 1
+        # ASGITransport ما يعلّق لو الطلب كله متزامن؛ نسلّم الدور مثل socket حقيقي
+        await asyncio.sleep(0)
+
+
+async def _scenario(flood: bool, base_url: str) -> tuple[List[float], List[int]]:
+    main.client = build_completer(api_key="stub", base_url=base_url)
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        stop = asyncio.Event()
+        counts = [0, 0]
+        flooders = [
+            asyncio.create_task(_analyze_flood(client, stop, counts))
+            for _ in range(ANALYZE_CLIENTS if flood else 0)
+        ]
+        await asyncio.sleep(0.2 if flood else 0)
+        latencies = await _chat_latencies(client)
+        stop.set()
+        await asyncio.gather(*flooders)
+    await main.client.aclose()
+    return latencies, counts
+
+
+def _run_kind(kind: str, base_url: str) -> None:
+    main.ANALYSIS_POOL = AnalysisPool(kind, ANALYZE_WORKERS, ANALYZE_QUEUE_SIZE, ANALYZE_TIMEOUT_S)
+    for flood in (False, True):
+        latencies, (ok, rejected) = asyncio.run(_scenario(flood, base_url))
+        print(
+            f"executor={kind:6s} analyze_load={'on ' if flood else 'off'} "
+            f"chat p50={percentile(latencies, 50):7.1f}ms p95={percentile(latencies, 95):7.1f}ms "
+            f"max={max(latencies):7.1f}ms | analyze ok={ok} rejected={rejected}"
+        )
+    main.ANALYSIS_POOL.shutdown()
+
+
+def main_() -> None:
+    logic.ANALYZE_CACHE.max_entries = 0
+    with StubOpenAI(latency_s=UPSTREAM_DELAY_S) as stub:
+        for kind in ("inline", "thread"):
+            _run_kind(kind, stub.base_url)
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,206 @@
+"""Load test of the chat API against the offline upstream simulator.
+
+1. ``SimulatedOpenAI`` with a log-normal first-token latency, a token rate and
+   injected timeouts, 429s and 5xx errors serves concurrent ``/api/chat`` and
+   ``/api/chat/stream`` requests over a real uvicorn server. The observed
+   outcome mix must match the configured rates, and successful replies must
+   follow the latency model.
+2. With ``max_retries`` set, injected 429s are retried inside the simulator like
+   the SDK does: each call that reaches ``ChatCompleter`` as an error has used up
+   all its attempts, so far fewer calls fail than attempts.
+3. ``RecordingOpenAI`` captures replies from the local OpenAI stub on both
+   paths. ``ReplayOpenAI`` then answers the same requests from the file with
+   the same text and roughly the same timings, without the stub.
+"""
+
+from __future__ import annotations
+
+import asyncio
+import json
+import logging
+import sys
+import tempfile
+import time
+from collections import Counter
+from pathlib import Path
+from typing import Any, Dict, List, Tuple
+
+import httpx
+
+from backend import main
+from backend.llm import ChatCompleter, build_completer
+from backend.llm_sim import DEFAULT_SIM_REPLY, ReplayOpenAI, SimulatedAPIError, SimulatedOpenAI
+
+from ._util import percentile, serve_app
+from .stub_openai import DEFAULT_REPLY, StubOpenAI
+
+REQUESTS = 240
+CONCURRENCY = 24
+DEADLINE_S = 1.0
+MEDIAN_S, P95_S, TOKENS_PER_S = 0.15, 0.4, 200.0
+RATES = {"timeout": 0.05, "429": 0.05, "5xx": 0.05}
+RETRY_CALLS, RETRY_RATE, MAX_RETRIES = 60, 0.5, 2
+
+
+async def _blocking(http: httpx.AsyncClient, message: str) -> Tuple[Dict[str, Any], float, float]:
+    start = time.perf_counter()
+    body = (await http.post("/api/chat", json={"user_message": message})).json()
+    elapsed = time.perf_counter() - start
+    return body, elapsed, elapsed
+
+
+async def _streaming(http: httpx.AsyncClient, message: str) -> Tuple[Dict[str, Any], float, float]:
+    start = time.perf_counter()
+    first = 0.0
+    done: Dict[str, Any] = {}
+    async with http.stream("POST", "/api/chat/stream", json={"user_message": message}) as resp:
+        event = None
+        async for line in resp.aiter_lines():
+            if line.startswith("event: "):
+                event = line[len("event: "):]
+            elif line.startswith("data: "):
+                if event == "done":
+                    done = json.loads(line[len("data: "):])
+                elif not first:
+                    first = time.perf_counter() - start
+                event = None
+    return done, first, time.perf_counter() - start
+
+
+async def _load(base_url: str, messages: List[str]) -> List[Tuple[str, Dict[str, Any], float, float]]:
+    results: List[Tuple[str, Dict[str, Any], float, float]] = []
+    queue = list(enumerate(messages))
+
+    async def worker(http: httpx.AsyncClient) -> None:
+        while queue:
+            i, message = queue.pop()
+            path, call = ("stream", _streaming) if i % 2 else ("blocking", _blocking)
+            results.append((path, *await call(http, message)))
+
+    async with httpx.AsyncClient(base_url=base_url, timeout=30) as http:
+        await asyncio.gather(*(worker(http) for _ in range(CONCURRENCY)))
+    return results
+
+
+def _simulate() -> None:
+    sim = SimulatedOpenAI(
+        latency_median_s=MEDIAN_S,
+        latency_p95_s=P95_S,
+        tokens_per_s=TOKENS_PER_S,
+        timeout_rate=RATES["timeout"],
+        rate_limit_rate=RATES["429"],
+        server_error_rate=RATES["5xx"],
+        seed=18,
+    )
+    # بدون breaker: نبي نشوف مزيج الأخطاء كما هو، مو الدائرة المفتوحة
+    main.client = ChatCompleter(sim, model="sim", deadline_s=DEADLINE_S, max_concurrency=64)
+    with serve_app(main.app) as base_url:
+        start = time.perf_counter()
+        results = asyncio.run(_load(base_url, [f"سؤال تحميل رقم {i}" for i in range(REQUESTS)]))
+        elapsed = time.perf_counter() - start
+
+    outcomes = Counter(sim.counts)
+    total = sum(outcomes.values())
+    errors_5xx = sum(count for status, count in outcomes.items() if status.startswith("5"))
+    observed = {"timeout": outcomes["timeout"] / total, "429": outcomes["429"] / total, "5xx": errors_5xx / total}
+    for kind, rate in RATES.items():
+        assert abs(observed[kind] - rate) < 0.05, (kind, observed, outcomes)
+    ok = [item for item in results if item[1].get("usedOpenAI")]
+    assert len(ok) == outcomes["ok"], (len(ok), outcomes)
+    assert all(item[1]["reply"] == DEFAULT_SIM_REPLY for item in ok)
+    print(
+        f"ok: {REQUESTS} requests in {elapsed:.2f}s ({REQUESTS / elapsed:.0f} req/s), "
+        f"outcomes {dict(outcomes)} -> " + ", ".join(f"{k}={v:.1%}" for k, v in observed.items())
+    )
+
+    pieces = len(DEFAULT_SIM_REPLY.split())
+    for path in ("blocking", "stream"):
+        first = [item[2] for item in ok if item[0] == path]
+        total_s = [item[3] for item in ok if item[0] == path]
+        print(
+            f"   {path:8s} n={len(first):3d} first p50={percentile(first, 50) * 1000:6.1f}ms "
+            f"p95={percentile(first, 95) * 1000:6.1f}ms  full p50={percentile(total_s, 50) * 1000:6.1f}ms"
+        )
+    stream_first = percentile([item[2] for item in ok if item[0] == "stream"], 50)
+    blocking_full = percentile([item[3] for item in ok if item[0] == "blocking"], 50)
+    assert 0.6 * MEDIAN_S < stream_first < 2 * MEDIAN_S, stream_first
+    assert blocking_full > MEDIAN_S + 0.5 * (pieces - 1) / TOKENS_PER_S, blocking_full
+    timeouts = [item[3] for item in results if not item[1].get("usedOpenAI")]
+    assert timeouts and max(timeouts) < DEADLINE_S + 1.0, max(timeouts)
+    print(f"ok: streaming first token ~ median latency; failures fell back within {max(timeouts):.2f}s")
+
+
+async def _retry_calls(sim: SimulatedOpenAI) -> int:
+    async def call(i: int) -> bool:
+        try:
+            await sim.chat.completions.create(model="sim", messages=[{"role": "user", "content": str(i)}])
+        except SimulatedAPIError:
+            return False
+        return True
+
+    results = await asyncio.gather(*(call(i) for i in range(RETRY_CALLS)))
+    return results.count(False)
+
+
+def _retries() -> None:
+    sim = SimulatedOpenAI(
+        latency_median_s=0.01, latency_p95_s=0.02, tokens_per_s=0, rate_limit_rate=RETRY_RATE,
+        max_retries=MAX_RETRIES, seed=19,
+    )
+    failed = asyncio.run(_retry_calls(sim))
+    counts = sim.counts
+    # كل خطأ محقون إما أُعيد أو وصل للمستدعي بعد آخر محاولة
+    assert counts["429"] == counts["retry"] + failed, counts
+    assert counts["ok"] + failed == RETRY_CALLS, (counts, failed)
+    assert failed < RETRY_CALLS * RETRY_RATE / 2, (failed, counts)
+    print(
+        f"ok: {RETRY_CALLS} calls at {RETRY_RATE:.0%} 429s with max_retries={MAX_RETRIES}: "
+        f"{counts['retry']} retries, {failed} errors reached the caller"
+    )
+
+
+def _record_replay() -> None:
+    messages = [f"سؤال مسجّل رقم {i}" for i in range(12)]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(tmp) / "recordings.jsonl"
+        with StubOpenAI(latency_s=0.1, token_delay_s=0.01) as stub:
+            completer = build_completer(api_key="stub", base_url=stub.base_url, simulator="record")
+            assert completer is not None
+            completer.client.path = path
+            main.client = completer
+            with serve_app(main.app) as base_url:
+                recorded = asyncio.run(_load(base_url, messages))
+            calls = stub.calls
+        records = [json.loads(line) for line in path.read_text(encoding="utf-8").splitlines()]
+        assert calls == len(messages) and len(records) == len(messages), (calls, len(records))
+        assert all(record["reply"].strip() == DEFAULT_REPLY for record in records), records
+        print(f"ok: recorded {len(records)} completions (blocking and streaming) from the stub")
+
+        replay = ReplayOpenAI(str(path))
+        main.client = ChatCompleter(replay, model="replay", deadline_s=5.0, max_concurrency=64)
+        with serve_app(main.app) as base_url:
+            replayed = asyncio.run(_load(base_url, messages))
+        assert replay.counts == {"exact": len(messages)}, replay.counts
+        assert all(item[1]["usedOpenAI"] and item[1]["reply"] == DEFAULT_REPLY for item in replayed), replayed
+        before = percentile([item[3] for item in recorded], 50)
+        after = percentile([item[3] for item in replayed], 50)
+        assert abs(after - before) < 0.1, (before, after)
+        print(f"ok: replayed {len(messages)} exact matches without upstream, p50 {before * 1000:.0f}ms -> {after * 1000:.0f}ms")
+    main.client = None
+
+
+def main_() -> int:
+    # الأخطاء المُحاكاة مقصودة؛ ما نبي traceback لكل واحد منها
+    logging.getLogger("backend.main").setLevel(logging.CRITICAL)
+    try:
+        _simulate()
+        _retries()
+        _record_replay()
+    except AssertionError as exc:
+        print(f"FAILED: {exc!r}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_())
@@ -0,0 +1,158 @@
+"""Local stub of the OpenAI chat completions API for tests and load runs.
+
+    with StubOpenAI(latency_s=0.2) as stub:
+        completer = build_completer(api_key="stub", base_url=stub.base_url)
+
+It answers ``POST /v1/chat/completions`` after ``latency_s`` and records the
+number of calls and the peak number of concurrent requests it served. With
+``"stream": true`` it sends the reply word by word as SSE chunks, one every
+``token_delay_s``, like the real API.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict
+
+DEFAULT_REPLY = "تمام! ابدأ بإحماء خفيف دقيقتين وبعدها مدّ العضلة ببطء ٢٠ ثانية."
+
+
+class StubOpenAI:
+    def __init__(
+        self,
+        latency_s: float = 0.05,
+        reply: str = DEFAULT_REPLY,
+        status: int = 200,
+        token_delay_s: float = 0.0,
+    ) -> None:
+        self.latency_s = latency_s
+        self.token_delay_s = token_delay_s
+        self.reply = reply
+        self.status = status
+        self.calls = 0
+        self.active = 0
+        self.peak_active = 0
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}/v1"
+
+    def __enter__(self) -> "StubOpenAI":
+        self._thread.start()
+        return self
+
+    def __exit__(self, *_exc: Any) -> None:
+        self._server.shutdown()
+        self._server.server_close()
+
+    def completion_body(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            "id": f"chatcmpl-stub-{self.calls}",
+            "object": "chat.completion",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [
+                {
+                    "index": 0,
+                    "message": {"role": "assistant", "content": self.reply},
+                    "finish_reason": "stop",
+                }
+            ],
+            "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+        }
+
+    def chunk_body(self, request: Dict[str, Any], delta: Dict[str, str], finish: str | None) -> Dict[str, Any]:
+        return {
+            "id": f"chatcmpl-stub-{self.calls}",
+            "object": "chat.completion.chunk",
+            "created": int(time.time()),
+            "model": request.get("model", "stub"),
+            "choices": [{"index": 0, "delta": delta, "finish_reason": finish}],
+        }
+
+    def _handler(self) -> type:
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def setup(self) -> None:
+                super().setup()
+                # بدون Nagle حتى ما تضيف الـ delayed ACK ‏40ms على كل رد
+                self.connection.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+
+            def log_message(self, *_args: Any) -> None:
+                pass
+
+            def _send_json(self, status: int, body: Dict[str, Any]) -> None:
+                data = json.dumps(body, ensure_ascii=False).encode("utf-8")
+                try:
+                    self.send_response(status)
+                    self.send_header("Content-Type", "application/json")
+                    self.send_header("Content-Length", str(len(data)))
+                    self.end_headers()
+                    self.wfile.write(data)
+                except (BrokenPipeError, ConnectionResetError):
+                    pass  # العميل قطع الاتصال (مثلاً بعد تجاوز المهلة)
+
+            def _write_chunk(self, payload: str) -> None:
+                data = payload.encode("utf-8")
+                self.wfile.write(f"{len(data):x}\r\n".encode("ascii") + data + b"\r\n")
+                self.wfile.flush()
+
+            def _send_stream(self, request: Dict[str, Any]) -> None:
+                try:
+                    self.send_response(200)
+                    self.send_header("Content-Type", "text/event-stream")
+                    self.send_header("Transfer-Encoding", "chunked")
+                    self.end_headers()
+                    pieces = [{"role": "assistant", "content": ""}] + [
+                        {"content": word} for word in re.findall(r"\S+\s*", stub.reply)
+                    ]
+                    for delta in pieces:
+                        body = stub.chunk_body(request, delta, None)
+                        self._write_chunk(f"data: {json.dumps(body, ensure_ascii=False)}\n\n")
+                        time.sleep(stub.token_delay_s)
+                    body = stub.chunk_body(request, {}, "stop")
+                    self._write_chunk(f"data: {json.dumps(body)}\n\n")
+                    self._write_chunk("data: [DONE]\n\n")
+                    self.wfile.write(b"0\r\n\r\n")
+                except (BrokenPipeError, ConnectionResetError):
+                    pass
+
+            def do_POST(self) -> None:  # noqa: N802
+                length = int(self.headers.get("Content-Length") or 0)
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if not self.path.endswith("/chat/completions"):
+                    self._send_json(404, {"error": {"message": "not found"}})
+                    return
+                with stub._lock:
+                    stub.calls += 1
+                    stub.active += 1
+                    stub.peak_active = max(stub.peak_active, stub.active)
+                try:
+                    time.sleep(stub.latency_s)
+                    if stub.status != 200:
+                        self._send_json(stub.status, {"error": {"message": "stub failure", "type": "server_error"}})
+                        return
+                    if request.get("stream"):
+                        self._send_stream(request)
+                    else:
+                        # الرد الكامل ينتظر توليد كل الكلمات مثل الـ API الحقيقي
+                        time.sleep(stub.token_delay_s * len(re.findall(r"\S+\s*", stub.reply)))
+                        self._send_json(200, stub.completion_body(request))
+                finally:
+                    with stub._lock:
+                        stub.active -= 1
+
+        return Handler
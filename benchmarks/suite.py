@@ -0,0 +1,302 @@
+"""Reproducible benchmark suite for the analysis and chat pipelines.
+
+    python -m benchmarks.suite                      # full run, compare with baseline.json
+    python -m benchmarks.suite --quick              # smaller grid and fewer requests
+    python -m benchmarks.suite --update-baseline    # store this run as the new baseline
+
+Cases:
+
+- ``build_label_map[side]``: building the label map from ``BODY_MAP`` (cache cleared);
+- ``top_muscles_circle[r=..]`` and ``analyze_selection[r=..]``: the grid of
+  centres from ``_util`` on both sides, grouped by normalised radius;
+- ``analyze_selection[fallback]``: grid points that hit no box and go through
+  the nearest-box fallback;
+- ``http_analyze`` and ``http_chat``: the full ``/api/analyze`` and
+  ``/api/chat`` request path with ``--concurrency`` clients. Chat goes to the
+  local OpenAI stub, which answers after ``--stub-latency`` seconds.
+
+Every case reports p50/p95/p99/mean latency, throughput and peak traced
+memory. Memory is measured with ``tracemalloc`` in a separate pass so it does
+not slow the timed run. Results go to ``--output`` as JSON. When a baseline
+exists, p50 and p95 are compared against it and the script exits non-zero if
+any case is slower by more than ``--tolerance``.
+"""
+
+from __future__ import annotations
+
+import argparse
+import asyncio
+import json
+import platform
+import random
+import subprocess
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, List, Sequence, Tuple
+
+import httpx
+import numpy as np
+
+from backend import logic, main
+from backend.llm import build_completer
+
+from ._util import RADII, SIDES, percentile
+from .stub_openai import StubOpenAI
+
+HERE = Path(__file__).resolve().parent
+BASELINE = HERE / "baseline.json"
+OUTPUT = HERE / "results.json"
+COMPARED = ("p50_ms", "p95_ms")
+
+Point = Tuple[str, float, float, float]
+
+
+def _summary(samples: List[float], elapsed_s: float) -> Dict[str, float]:
+    return {
+        "n": len(samples),
+        "p50_ms": round(percentile(samples, 50), 4),
+        "p95_ms": round(percentile(samples, 95), 4),
+        "p99_ms": round(percentile(samples, 99), 4),
+        "mean_ms": round(sum(samples) / len(samples), 4) if samples else 0.0,
+        "throughput_per_s": round(len(samples) / elapsed_s, 2) if elapsed_s > 0 else 0.0,
+    }
+
+
+def _peak_kb(run: Callable[[], Any]) -> float:
+    tracemalloc.start()
+    try:
+        run()
+        return round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+    finally:
+        tracemalloc.stop()
+
+
+def _sync_case(calls: Sequence[Callable[[], Any]], *, repeat: int = 1, rounds: int = 3) -> Dict[str, float]:
+    """
+    يقيس كل استدعاء لوحده في rounds جولات ويحتفظ بأسرع جولة (حسب المتوسط)، مثل timeit،
+    حتى ما يطلع تذبذب الجهاز كأنه تراجع. بعدها يعيد أول 20 تحت tracemalloc لقياس الذاكرة.
+    """
+    for call in calls[:3]:
+        call()  # warm-up
+    best: Dict[str, float] | None = None
+    for _ in range(rounds):
+        samples: List[float] = []
+        start = time.perf_counter()
+        for _ in range(repeat):
+            for call in calls:
+                began = time.perf_counter()
+                call()
+                samples.append((time.perf_counter() - began) * 1000)
+        result = _summary(samples, time.perf_counter() - start)
+        if best is None or result["mean_ms"] < best["mean_ms"]:
+            best = result
+    assert best is not None
+    best["peak_mem_kb"] = _peak_kb(lambda: [call() for call in calls[:20]])
+    return best
+
+
+Send = Callable[[httpx.AsyncClient, int], Awaitable[None]]
+
+
+async def _load(http: httpx.AsyncClient, send: Send, total: int, concurrency: int) -> Tuple[List[float], float]:
+    samples: List[float] = []
+    counter = iter(range(total))
+
+    async def client() -> None:
+        for i in counter:
+            began = time.perf_counter()
+            await send(http, i)
+            samples.append((time.perf_counter() - began) * 1000)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(client() for _ in range(concurrency)))
+    return samples, time.perf_counter() - start
+
+
+def _async_case(send: Send, total: int, concurrency: int) -> Dict[str, float]:
+    """concurrency عملاء على نفس التطبيق عبر ASGITransport، ثم جولة أصغر تحت tracemalloc."""
+
+    async def run() -> Dict[str, float]:
+        transport = httpx.ASGITransport(app=main.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench") as http:
+            await _load(http, send, concurrency, concurrency)  # warm-up
+            result = _summary(*await _load(http, send, total, concurrency))
+            tracemalloc.start()
+            try:
+                await _load(http, send, min(total, 4 * concurrency), concurrency)
+                result["peak_mem_kb"] = round(tracemalloc.get_traced_memory()[1] / 1024, 1)
+            finally:
+                tracemalloc.stop()
+        return result
+
+    return asyncio.run(run())
+
+
+def _grid(step: float) -> List[Point]:
+    steps = int(round(1 / step))
+    centres = [i * step for i in range(steps + 1)]
+    return [(side, cx, cy, radius) for side in SIDES for cx in centres for cy in centres for radius in RADII]
+
+
+def _micro_cases(points: List[Point]) -> Dict[str, Dict[str, float]]:
+    results: Dict[str, Dict[str, float]] = {}
+
+    def rebuild(side: str) -> None:
+        logic._build_label_map.cache_clear()
+        logic._build_label_map(side)
+
+    for side in SIDES:
+        results[f"build_label_map[{side}]"] = _sync_case([lambda side=side: rebuild(side)] * 10)
+    logic._build_label_map.cache_clear()
+
+    for radius_norm in RADII:
+        subset = [point for point in points if point[3] == radius_norm]
+        top_calls = []
+        for side, cx_norm, cy_norm, r_norm in subset:
+            label_map, runs = logic._build_label_map(side), logic._build_label_runs(side)
+            cx, cy, radius = logic._selection_pixels(cx_norm, cy_norm, r_norm)
+            top_calls.append(
+                lambda m=label_map, runs=runs, cx=cx, cy=cy, r=radius: logic.top_muscles_circle(m, cx, cy, r, runs=runs)
+            )
+        results[f"top_muscles_circle[r={radius_norm}]"] = _sync_case(top_calls)
+        results[f"analyze_selection[r={radius_norm}]"] = _sync_case(
+            [lambda p=point: logic.analyze_selection(*p, engine="raster") for point in subset]
+        )
+
+    fallback = [
+        point for point in points
+        if logic.analyze_selection(*point, engine="raster")["debug"]["used_fallback"]
+    ]
+    if fallback:
+        results["analyze_selection[fallback]"] = _sync_case(
+            [lambda p=point: logic.analyze_selection(*p, engine="raster") for point in fallback], repeat=5
+        )
+    return results
+
+
+def _http_cases(requests: int, concurrency: int, stub_latency_s: float) -> Dict[str, Dict[str, float]]:
+    results: Dict[str, Dict[str, float]] = {}
+    rng = random.Random(17)
+    bodies = [
+        {
+            "side": rng.choice(SIDES),
+            "circle": {"cx": rng.random(), "cy": rng.random(), "radius": rng.choice(RADII)},
+        }
+        for _ in range(requests)
+    ]
+
+    async def analyze(http: httpx.AsyncClient, i: int) -> None:
+        (await http.post("/api/analyze", json=bodies[i % len(bodies)])).raise_for_status()
+
+    async def chat(http: httpx.AsyncClient, i: int) -> None:
+        # رسائل مختلفة حتى ما يدمجها single-flight في طلب upstream واحد
+        resp = await http.post("/api/chat", json={"user_message": f"كيف أمدد كتفي؟ ({i}-{rng.random():.6f})"})
+        resp.raise_for_status()
+        assert resp.json()["usedOpenAI"], resp.json()
+
+    results["http_analyze"] = _async_case(analyze, requests, concurrency)
+    with StubOpenAI(latency_s=stub_latency_s) as stub:
+        main.client = build_completer(api_key="stub", base_url=stub.base_url)
+        try:
+            results["http_chat"] = _async_case(chat, requests, concurrency)
+        finally:
+            main.client = None
+    return results
+
+
+def _environment(args: argparse.Namespace) -> Dict[str, Any]:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, cwd=HERE, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        "commit": commit,
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "platform": platform.platform(),
+        "quick": args.quick,
+        "concurrency": args.concurrency,
+        "stub_latency_s": args.stub_latency,
+    }
+
+
+def compare(current: Dict[str, Any], baseline: Dict[str, Any], tolerance: float, min_delta_ms: float) -> List[str]:
+    """
+    يرجع وصف كل حالة أبطأ من الـ baseline بأكثر من tolerance (في p50 أو p95).
+    الفروقات الأصغر من min_delta_ms تُهمل لأن الحالات السريعة جداً يغلب عليها التذبذب.
+    """
+    regressions: List[str] = []
+    for name, stats in current["cases"].items():
+        base = baseline.get("cases", {}).get(name)
+        if not base:
+            continue
+        for key in COMPARED:
+            slower = stats[key] - base[key]
+            if slower > base[key] * tolerance and slower > min_delta_ms:
+                regressions.append(f"{name} {key}: {stats[key]:.3f} vs baseline {base[key]:.3f}")
+    return regressions
+
+
+def _print(cases: Dict[str, Dict[str, float]], baseline: Dict[str, Any]) -> None:
+    print(f"{'case':34s} {'p50':>9s} {'p95':>9s} {'p99':>9s} {'req/s':>9s} {'peak KB':>9s} {'p50 vs base':>12s}")
+    for name, stats in cases.items():
+        base = baseline.get("cases", {}).get(name)
+        delta = f"{(stats['p50_ms'] / base['p50_ms'] - 1) * 100:+.0f}%" if base and base["p50_ms"] else "-"
+        print(
+            f"{name:34s} {stats['p50_ms']:9.3f} {stats['p95_ms']:9.3f} {stats['p99_ms']:9.3f} "
+            f"{stats['throughput_per_s']:9.1f} {stats['peak_mem_kb']:9.1f} {delta:>12s}"
+        )
+
+
+def main_(argv: Sequence[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="coarser grid and fewer HTTP requests")
+    parser.add_argument("--only", choices=("micro", "http"), help="run one group of cases")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=None, help="HTTP requests per case")
+    parser.add_argument("--stub-latency", type=float, default=0.05)
+    parser.add_argument("--output", type=Path, default=OUTPUT)
+    parser.add_argument("--baseline", type=Path, default=BASELINE)
+    parser.add_argument("--tolerance", type=float, default=0.3, help="allowed slowdown (0.3 = 30%%)")
+    parser.add_argument("--min-delta-ms", type=float, default=0.05, help="ignore smaller slowdowns")
+    parser.add_argument("--update-baseline", action="store_true")
+    args = parser.parse_args(argv)
+
+    # نقيس الحساب نفسه، فنطفي كاش النتائج (كاش الردود مطفي افتراضياً)
+    logic.ANALYZE_CACHE.max_entries = 0
+
+    cases: Dict[str, Dict[str, float]] = {}
+    if args.only in (None, "micro"):
+        cases.update(_micro_cases(_grid(0.25 if args.quick else 0.1)))
+    if args.only in (None, "http"):
+        requests = args.requests or (100 if args.quick else 400)
+        cases.update(_http_cases(requests, args.concurrency, args.stub_latency))
+
+    report = {"environment": _environment(args), "cases": cases}
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    _print(cases, baseline)
+    args.output.write_text(json.dumps(report, indent=2, ensure_ascii=False) + "\n")
+    print(f"results written to {args.output}")
+
+    if args.update_baseline:
+        args.baseline.write_text(json.dumps(report, indent=2, ensure_ascii=False) + "\n")
+        print(f"baseline updated: {args.baseline}")
+        return 0
+    if not baseline:
+        print("no baseline to compare against (run with --update-baseline)")
+        return 0
+    if baseline.get("environment", {}).get("quick") != args.quick:
+        print("warning: baseline was recorded with a different --quick setting; grids differ")
+    regressions = compare(report, baseline, args.tolerance, args.min_delta_ms)
+    for line in regressions:
+        print(f"REGRESSION {line}")
+    print(f"{len(regressions)} regressions (tolerance {args.tolerance:.0%})")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main_())
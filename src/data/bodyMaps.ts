@@ -5,8 +5,11 @@ export interface BodyMapItem {
   name_en: string;
   name_ar: string;
   region: string;
-  shape: "box";
+  shape: "box" | "polygon" | "mask";
+  // Bounding box for every shape; polygons and masks only refine the backend hit test
   box_norm: [number, number, number, number];
+  polygon_norm?: [number, number][];
+  mask?: string;
 }
 
 export interface BodyMapConfig {